@@ -6,16 +6,33 @@ Track usage patterns, success rates, and optimize workflows
 
 import json
 import os
+import threading
 from datetime import datetime
 from typing import Dict, Any, List
-from collections import defaultdict
+from collections import defaultdict, deque
+
+from call_metrics import percentile
+
+# Newest model-call records kept in memory for get_model_calls (service seeding)
+MAX_RECENT_CALLS = 5000
+# Newest latencies kept per model and per route for the percentiles
+MAX_LATENCY_SAMPLES = 1000
 
 
 class AnalyticsTracker:
     """Track and analyze usage patterns"""
     
-    def __init__(self, storage_path: str = "analytics.json"):
+    # Model-call records are appended from worker threads and several sessions
+    _calls_lock = threading.Lock()
+    # Running totals and bounded windows of parsed records per calls file, shared by every
+    # tracker instance (one per Streamlit rerun), so each rerun only parses lines appended
+    # since the last one and memory stays flat however long the server runs
+    _calls_cache: Dict[str, Dict[str, Any]] = {}
+    
+    def __init__(self, storage_path: str = "analytics.json",
+                 calls_path: str = "analytics_calls.jsonl"):
         self.storage_path = storage_path
+        self.calls_path = calls_path
         self.data = self._load_data()
     
     def _load_data(self) -> Dict[str, Any]:
@@ -149,6 +166,150 @@ class AnalyticsTracker:
             "intensities_breakdown": self.data["intensities_used"]
         }
     
+    def track_model_call(self, record: Dict[str, Any]):
+        """
+        Append one model-call metrics record (see call_metrics.CallTimer.record).
+        
+        Stored as JSON lines so concurrent writers never overwrite each other.
+        """
+        line = json.dumps(record, ensure_ascii=False)
+        with self._calls_lock:
+            try:
+                with open(self.calls_path, 'a', encoding='utf-8') as f:
+                    f.write(line + "\n")
+            except Exception as e:
+                print(f"Error saving call metrics: {e}")
+    
+    def get_model_calls(self) -> List[Dict[str, Any]]:
+        """The newest MAX_RECENT_CALLS model-call metrics, oldest first"""
+        return list(self._load_model_calls()["recent"])
+    
+    def _load_model_calls(self) -> Dict[str, Any]:
+        """Cached model-call totals, topped up with lines appended since the last read"""
+        path = os.path.abspath(self.calls_path)
+        with self._calls_lock:
+            cache = self._calls_cache.get(path)
+            try:
+                stat = os.stat(path)
+                size, inode = stat.st_size, stat.st_ino
+            except OSError:
+                size, inode = 0, None
+            if cache is None or size < cache["offset"] or inode != cache["inode"]:
+                # First read, or the file was reset or replaced
+                cache = self._calls_cache[path] = {"offset": 0, "inode": inode, "stats": None,
+                                                   "recent": deque(maxlen=MAX_RECENT_CALLS),
+                                                   "totals": self._new_call_totals()}
+            if size > cache["offset"]:
+                with open(path, 'rb') as f:
+                    f.seek(cache["offset"])
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break  # a write still in progress; read it next time
+                        cache["offset"] += len(line)
+                        try:
+                            call = json.loads(line)
+                        except ValueError:
+                            continue
+                        cache["recent"].append(call)
+                        self._add_call(cache["totals"], call)
+                cache["stats"] = None
+            return cache
+    
+    def get_model_call_stats(self) -> Dict[str, Any]:
+        """Cost per feature and latency percentiles per model from recorded calls"""
+        cache = self._load_model_calls()
+        with self._calls_lock:
+            if cache["stats"] is None:
+                cache["stats"] = self._model_call_stats(cache["totals"])
+            return cache["stats"]
+    
+    @staticmethod
+    def _new_call_totals() -> Dict[str, Any]:
+        """Running counters, plus the newest MAX_LATENCY_SAMPLES latencies per model and route"""
+        window = lambda: deque(maxlen=MAX_LATENCY_SAMPLES)
+        return {
+            "calls": 0,
+            "by_feature": defaultdict(lambda: {"calls": 0, "cost_usd": 0.0, "prompt_tokens": 0,
+                                               "completion_tokens": 0, "cached_tokens": 0}),
+            "latencies": defaultdict(window),
+            "ttfbs": defaultdict(window),
+            "route_latencies": defaultdict(window),
+            "fallbacks": defaultdict(int),
+            "outcomes": defaultdict(int),
+        }
+    
+    @staticmethod
+    def _add_call(totals: Dict[str, Any], call: Dict[str, Any]):
+        totals["calls"] += 1
+        feature = totals["by_feature"][call.get("feature", "unknown")]
+        feature["calls"] += 1
+        feature["cost_usd"] += call.get("cost_usd", 0) or 0
+        for key in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+            feature[key] += call.get(key, 0) or 0
+        totals["outcomes"][call.get("outcome", "unknown")] += 1
+        if call.get("outcome") != "cache_hit" and call.get("latency_ms") is not None:
+            totals["latencies"][call.get("model", "unknown")].append(call["latency_ms"])
+            if call.get("ttfb_ms") is not None:
+                totals["ttfbs"][call.get("model", "unknown")].append(call["ttfb_ms"])
+            if call.get("route"):
+                route = (call.get("feature", "unknown"), call.get("model", "unknown"), call["route"])
+                totals["route_latencies"][route].append(call["latency_ms"])
+        if call.get("route") == "fallback":
+            totals["fallbacks"][call.get("feature", "unknown")] += 1
+    
+    @staticmethod
+    def _model_call_stats(totals: Dict[str, Any]) -> Dict[str, Any]:
+        by_feature = totals["by_feature"]
+        ttfbs = totals["ttfbs"]
+        outcomes = totals["outcomes"]
+        total_calls = totals["calls"]
+        
+        cost_by_feature = {}
+        for name, feature in by_feature.items():
+            cost_by_feature[name] = {
+                **feature,
+                "cost_usd": round(feature["cost_usd"], 4),
+                "avg_cost_usd": round(feature["cost_usd"] / feature["calls"], 4),
+                # Share of prompt tokens served from the provider's prefix cache
+                "prompt_cache_rate": round(feature["cached_tokens"] / feature["prompt_tokens"] * 100, 1)
+                if feature["prompt_tokens"] else 0,
+            }
+        
+        total_prompt = sum(f["prompt_tokens"] for f in by_feature.values())
+        total_cached = sum(f["cached_tokens"] for f in by_feature.values())
+        
+        latency_by_model = {
+            model: {
+                "calls": len(values),
+                "p50_ms": round(percentile(values, 50)),
+                "p95_ms": round(percentile(values, 95)),
+                "ttfb_p50_ms": round(percentile(ttfbs[model], 50)) if ttfbs[model] else None,
+            }
+            for model, values in totals["latencies"].items()
+        }
+        
+        # Which model each feature's route actually answered on, and how fast
+        latency_by_route = {
+            f"{feature} → {model} ({role})": {
+                "calls": len(values),
+                "p50_ms": round(percentile(values, 50)),
+                "p90_ms": round(percentile(values, 90)),
+            }
+            for (feature, model, role), values in totals["route_latencies"].items()
+        }
+        
+        return {
+            "total_calls": total_calls,
+            "total_cost_usd": round(sum(f["cost_usd"] for f in by_feature.values()), 4),
+            "cache_hit_rate": round(outcomes.get("cache_hit", 0) / total_calls * 100, 1) if total_calls else 0,
+            "prompt_cache_rate": round(total_cached / total_prompt * 100, 1) if total_prompt else 0,
+            "outcomes": dict(outcomes),
+            "cost_by_feature": cost_by_feature,
+            "latency_by_model": latency_by_model,
+            "latency_by_route": latency_by_route,
+            "fallbacks_by_feature": dict(totals["fallbacks"]),
+        }
+    
     def get_recent_activity(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Get recent generation activity"""
         return sorted(self.data["generations"], 
@@ -159,3 +320,6 @@ class AnalyticsTracker:
         """Reset all analytics data"""
         self.data = self._init_data()
         self._save_data()
+        with self._calls_lock:
+            if os.path.exists(self.calls_path):
+                os.remove(self.calls_path)
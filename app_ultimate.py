@@ -1,5 +1,8 @@
 import os
 import json
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 import streamlit as st
 from PIL import Image
 import streamlit.components.v1 as components
@@ -12,7 +15,10 @@ except ImportError:
     HAS_COORDS = False
 
 from dotenv import load_dotenv
-from openai_service import OpenAIService
+from service_registry import configure_rate_limits, get_openai_service, get_shared_cache
+from single_flight import get_single_flight
+from hedging import get_hedge_policy, hedging_scope
+from deadline import CancellationToken, current_deadline, deadline_scope, outcome_of
 from master_dna import DEFAULT_MASTER_DNA
 from emotion_engine import EmotionEngine
 from audio_mapper import AudioEmotionMapper
@@ -21,8 +27,9 @@ from template_manager import TemplateManager
 from analytics_tracker import AnalyticsTracker
 from negative_prompt_generator import NegativePromptGenerator
 from batch_processor import BatchProcessor
+from batch_journal import BatchJournal
 from ultra_realism_engine import UltraRealismEngine
-from video_analyzer import extract_keyframes_from_video
+from video_analyzer import DEDUP_HAMMING, extract_keyframes
 
 load_dotenv()
 st.set_page_config(page_title="AI Prompt Studio Ultimate", layout="wide", page_icon="🎬")
@@ -45,6 +52,65 @@ def copy_button(label: str, text_to_copy: str, key_suffix: str = ""):
         </div>
     """, height=60)
 
+def live_field_renderer(container, labels: dict):
+    """Return an on_field callback that renders streamed result fields as soon as they complete"""
+    def on_field(path, value):
+        if len(path) == 1 and path[0] in labels and isinstance(value, str):
+            container.markdown(f"**{labels[path[0]]}:** {value}")
+        elif len(path) == 2 and path[0] == "shots" and isinstance(value, dict):
+            container.markdown(
+                f"🎥 **Shot {value.get('shot_number', path[1] + 1)}** ({value.get('duration', '')}): "
+                f"{value.get('description', '')}"
+            )
+    return on_field
+
+@contextmanager
+def ui_call_scope(calls: int = 1):
+    """
+    One button press: this session's request timeout and hedging setting cover every model call inside.
+
+    Args:
+        calls: Sequential model calls the press may make (a batch); the timeout is allowed for each
+    """
+    with deadline_scope(st.session_state.call_timeout * calls), hedging_scope(st.session_state.hedge):
+        yield
+
+def run_until_stopped(fn, on_tick, interval: float = 0.25):
+    """
+    Run fn() in a worker thread, calling on_tick() from the script while it runs.
+
+    Streamlit stops a script (navigate away, rerun) by raising at its next st
+    call, so on_tick is where that lands; the worker's token is then cancelled
+    and its queued requests and retries stop instead of finishing for nobody.
+    """
+    token = CancellationToken(current_deadline().token)
+    with deadline_scope(token=token):
+        context = contextvars.copy_context()
+    executor = ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(context.run, fn)
+    try:
+        while True:
+            try:
+                return future.result(timeout=interval)
+            except FutureTimeout:
+                on_tick()
+    except BaseException:
+        token.cancel("batch abandoned")
+        raise
+    finally:
+        executor.shutdown(wait=False)
+
+def show_failure(result):
+    """Explain an empty result caused by a timeout, cancellation or API error"""
+    outcome = outcome_of(result)
+    if outcome == "timeout":
+        st.warning(f"⏱️ Timed out after {st.session_state.call_timeout}s. "
+                   "Try again or raise the request timeout in Settings.")
+    elif outcome == "cancelled":
+        st.info("Generation cancelled")
+    elif outcome in ("error", "parse_error"):
+        st.error(f"Generation failed: {result.describe()}")
+
 # Emotion Preview
 def show_emotion_preview(emotion_name: str, intensity: str = "Medium"):
     details = EmotionEngine.get_emotion_details(emotion_name)
@@ -95,11 +161,17 @@ if "batch_results" not in st.session_state:
     st.session_state.batch_results = []
 if "custom_emotions" not in st.session_state:
     st.session_state.custom_emotions = {}
+if "call_timeout" not in st.session_state:
+    st.session_state.call_timeout = 120
+if "hedge" not in st.session_state:
+    st.session_state.hedge = False
 
 # Services
-svc = OpenAIService(api_key=API_KEY, model=st.session_state.model)
 template_mgr = TemplateManager()
 analytics = AnalyticsTracker()
+# Past calls seed the learned output lengths and latencies once per process
+svc = get_openai_service(API_KEY, st.session_state.model,
+                         metrics_sink=analytics.track_model_call, history=analytics.get_model_calls)
 
 # Header
 st.title("🎬 AI Prompt Studio Ultimate")
@@ -109,10 +181,33 @@ st.caption("✨ Emotion Engine™ | Audio Mapping | Batch Mode | Cultural Variat
 with st.sidebar:
     st.header("⚙️ Settings")
     st.session_state.model = st.text_input("OpenAI Model", value=st.session_state.model)
+    st.session_state.call_timeout = st.number_input(
+        "Request timeout (s)", min_value=15, max_value=600, value=st.session_state.call_timeout, step=15,
+        help="Longest a generation may take, including retries and model fallback "
+             "(a batch gets this for each request it makes)",
+    )
     st.divider()
     stats = analytics.get_dashboard_stats()
     st.metric("Generations", stats['total_generations'])
-    st.metric("Time Saved", f"{stats['time_saved_hours']}h")
+    call_stats = analytics.get_model_call_stats()
+    st.metric("Model Spend", f"${call_stats['total_cost_usd']:.2f}", help=f"{call_stats['total_calls']} model calls")
+    cache_stats = get_shared_cache().stats()
+    st.metric("Cache Hit Rate", f"{cache_stats['hit_rate']}%",
+              help=f"{cache_stats['hits']} hits / {cache_stats['misses']} misses")
+    st.metric("Spend Saved", f"${cache_stats['saved_cost_usd']:.2f}")
+    flight_stats = get_single_flight().get_stats()
+    st.metric("Coalesced Calls", flight_stats['coalesced'],
+              help=f"Duplicate in-flight requests answered by another call ({flight_stats['coalesced_rate']}%)")
+    st.session_state.hedge = st.checkbox(
+        "Hedge slow requests", value=st.session_state.hedge,
+        help="Send a duplicate of a Kling Motion call that runs past its p90 latency; "
+             "capped at 5% extra requests. Hedged calls show their result when complete "
+             "instead of streaming it.",
+    )
+    if st.session_state.hedge:
+        hedge_stats = get_hedge_policy().stats()
+        st.metric("Hedged Calls", hedge_stats['hedged'],
+                  help=f"{hedge_stats['hedge_rate']}% extra requests, {hedge_stats['hedge_wins']} won by the duplicate")
 
 # TABS
 tabs = st.tabs(["🎬 DrMotion Enhanced", "📋 Templates", "📊 Analytics", "🎨 Custom", "📸 Other Tools", "⚙️ Config"])
@@ -165,7 +260,7 @@ with tabs[0]:
 
         # Generate Button
         if img and st.button("🎬 Generate Ultra-Realistic Prompt", type="primary", use_container_width=True):
-            with st.spinner("Generating..."):
+            with st.spinner("Generating..."), ui_call_scope():
                 # Handle emotion mixing
                 if use_mixing:
                     # This would require enhancing openai_service to accept mixed emotions
@@ -179,6 +274,7 @@ with tabs[0]:
                 # Track analytics
                 analytics.track_generation("DrMotion", actual_emotion, motion, model_choice, intensity, 1, 0)
 
+            show_failure(dm_data)
             if dm_data:
                 st.success("✅ Generated!")
 
@@ -268,25 +364,61 @@ with tabs[0]:
         motion = st.selectbox("Motion", ["Walking Runway","Turning Head & Smiling","Drinking Coffee","Talking to Camera"], key="batch_motion")
 
         if img and variations and st.button("🚀 Generate Batch", type="primary"):
-            with st.spinner(f"Generating {len(variations)} variations..."):
+            with st.spinner(f"Generating {len(variations)} variations..."), \
+                    ui_call_scope(svc.drmotion_many_calls(len(variations))):
                 results = []
-                progress_bar = st.progress(0)
-
-                for i, var in enumerate(variations):
-                    try:
-                        emo = var.get("emotion", emotion)
-                        intens = var.get("intensity", "Medium")
-                        mod = var.get("model", "Kling 1.5")
-
-                        result = svc.drmotion_generate(img, mod, motion, emo, st.session_state.master_prompt, intens)
-                        result['variation'] = f"{emo} - {intens}" if batch_type != "Multiple Models" else mod
+                default_emotion = emotion if batch_type != "Multiple Emotions" else "Authentic / Natural"
+
+                # Journal each variation as it completes, so a rerun or restart resumes the batch
+                batch_proc = BatchProcessor()
+                jobs = batch_proc.create_batch_job(
+                    {"image": img, "motion": motion, "master_dna": st.session_state.master_prompt,
+                     "emotion": default_emotion},
+                    variations,
+                )
+                journal = BatchJournal.for_jobs(jobs)
+                resumed, pending = batch_proc.split_resumed(jobs, journal)
+                if resumed:
+                    st.info(f"♻️ Resumed {len(resumed)} of {len(jobs)} variations from an interrupted run")
+                by_batch_id = {r['batch_id']: r for r in resumed}
+                progress_bar = st.progress(len(resumed) / len(jobs))
+
+                # Runs in the worker thread: record only, the script thread draws the progress
+                def record_variant(index, result):
+                    job = pending[index]
+                    by_batch_id[job['batch_id']] = result
+                    if "error" not in result:
+                        journal.record(job, result)
+
+                master_dna = st.session_state.master_prompt
+                try:
+                    if pending:
+                        run_until_stopped(
+                            lambda: svc.drmotion_generate_many(
+                                img, [variations[job['batch_id'] - 1] for job in pending], motion,
+                                master_dna, emotion=default_emotion, intensity="Medium",
+                                model_choice="Kling 1.5", on_variant=record_variant,
+                            ),
+                            lambda: progress_bar.progress(len(by_batch_id) / len(jobs)),
+                        )
+                except Exception as e:
+                    for job in pending:
+                        by_batch_id.setdefault(job['batch_id'], {"error": str(e)})
+                progress_bar.progress(1.0)
+
+                for job in jobs:
+                    result = by_batch_id.get(job['batch_id']) or {"error": "Not generated"}
+                    if "emotion" not in result:
+                        result['variation'] = f"Variation {job['batch_id']}"
                         results.append(result)
-
+                        continue
+                    emo, intens, mod = result["emotion"], result["intensity"], result["model"]
+                    result['variation'] = f"{emo} - {intens}" if batch_type != "Multiple Models" else mod
+                    results.append(result)
+                    if "error" not in result and not result.get('resumed'):
                         analytics.track_generation("DrMotion Batch", emo, motion, mod, intens, 1, 0)
-                    except Exception as e:
-                        results.append({"error": str(e), "variation": f"Variation {i+1}"})
-
-                    progress_bar.progress((i + 1) / len(variations))
+                if all("error" not in r for r in results):
+                    journal.mark_complete()
 
                 st.session_state.batch_results = results
 
@@ -318,10 +450,11 @@ with tabs[0]:
         intensity = st.select_slider("Intensity", ["Subtle","Medium","Strong"], value="Medium", key="pr_int")
 
         if img and st.button("🎬 Generate Review Plan", type="primary"):
-            with st.spinner("Creating review..."):
+            with st.spinner("Creating review..."), ui_call_scope():
                 pr_data = svc.drmotion_product_review(img, product, language, emotion, st.session_state.master_prompt, intensity)
                 analytics.track_generation("Product Review", emotion, "Review", "", intensity, 1, 0)
 
+            show_failure(pr_data)
             if pr_data:
                 st.success("✅ Review Plan Ready!")
 
@@ -367,26 +500,67 @@ with tabs[0]:
                                    help="More frames = better motion detection but slower processing")
         with col2:
             vr_intensity = st.select_slider("Intensity", ["Subtle", "Medium", "Strong"], value="Medium", key="vr_int")
+        vr_selection = st.selectbox(
+            "Frame selection", ["Motion peaks", "Scene changes", "Evenly spaced"], key="vr_selection",
+            help="Motion peaks measures motion locally, sends frames around it (fewer for calm clips) "
+                 "and attaches the motion curve; Scene changes picks the biggest content changes"
+        )
+        dedup_col1, dedup_col2 = st.columns([1, 2])
+        with dedup_col1:
+            vr_dedup_on = st.checkbox("Drop near-duplicate frames", value=True, key="vr_dedup_on")
+        with dedup_col2:
+            vr_dedup = st.slider("Duplicate threshold (bits)", min_value=0, max_value=16, value=DEDUP_HAMMING,
+                                 key="vr_dedup", disabled=not vr_dedup_on,
+                                 help="Frames whose 64-bit perceptual hashes differ by this many bits or fewer "
+                                      "are sent once; 0 drops exact duplicates only")
 
         if video_file:
             st.video(video_file)
 
         if video_file and st.button("🔍 Analyze Video & Generate Prompts", type="primary", use_container_width=True):
+            motion = None
             with st.spinner("Extracting keyframes from video..."):
                 try:
-                    frames = extract_keyframes_from_video(video_file, num_frames=num_frames)
-                    st.success(f"Extracted {len(frames)} keyframes")
+                    extracted = extract_keyframes(
+                        video_file, num_frames=num_frames,
+                        selection={"Motion peaks": "motion", "Scene changes": "scene"}.get(vr_selection, "even"),
+                        dedup_threshold=vr_dedup if vr_dedup_on else None,
+                    )
+                    frames, motion, report = extracted["frames"], extracted["motion"], extracted["report"]
+                    note = ""
+                    if report["duplicates"]:
+                        note = (f" ({report['duplicates']} near-duplicate(s) dropped, "
+                                f"{report['replaced']} replaced by distinct frames nearby)")
+                    st.success(f"Sending {report['sent']} of {report['requested']} keyframes{note}")
                 except Exception as e:
                     st.error(f"Error extracting frames: {e}")
                     frames = None
 
+            if frames and motion:
+                st.line_chart({"Motion energy": motion["energy"]}, height=140)
+                st.caption(
+                    f"Moving {motion['active_ratio'] * 100:.0f}% of {motion['duration_s']:.1f}s · "
+                    f"{len(motion['transitions'])} cut(s) · keyframes at "
+                    + ", ".join(f"{k['t']:.1f}s ({k['reason']})" for k in motion["keyframes"])
+                )
+
             if frames:
-                with st.spinner("AI is analyzing motion, emotion & style... (this may take a moment)"):
+                live_box = st.empty()
+                with st.spinner("AI is analyzing motion, emotion & style... (this may take a moment)"), ui_call_scope():
                     vr_data = svc.drmotion_video_review(
-                        frames, st.session_state.master_prompt, vr_intensity
+                        frames, st.session_state.master_prompt, vr_intensity,
+                        on_field=live_field_renderer(live_box.container(), {
+                            "detected_motion": "Motion",
+                            "detected_emotion": "Emotion",
+                            "motion_style": "Style",
+                            "motion_details": "Motion Details",
+                        }),
+                        motion=motion,
                     )
+                    live_box.empty()
                     analytics.track_generation("Video Review", vr_data.get("detected_emotion", ""), vr_data.get("detected_motion", ""), "Multi", vr_intensity, 1, 0)
 
+                show_failure(vr_data)
                 if vr_data:
                     st.success("✅ Video Analysis Complete!")
 
@@ -573,16 +747,23 @@ with tabs[0]:
         # Generate Button
         if img and st.button("🎬 Generate Kling Motion Prompt", type="primary", use_container_width=True):
             km_data = None
-            with st.spinner(f"Generating {km_shots}-shot cinematic sequence for {km_model}..."):
+            live_box = st.empty()
+            with st.spinner(f"Generating {km_shots}-shot cinematic sequence for {km_model}..."), ui_call_scope():
                 try:
                     km_data = svc.drmotion_kling_motion(
                         img, km_category, km_elements, st.session_state.master_prompt,
-                        km_intensity, km_shots, km_setting_val, km_camera, km_model
+                        km_intensity, km_shots, km_setting_val, km_camera, km_model,
+                        on_field=live_field_renderer(live_box.container(), {
+                            "narrative_concept": "Narrative Concept",
+                            "kling_prompt": "Kling Prompt",
+                        })
                     )
+                    live_box.empty()
                     analytics.track_generation("Kling Motion", km_category, f"{km_shots}-shot", km_model, km_intensity, 1, 0)
                 except Exception as e:
                     st.error(f"Kling Motion generation failed: {type(e).__name__}: {e}")
 
+            show_failure(km_data)
             if km_data:
                 st.success(f"✅ {km_shots}-Shot Kling Motion Sequence Generated!")
 
@@ -752,8 +933,59 @@ with tabs[2]:
     col1, col2, col3, col4 = st.columns(4)
     col1.metric("Total Generations", stats['total_generations'])
     col2.metric("Avg Iterations", stats['avg_iterations'])
-    col3.metric("Time Saved", f"{stats['time_saved_hours']} hours")
-    col4.metric("Improvement", f"+{stats['improvement_rate']}%")
+    call_stats = analytics.get_model_call_stats()
+    col3.metric("Model Spend", f"${call_stats['total_cost_usd']:.2f}")
+    col4.metric("Model Calls", call_stats['total_calls'],
+                help=f"Cache hit rate: {call_stats['cache_hit_rate']}% · "
+                     f"Prompt tokens from provider cache: {call_stats['prompt_cache_rate']}%")
+
+    st.divider()
+
+    # Cost & latency from recorded model calls
+    col_cost, col_lat = st.columns(2)
+    with col_cost:
+        st.markdown("### 💰 Cost per Feature")
+        if call_stats['cost_by_feature']:
+            st.table([
+                {"Feature": name, "Calls": f["calls"], "Total $": f["cost_usd"], "Avg $": f["avg_cost_usd"],
+                 "Prompt tok": f["prompt_tokens"], "Cached tok": f["cached_tokens"],
+                 "Cached %": f["prompt_cache_rate"], "Output tok": f["completion_tokens"]}
+                for name, f in sorted(call_stats['cost_by_feature'].items(), key=lambda x: -x[1]["cost_usd"])
+            ])
+        else:
+            st.info("No model calls recorded yet")
+    with col_lat:
+        st.markdown("### ⏱️ Latency per Model")
+        if call_stats['latency_by_model']:
+            st.table([
+                {"Model": model, "Calls": m["calls"], "p50 ms": m["p50_ms"], "p95 ms": m["p95_ms"],
+                 "TTFB p50 ms": m["ttfb_p50_ms"]}
+                for model, m in call_stats['latency_by_model'].items()
+            ])
+        else:
+            st.info("No model calls recorded yet")
+
+    if call_stats['latency_by_route']:
+        st.markdown("### 🔀 Model Routes")
+        demoted = {name for name, r in svc.router.stats().items() if r["demoted"]}
+        st.table([
+            {"Route": name, "Calls": r["calls"], "p50 ms": r["p50_ms"], "p90 ms": r["p90_ms"],
+             "Demoted": "yes" if name.rsplit(" (", 1)[0] in demoted else ""}
+            for name, r in sorted(call_stats['latency_by_route'].items())
+        ])
+        if call_stats['fallbacks_by_feature']:
+            st.caption("Fallback answers: " + ", ".join(
+                f"{feature} {count}" for feature, count in sorted(call_stats['fallbacks_by_feature'].items())
+            ))
+
+    budget_stats = svc.token_budget.stats()
+    if budget_stats:
+        st.markdown("### 📏 Output Length per Feature")
+        st.table([
+            {"Feature": name, "Samples": b["samples"], "p50 tok": b["p50"], "p95 tok": b["p95"],
+             "max_tokens": b["max_tokens"] or "default", "Truncated": b["truncations"]}
+            for name, b in sorted(budget_stats.items())
+        ])
 
     st.divider()
 
@@ -926,7 +1158,7 @@ with tabs[4]:
         st.divider()
 
         if img and st.button("🎯 Generate Scene Transfer Prompt", type="primary", use_container_width=True):
-            with st.spinner("🔬 Analyzing scene (extracting pose, lighting, camera, background)..."):
+            with st.spinner("🔬 Analyzing scene (extracting pose, lighting, camera, background)..."), ui_call_scope():
                 # Call cloner with all parameters
                 data = svc.cloner_analyze_filelike(
                     img,
@@ -1020,7 +1252,7 @@ with tabs[4]:
         identity_lock = st.checkbox("🔒 Enable Identity Lock", value=True, help="Maintain character identity from Master DNA")
 
         if pimg and st.button("🔬 Analyze Schema", type="primary"):
-            with st.spinner("Performing detailed analysis..."):
+            with st.spinner("Performing detailed analysis..."), ui_call_scope():
                 data = svc.perfectcloner_analyze_filelike(pimg, st.session_state.master_prompt, identity_lock)
 
             st.success("✅ Schema Analysis Complete!")
@@ -1060,9 +1292,10 @@ with tabs[4]:
             st.rerun()
 
         if ref_img and st.button("📊 Generate 20-Angle Plan", type="primary"):
-            with st.spinner("Planning 20 unique angles..."):
+            with st.spinner("Planning 20 unique angles..."), ui_call_scope():
                 plan = svc.multi_angle_planner_filelike(ref_img, st.session_state.master_prompt)
 
+            show_failure(plan)
             if plan:
                 st.session_state.multi_angle_data = plan
                 st.success("✅ 20-Angle Plan Generated!")
@@ -1108,7 +1341,7 @@ with tabs[4]:
         st.info("💡 Tip: Upload an image showing the outfit you want. The tool will extract the clothing and fuse it with your character.")
 
         if wardrobe_img and st.button("🧵 Analyze & Wear Outfit", type="primary"):
-            with st.spinner("Extracting outfit details and fusing with character..."):
+            with st.spinner("Extracting outfit details and fusing with character..."), ui_call_scope():
                 w_data = svc.wardrobe_fuse_filelike(wardrobe_img, st.session_state.master_prompt)
 
             st.success("✅ Outfit Fused!")
@@ -1202,7 +1435,7 @@ with tabs[4]:
             num_variations = st.slider("Number of Variations", 3, 7, 5, key="poser_num")
 
         if poser_img and st.button("🎭 Generate Pose Variations", type="primary"):
-            with st.spinner("Creating pose variations..."):
+            with st.spinner("Creating pose variations..."), ui_call_scope():
                 st.session_state.poser_data = svc.poser_variations_filelike(poser_img, st.session_state.master_prompt, pose_style)
 
             st.success(f"✅ Generated {num_variations} Pose Variations!")
@@ -1267,7 +1500,7 @@ with tabs[4]:
         num_hashtags = st.slider("Number of Hashtags", 3, 10, 4, key="cap_hashtags")
 
         if cap_img and st.button("✍️ Generate Caption", type="primary"):
-            with st.spinner("Writing caption..."):
+            with st.spinner("Writing caption..."), ui_call_scope():
                 # Extract base style
                 style_map = {
                     "Funny & Witty": "Funny",
@@ -1313,6 +1546,22 @@ with tabs[5]:
 
     st.divider()
 
+    st.markdown("### Rate Limits")
+    st.caption("Your OpenAI account's per-minute limits, shared by every session on this server. "
+               "Set OPENAI_RPM / OPENAI_TPM to start with them; the API's rate-limit headers "
+               "correct them after the first call.")
+    current_limits = svc.rate_limiter.limits
+    col1, col2 = st.columns(2)
+    with col1:
+        limit_rpm = st.number_input("Requests per minute", min_value=1, value=current_limits["rpm"], step=100)
+    with col2:
+        limit_tpm = st.number_input("Tokens per minute", min_value=1000, value=current_limits["tpm"], step=10000)
+    if st.button("Apply Limits"):
+        configure_rate_limits(rpm=int(limit_rpm), tpm=int(limit_tpm))
+        st.success("Rate limits updated")
+
+    st.divider()
+
     st.markdown("### API Keys")
     st.caption("Add additional API keys for advanced features")
 
@@ -0,0 +1,231 @@
+"""
+Async OpenAI Service
+====================
+AsyncOpenAI-backed twin of OpenAIService.
+All calls share one HTTP connection pool so a single worker can keep
+dozens of generations in flight. The call pipeline (rate limiting,
+retries, routing, hedging, continuations, repair) is OpenAIService's;
+this class only awaits the I/O steps it yields.
+"""
+
+import asyncio
+from typing import Any, Callable, Dict, Generator, List, Optional
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from call_metrics import install_ttfb_hook
+from hedging import HedgePolicy
+from image_preprocessor import EncodedImageMemo
+from model_router import ModelRouter
+from openai_service import OpenAIService, VariantCallback
+from rate_limiter import RateLimiter, RetryPolicy
+from response_cache import ResponseCache
+from single_flight import SingleFlight
+from token_budget import TokenBudget
+from transport import OpenAITransport
+
+
+class AsyncOpenAIService(OpenAIService):
+    """
+    Coroutine versions of the OpenAIService feature methods.
+
+    Prompt building, caching, parsing and the call pipeline are inherited
+    from OpenAIService; only the network calls and waits are awaited. Non-API helpers (prompter_build,
+    build_physics_prompt) stay synchronous.
+    """
+
+    def __init__(self, api_key: str, model: str = "gpt-4o", cache: Optional[ResponseCache] = None,
+                 image_profiles: Optional[Dict[str, Dict[str, Any]]] = None,
+                 image_memo: Optional[EncodedImageMemo] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 http_client=None,
+                 max_connections: int = 64, max_keepalive_connections: int = 32,
+                 metrics_sink: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 transport=None,
+                 single_flight: Optional[SingleFlight] = None,
+                 structured_outputs: bool = True,
+                 token_budget: Optional[TokenBudget] = None,
+                 router: Optional[ModelRouter] = None,
+                 hedge_policy: Optional[HedgePolicy] = None,
+                 call_timeout: Optional[float] = 180.0):
+        """
+        Initialize async service.
+
+        Args:
+            api_key: OpenAI API key
+            model: Chat model used for every feature
+            cache: Optional shared ResponseCache
+            image_profiles: Per-feature overrides for upload preprocessing
+            image_memo: Shared encoded-image memo
+            rate_limiter: Limiter for the default model (defaults to the process-wide one)
+            retry_policy: Backoff for retried calls
+            http_client: Sync HTTP client for the inherited blocking methods
+            max_connections: Upper bound on concurrent HTTP connections in the pool
+            max_keepalive_connections: Idle connections kept open for reuse
+            metrics_sink: Callback receiving one usage/latency record per call
+            transport: Optional Recording/ReplayTransport (defaults to the API)
+            single_flight: Coalesces identical concurrent requests (defaults to the process-wide one)
+            structured_outputs: Send per-feature strict JSON schemas
+            token_budget: Learned per-feature max_tokens (defaults to the process-wide one)
+            router: Per-feature model routing (defaults to the process-wide one)
+            hedge_policy: Race a duplicate of slow calls past the feature's p90 (None disables)
+            call_timeout: Seconds allowed per feature call, retries and fallback included
+        """
+        super().__init__(api_key=api_key, model=model, cache=cache,
+                         image_profiles=image_profiles, image_memo=image_memo,
+                         rate_limiter=rate_limiter, retry_policy=retry_policy, http_client=http_client,
+                         metrics_sink=metrics_sink, transport=transport, single_flight=single_flight,
+                         structured_outputs=structured_outputs, token_budget=token_budget,
+                         router=router, hedge_policy=hedge_policy, call_timeout=call_timeout)
+        http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            )
+        )
+        install_ttfb_hook(http_client, is_async=True)
+        self.async_client = AsyncOpenAI(api_key=api_key, max_retries=0, http_client=http_client)
+        if transport is None:
+            self.transport = OpenAITransport(self.client, self.async_client,
+                                             on_headers=self._observe_rate_headers)
+
+    async def aclose(self):
+        """Close the shared connection pool"""
+        await self.async_client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    # -------------------- DR. MOTION (VIDEO) --------------------
+
+    async def drmotion_generate(self, uploaded_file, model_choice: str, motion_type: str,
+                                emotion: str, master_dna: str, intensity: str = "Medium") -> Dict[str, Any]:
+        return await self._acall_chat_json(**self._build_drmotion_generate(
+            uploaded_file, model_choice, motion_type, emotion, master_dna, intensity
+        ))
+
+    async def drmotion_generate_many(self, uploaded_file, variations: List[Dict[str, Any]], motion_type: str,
+                                     master_dna: str, emotion: str = "Authentic / Natural",
+                                     intensity: str = "Medium", model_choice: str = "Kling 1.5",
+                                     max_tokens: int = 4000,
+                                     on_variant: Optional[VariantCallback] = None) -> List[Dict[str, Any]]:
+        """Async drmotion_generate_many; split chunks are requested concurrently"""
+        variants = self._normalize_variants(variations, emotion, intensity, model_choice)
+        chunks = self._chunk_variants(variants, max_tokens)
+        responses = await asyncio.gather(*(
+            self._acall_chat_json(**self._build_drmotion_generate_many(
+                uploaded_file, chunk, motion_type, master_dna, max_tokens
+            ))
+            for chunk in chunks
+        ))
+        results: Dict[int, Dict[str, Any]] = {}
+        for chunk, data in zip(chunks, responses):
+            collected = self._collect_variants(chunk, data)
+            results.update(collected)
+            self._notify_variants(on_variant, variants, collected)
+
+        missing = [variant for variant in variants if variant["variation_id"] not in results]
+        retried = await asyncio.gather(*(
+            self.drmotion_generate(uploaded_file, variant["model"], motion_type, variant["emotion"],
+                                   master_dna, variant["intensity"])
+            for variant in missing
+        ))
+        for variant, data in zip(missing, retried):
+            results[variant["variation_id"]] = data
+        self._notify_variants(on_variant, variants, {variant["variation_id"]: data
+                                                     for variant, data in zip(missing, retried)})
+        return [self._label_variant(variant, results[variant["variation_id"]]) for variant in variants]
+
+    async def drmotion_product_review(self, uploaded_file, product_info: str, language: str,
+                                      emotion: str, master_dna: str, intensity: str = "Medium") -> Dict[str, Any]:
+        return await self._acall_chat_json(**self._build_drmotion_product_review(
+            uploaded_file, product_info, language, emotion, master_dna, intensity
+        ))
+
+    async def drmotion_kling_motion(self, uploaded_file, category: str, elements: list,
+                                    master_dna: str, intensity: str = "Medium",
+                                    num_shots: int = 3, setting: str = "Auto-detect",
+                                    camera_style: str = "Dynamic Mix",
+                                    model_target: str = "Kling 3.0") -> Dict[str, Any]:
+        return await self._acall_chat_json(**self._build_drmotion_kling_motion(
+            uploaded_file, category, elements, master_dna, intensity,
+            num_shots, setting, camera_style, model_target
+        ))
+
+    async def drmotion_video_review(self, frames_data_urls: list, master_dna: str,
+                                    intensity: str = "Medium",
+                                    motion: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return await self._acall_chat_json(**self._build_drmotion_video_review(
+            frames_data_urls, master_dna, intensity, motion
+        ))
+
+    # -------------------- IMAGE TOOLS --------------------
+
+    async def wardrobe_fuse_filelike(self, uploaded_file, master_dna: str) -> Dict[str, Any]:
+        return await self._acall_chat_json(**self._build_wardrobe_fuse_filelike(uploaded_file, master_dna))
+
+    async def multi_angle_planner_filelike(self, uploaded_file, master_dna: str) -> Dict[str, Any]:
+        return await self._acall_chat_json(**self._build_multi_angle_planner_filelike(uploaded_file, master_dna))
+
+    async def captions_generate_filelike(self, uploaded_file, style: str = "Engaging",
+                                         language: str = "English") -> Dict[str, Any]:
+        data = await self._acall_chat_json(**self._build_captions_generate_filelike(uploaded_file, style, language))
+        return self._postprocess_captions(data)
+
+    async def cloner_analyze_filelike(self, uploaded_file, master_dna: str,
+                                      use_custom_hairstyle: bool = False,
+                                      custom_hairstyle: str = "",
+                                      use_custom_attire: bool = False,
+                                      custom_attire: str = "",
+                                      use_custom_makeup: bool = False,
+                                      custom_makeup: str = "") -> Dict[str, Any]:
+        return await self._acall_chat_json(**self._build_cloner_analyze_filelike(
+            uploaded_file, master_dna, use_custom_hairstyle, custom_hairstyle,
+            use_custom_attire, custom_attire, use_custom_makeup, custom_makeup
+        ))
+
+    async def perfectcloner_analyze_filelike(self, uploaded_file, master_dna: str,
+                                             identity_lock: bool = True) -> Dict[str, Any]:
+        return await self._acall_chat_json(**self._build_perfectcloner_analyze_filelike(
+            uploaded_file, master_dna, identity_lock
+        ))
+
+    async def poser_variations_filelike(self, uploaded_file, master_dna: str, pose_style: str) -> Dict[str, Any]:
+        return await self._acall_chat_json(**self._build_poser_variations_filelike(uploaded_file, master_dna, pose_style))
+
+    # -------------------- HELPERS --------------------
+
+    async def _arun(self, stage: Generator) -> Any:
+        """Async _run: drive a pipeline stage, awaiting each step it yields"""
+        send, value = stage.send, None
+        while True:
+            try:
+                step = send(value)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                send, value = stage.send, await self._aperform(step)
+            except BaseException as e:
+                send, value = stage.throw, e
+
+    async def _aperform(self, step: tuple) -> Any:
+        kind = step[0]
+        if kind == "create":
+            return await self.transport.acreate(**step[1])
+        if kind == "sleep":
+            return await step[1].asleep(step[2])
+        if kind == "hedge":
+            # The losing attempt is cancelled
+            return await self.hedge_policy.arun(step[1], lambda: self._arun(step[2]()))
+        if kind == "flight":
+            return await self.single_flight.ado(step[1], lambda: self._arun(step[2]()))
+        raise ValueError(f"Unknown pipeline step: {kind}")
+
+    async def _acall_chat_json(self, messages: list, max_tokens: int = 1000,
+                               feature: str = "general") -> Dict[str, Any]:
+        return await self._arun(self._chat_json_stage(messages, max_tokens, feature))
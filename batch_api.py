@@ -0,0 +1,229 @@
+"""
+Batch API
+=========
+Offline mode for large catalogue runs: chat requests are written as an
+OpenAI Batch API JSONL file, handed to a submitter, and the result file is
+read back keyed by custom_id ("batch-<batch_id>").
+
+Submitters share two methods:
+    submit(input_path) -> job_id
+    poll(job_id) -> {"status", "output_path", "completed", "total"}
+"""
+
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import Any, Callable, Dict, List
+
+from feature_schemas import response_format_for
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+# Batch statuses after which no more results will arrive
+FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def custom_id_for(batch_id: Any) -> str:
+    """custom_id used in the JSONL for a BatchProcessor job"""
+    return f"batch-{batch_id}"
+
+
+def build_batch_line(custom_id: str, model: str, request: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    One Batch API input line for a request built by OpenAIService.
+
+    Args:
+        custom_id: Identifier echoed back in the result file
+        model: Chat model
+        request: {"messages", "max_tokens", "feature"} from an OpenAIService _build_* helper;
+                 the feature's strict schema is used as response_format when it has one
+    """
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {
+            "model": model,
+            "messages": request["messages"],
+            "max_tokens": request.get("max_tokens", 1000),
+            "response_format": response_format_for(request.get("feature", "")),
+        },
+    }
+
+
+def write_batch_file(path: str, lines: List[Dict[str, Any]]) -> str:
+    """Write input lines as JSONL and return the path"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        for line in lines:
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+    return path
+
+
+def read_batch_results(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Read a Batch API output (or error) file.
+
+    Returns:
+        {custom_id: {"content": str or None, "usage": dict, "error": str or None}}
+    """
+    results = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for raw in f:
+            raw = raw.strip()
+            if not raw:
+                continue
+            try:
+                line = json.loads(raw)
+            except ValueError:
+                continue
+            custom_id = line.get("custom_id")
+            if not custom_id:
+                continue
+            response = line.get("response") or {}
+            body = response.get("body") or {}
+            error = line.get("error")
+            if not error and response.get("status_code", 200) != 200:
+                error = body.get("error") or f"HTTP {response.get('status_code')}"
+            if isinstance(error, dict):
+                error = error.get("message") or error.get("code") or json.dumps(error)
+
+            content = None
+            choices = body.get("choices") or []
+            if not error and choices:
+                content = (choices[0].get("message") or {}).get("content")
+            results[custom_id] = {
+                "content": content,
+                "usage": body.get("usage") or {},
+                "error": error,
+            }
+    return results
+
+
+class OpenAIBatchSubmitter:
+    """Submits JSONL files to the OpenAI Batch API and downloads the results"""
+
+    def __init__(self, client, download_dir: str = ".batch_jobs", completion_window: str = "24h"):
+        """
+        Args:
+            client: openai.OpenAI client (e.g. OpenAIService.client)
+            download_dir: Where result files are saved locally
+            completion_window: Batch completion window
+        """
+        self.client = client
+        self.download_dir = download_dir
+        self.completion_window = completion_window
+
+    def submit(self, input_path: str) -> str:
+        with open(input_path, 'rb') as f:
+            uploaded = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=self.completion_window,
+        )
+        return batch.id
+
+    def poll(self, job_id: str) -> Dict[str, Any]:
+        batch = self.client.batches.retrieve(job_id)
+        counts = getattr(batch, "request_counts", None)
+        status = {
+            "status": batch.status,
+            "output_path": None,
+            "completed": (getattr(counts, "completed", 0) or 0) + (getattr(counts, "failed", 0) or 0),
+            "total": getattr(counts, "total", 0) or 0,
+        }
+        if batch.status not in FINAL_STATUSES:
+            return status
+
+        # Expired/cancelled batches can still carry partial output
+        file_ids = [fid for fid in (batch.output_file_id, batch.error_file_id) if fid]
+        if file_ids:
+            os.makedirs(self.download_dir, exist_ok=True)
+            output_path = os.path.join(self.download_dir, f"{job_id}_output.jsonl")
+            with open(output_path, 'w', encoding='utf-8') as f:
+                for file_id in file_ids:
+                    text = self.client.files.content(file_id).text
+                    f.write(text if text.endswith("\n") else text + "\n")
+            status["output_path"] = output_path
+        return status
+
+
+class DirectoryBatchSubmitter:
+    """
+    Local stand-in for the Batch API, for testing offline runs.
+
+    Input files are copied to <root>/inbox/<job_id>.jsonl; a job is complete
+    once <root>/outbox/<job_id>.jsonl exists. The outbox can be filled by
+    any external worker, or by answer_pending() with a local responder.
+    """
+
+    def __init__(self, root: str = ".batch_jobs/local"):
+        self.inbox = os.path.join(root, "inbox")
+        self.outbox = os.path.join(root, "outbox")
+        os.makedirs(self.inbox, exist_ok=True)
+        os.makedirs(self.outbox, exist_ok=True)
+
+    def submit(self, input_path: str) -> str:
+        job_id = f"local_{uuid.uuid4().hex[:12]}"
+        shutil.copyfile(input_path, os.path.join(self.inbox, f"{job_id}.jsonl"))
+        return job_id
+
+    def poll(self, job_id: str) -> Dict[str, Any]:
+        output_path = os.path.join(self.outbox, f"{job_id}.jsonl")
+        if os.path.exists(output_path):
+            return {"status": "completed", "output_path": output_path, "completed": 0, "total": 0}
+        if not os.path.exists(os.path.join(self.inbox, f"{job_id}.jsonl")):
+            return {"status": "failed", "output_path": None, "completed": 0, "total": 0}
+        return {"status": "in_progress", "output_path": None, "completed": 0, "total": 0}
+
+    def answer_pending(self, responder: Callable[[Dict[str, Any]], str]) -> int:
+        """
+        Write Batch-API-format results for every unanswered inbox file.
+
+        Args:
+            responder: Receives a request body and returns the completion text;
+                       an exception becomes an error line for that request
+
+        Returns:
+            Number of jobs answered
+        """
+        answered = 0
+        for name in sorted(os.listdir(self.inbox)):
+            output_path = os.path.join(self.outbox, name)
+            if not name.endswith(".jsonl") or os.path.exists(output_path):
+                continue
+            lines = []
+            with open(os.path.join(self.inbox, name), 'r', encoding='utf-8') as f:
+                for raw in f:
+                    if not raw.strip():
+                        continue
+                    request = json.loads(raw)
+                    try:
+                        content = responder(request["body"])
+                        lines.append({
+                            "id": f"req_{uuid.uuid4().hex[:12]}",
+                            "custom_id": request["custom_id"],
+                            "response": {"status_code": 200, "body": {
+                                "object": "chat.completion",
+                                "created": int(time.time()),
+                                "model": request["body"].get("model"),
+                                "choices": [{"index": 0, "finish_reason": "stop",
+                                             "message": {"role": "assistant", "content": content}}],
+                                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                            }},
+                            "error": None,
+                        })
+                    except Exception as e:
+                        lines.append({
+                            "id": f"req_{uuid.uuid4().hex[:12]}",
+                            "custom_id": request["custom_id"],
+                            "response": None,
+                            "error": {"code": type(e).__name__, "message": str(e)},
+                        })
+            # Write then rename so poll() never sees a half-written file
+            write_batch_file(output_path + ".tmp", lines)
+            os.replace(output_path + ".tmp", output_path)
+            answered += 1
+        return answered
@@ -0,0 +1,146 @@
+"""
+Batch Journal
+=============
+Write-ahead log for batch runs: each job's result is appended to a JSONL
+file the moment it completes, so a batch interrupted by a Streamlit rerun
+or a process restart resumes by re-running only the unfinished jobs.
+
+Journals are keyed by the batch's content (image bytes, prompts and
+variations), so submitting the same batch again finds its journal. A
+journal that finished, or is older than max_age_hours, starts over.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+JOURNAL_DIR = ".batch_jobs/journal"
+
+
+def _stable(value: Any) -> Any:
+    """JSON-safe stand-in for a job value; uploads and bytes become content hashes"""
+    if isinstance(value, dict):
+        return {str(k): _stable(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_stable(v) for v in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if hasattr(value, "getvalue"):
+        value = value.getvalue()
+    if isinstance(value, (bytes, bytearray)):
+        return "sha256:" + hashlib.sha256(value).hexdigest()
+    return type(value).__name__
+
+
+def job_key(job: Dict[str, Any]) -> str:
+    """Identity of one job's request (its position in the batch is ignored)"""
+    payload = {k: v for k, v in job.items() if k != "batch_id"}
+    return hashlib.sha256(json.dumps(_stable(payload), sort_keys=True).encode("utf-8")).hexdigest()[:24]
+
+
+def batch_key(jobs: List[Dict[str, Any]]) -> str:
+    """Identity of a whole batch, used as the journal file name"""
+    keys = sorted(job_key(job) for job in jobs)
+    return hashlib.sha256("\n".join(keys).encode("utf-8")).hexdigest()[:24]
+
+
+class BatchJournal:
+    """Append-only record of completed jobs for one batch"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: JSONL file; created on the first record
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._complete = False
+        self._started_at: Optional[float] = None
+        self._load()
+
+    @classmethod
+    def for_jobs(cls, jobs: List[Dict[str, Any]], root: str = JOURNAL_DIR,
+                 max_age_hours: float = 24.0) -> "BatchJournal":
+        """
+        Journal for a batch, resuming an interrupted run of the same jobs.
+
+        Args:
+            jobs: Jobs from BatchProcessor.create_batch_job
+            root: Directory holding journal files
+            max_age_hours: Older journals are not resumed
+        """
+        journal = cls(os.path.join(root, f"{batch_key(jobs)}.jsonl"))
+        stale = journal._started_at is not None and time.time() - journal._started_at > max_age_hours * 3600
+        if journal._complete or stale:
+            journal.reset()
+        return journal
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for raw in f:
+                    try:
+                        entry = json.loads(raw)
+                    except ValueError:
+                        # Last line of a run killed mid-write
+                        continue
+                    if self._started_at is None:
+                        self._started_at = entry.get("recorded_at")
+                    if entry.get("event") == "complete":
+                        self._complete = True
+                    elif entry.get("job_key"):
+                        self._results[entry["job_key"]] = entry.get("result") or {}
+        except Exception as e:
+            print(f"Error loading batch journal: {e}")
+
+    def _append(self, entry: Dict[str, Any]):
+        """Write one line and fsync it, so a crash right after still keeps the result"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception as e:
+            print(f"Error writing batch journal: {e}")
+
+    def completed(self) -> Dict[str, Dict[str, Any]]:
+        """{job_key: result} for every job already recorded"""
+        with self._lock:
+            return dict(self._results)
+
+    def record(self, job: Dict[str, Any], result: Dict[str, Any]):
+        """Persist a finished job's result"""
+        key = job_key(job)
+        now = time.time()
+        with self._lock:
+            self._results[key] = result
+            if self._started_at is None:
+                self._started_at = now
+            self._append({"job_key": key, "batch_id": job.get("batch_id"), "result": result,
+                          "recorded_at": now})
+
+    def mark_complete(self):
+        """Every job succeeded; the next submission of this batch starts fresh"""
+        with self._lock:
+            self._complete = True
+            self._append({"event": "complete", "recorded_at": time.time()})
+
+    def reset(self):
+        """Forget all recorded results"""
+        with self._lock:
+            self._results.clear()
+            self._complete = False
+            self._started_at = None
+            try:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+            except Exception as e:
+                print(f"Error resetting batch journal: {e}")
@@ -4,10 +4,18 @@ Batch Processor
 Generate multiple prompt variations simultaneously
 """
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+import asyncio
+import os
 import time
 
+from batch_api import FINAL_STATUSES, build_batch_line, custom_id_for, read_batch_results, write_batch_file
+from batch_journal import BatchJournal, job_key
+from deadline import (Cancelled, CancellationToken, Deadline, DeadlineExceeded, FailedCall,
+                      current_deadline, use_deadline)
+
 
 class BatchProcessor:
     """Process multiple generation requests in batch"""
@@ -43,9 +51,86 @@ class BatchProcessor:
         
         return jobs
     
+    @staticmethod
+    def _batch_deadline(timeout: Optional[float], cancel_token: Optional[CancellationToken]) -> Deadline:
+        """
+        Deadline shared by every job of one batch (nested in the caller's scope).
+
+        The batch gets its own token, cancelled with cancel_token or the enclosing
+        scope's token, so abandoning the batch does not cancel either of those.
+        """
+        outer = current_deadline()
+        return outer.within(timeout, CancellationToken(cancel_token, outer.token))
+
+    @staticmethod
+    def _run_job(processor_func, job: Dict[str, Any], deadline: Deadline,
+                 journal: Optional[BatchJournal] = None):
+        """Worker body: jobs still queued when the batch is cancelled or expires never start"""
+        with use_deadline(deadline):
+            deadline.check()
+            result = processor_func(job)
+        # Journal from the worker, so results land even if the caller has gone away
+        if journal is not None and result and not isinstance(result, FailedCall):
+            journal.record(job, result)
+        return result
+
+    def split_resumed(self, jobs: List[Dict[str, Any]],
+                      journal: Optional[BatchJournal]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Separate jobs already finished in a journal from those still to run.
+        
+        Returns:
+            (resumed results marked 'resumed': True, pending jobs)
+        """
+        if journal is None:
+            return [], list(jobs)
+        done = journal.completed()
+        resumed, pending = [], []
+        for job in jobs:
+            saved = done.get(job_key(job))
+            if saved is None:
+                pending.append(job)
+            else:
+                result = self._job_result(job, result=dict(saved))
+                result['resumed'] = True
+                resumed.append(result)
+        return resumed, pending
+
+    @staticmethod
+    def _finish_journal(journal: Optional[BatchJournal], results: List[Dict[str, Any]]):
+        if journal is not None and results and all(r.get('success') for r in results):
+            journal.mark_complete()
+
+    @staticmethod
+    def _job_result(job: Dict[str, Any], result: Optional[Dict[str, Any]] = None,
+                    error: Optional[Exception] = None) -> Dict[str, Any]:
+        """Result entry for one job; timeouts and cancellations get their own outcome"""
+        if error is None and not isinstance(result, FailedCall):
+            result['batch_id'] = job['batch_id']
+            result['success'] = True
+            return result
+        if isinstance(result, FailedCall):
+            outcome, message = result.outcome, result.describe()
+        elif isinstance(error, Cancelled):
+            outcome, message = "cancelled", f"Cancelled ({error})"
+        elif isinstance(error, DeadlineExceeded):
+            outcome, message = "timeout", str(error)
+        else:
+            outcome, message = "error", str(error)
+        return {
+            'batch_id': job['batch_id'],
+            'success': False,
+            'outcome': outcome,
+            'error': message,
+            'job': job
+        }
+
     def process_batch(self, jobs: List[Dict[str, Any]], 
                      processor_func, 
-                     on_progress=None) -> List[Dict[str, Any]]:
+                     on_progress=None,
+                     timeout: Optional[float] = None,
+                     cancel_token: Optional[CancellationToken] = None,
+                     journal: Optional[BatchJournal] = None) -> List[Dict[str, Any]]:
         """
         Process batch of jobs concurrently.
         
@@ -53,18 +138,28 @@ class BatchProcessor:
             jobs: List of parameter dicts
             processor_func: Function to call for each job (should accept job dict)
             on_progress: Optional callback function(completed, total)
+            timeout: Seconds allowed for the whole batch; model calls inside the
+                     jobs get the remaining time as their HTTP timeout
+            cancel_token: Cancel to stop queued jobs and pending retries
+            journal: Records each result as it completes; jobs already in it are
+                     not run again (e.g. BatchJournal.for_jobs(jobs))
         
         Returns:
-            List of results
+            List of results; failed jobs carry 'outcome' ("timeout", "cancelled" or "error")
         """
-        results = []
-        total = len(jobs)
-        completed = 0
+        results, jobs = self.split_resumed(jobs, journal)
+        total = len(jobs) + len(results)
+        completed = len(results)
+        deadline = self._batch_deadline(timeout, cancel_token)
+        if completed and on_progress:
+            on_progress(completed, total)
         
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        abandoned = False
+        try:
             # Submit all jobs
             future_to_job = {
-                executor.submit(processor_func, job): job 
+                executor.submit(self._run_job, processor_func, job, deadline, journal): job 
                 for job in jobs
             }
             
@@ -72,27 +167,208 @@ class BatchProcessor:
             for future in as_completed(future_to_job):
                 job = future_to_job[future]
                 try:
-                    result = future.result()
-                    result['batch_id'] = job['batch_id']
-                    result['success'] = True
-                    results.append(result)
+                    results.append(self._job_result(job, result=future.result()))
                 except Exception as e:
-                    results.append({
-                        'batch_id': job['batch_id'],
-                        'success': False,
-                        'error': str(e),
-                        'job': job
-                    })
+                    results.append(self._job_result(job, error=e))
                 
                 completed += 1
                 if on_progress:
                     on_progress(completed, total)
+        except BaseException:
+            # The caller went away (e.g. Streamlit stopped the script): drop queued
+            # jobs and stop retries instead of finishing the batch for nobody
+            abandoned = True
+            deadline.token.cancel("batch abandoned")
+            raise
+        finally:
+            executor.shutdown(wait=not abandoned, cancel_futures=abandoned)
         
         # Sort by batch_id to maintain order
         results.sort(key=lambda x: x['batch_id'])
+        self._finish_journal(journal, results)
         
         return results
     
+    async def process_batch_async(self, jobs: List[Dict[str, Any]],
+                                  processor_coro,
+                                  on_progress=None,
+                                  max_in_flight: Optional[int] = None,
+                                  timeout: Optional[float] = None,
+                                  cancel_token: Optional[CancellationToken] = None,
+                                  journal: Optional[BatchJournal] = None) -> List[Dict[str, Any]]:
+        """
+        Process batch of jobs concurrently on a single event loop.
+        
+        Args:
+            jobs: List of parameter dicts
+            processor_coro: Coroutine function to await for each job (should accept job dict),
+                            e.g. a wrapper around AsyncOpenAIService.drmotion_generate
+            on_progress: Optional callback function(completed, total)
+            max_in_flight: Maximum concurrent requests (defaults to max_workers)
+            timeout: Seconds allowed for the whole batch
+            cancel_token: Cancel to stop jobs still waiting for a slot
+            journal: Records each result as it completes; finished jobs are skipped
+        
+        Returns:
+            List of results, sorted by batch_id
+        """
+        semaphore = asyncio.Semaphore(max_in_flight or self.max_workers)
+        resumed, jobs = self.split_resumed(jobs, journal)
+        total = len(jobs) + len(resumed)
+        completed = len(resumed)
+        deadline = self._batch_deadline(timeout, cancel_token)
+        
+        async def run_job(job):
+            nonlocal completed
+            async with semaphore:
+                try:
+                    with use_deadline(deadline):
+                        deadline.check()
+                        raw = await processor_coro(job)
+                    if journal is not None and raw and not isinstance(raw, FailedCall):
+                        journal.record(job, raw)
+                    result = self._job_result(job, result=raw)
+                except Exception as e:
+                    result = self._job_result(job, error=e)
+            completed += 1
+            if on_progress:
+                on_progress(completed, total)
+            return result
+        
+        results = await asyncio.gather(*(run_job(job) for job in jobs))
+        results = sorted(resumed + list(results), key=lambda x: x['batch_id'])
+        self._finish_journal(journal, results)
+        return results
+    
+    def run_batch_async(self, jobs: List[Dict[str, Any]], processor_coro,
+                        on_progress=None, max_in_flight: Optional[int] = None,
+                        timeout: Optional[float] = None,
+                        cancel_token: Optional[CancellationToken] = None,
+                        journal: Optional[BatchJournal] = None) -> List[Dict[str, Any]]:
+        """Synchronous entry point for process_batch_async (for Streamlit / scripts)"""
+        return asyncio.run(self.process_batch_async(jobs, processor_coro, on_progress, max_in_flight,
+                                                    timeout, cancel_token, journal))
+
+    # -------------------- OFFLINE (BATCH API) --------------------
+
+    def submit_batch_offline(self, jobs: List[Dict[str, Any]], build_request, submitter,
+                             model: str, work_dir: str = ".batch_jobs") -> Dict[str, Any]:
+        """
+        Serialize jobs to a Batch API JSONL file and submit it.
+
+        Args:
+            jobs: List of parameter dicts (from create_batch_job)
+            build_request: Function(job) returning the chat request, e.g.
+                           lambda job: svc.batch_request("drmotion_generate", img, ...)
+            submitter: OpenAIBatchSubmitter or DirectoryBatchSubmitter
+            model: Chat model written into every request body
+            work_dir: Where the input JSONL is written
+
+        Returns:
+            {"job_id", "input_path", "failed"} where failed holds results for
+            jobs whose request could not be built
+        """
+        lines = []
+        failed = []
+        for job in jobs:
+            try:
+                lines.append(build_batch_line(custom_id_for(job['batch_id']), model, build_request(job)))
+            except Exception as e:
+                failed.append({'batch_id': job['batch_id'], 'success': False, 'error': str(e), 'job': job})
+
+        input_path = write_batch_file(
+            os.path.join(work_dir, f"batch_input_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.jsonl"),
+            lines
+        )
+        job_id = submitter.submit(input_path) if lines else None
+        return {"job_id": job_id, "input_path": input_path, "failed": failed}
+
+    def wait_for_batch(self, submitter, job_id: str, poll_interval: float = 60.0,
+                       timeout: Optional[float] = None, on_progress=None) -> Dict[str, Any]:
+        """
+        Poll a submitted batch until it reaches a final status.
+
+        Args:
+            submitter: The submitter that returned job_id
+            job_id: Batch identifier
+            poll_interval: Seconds between polls
+            timeout: Give up after this many seconds (returns the last status)
+            on_progress: Optional callback function(completed, total)
+
+        Returns:
+            Last status dict from submitter.poll()
+        """
+        started = time.monotonic()
+        while True:
+            status = submitter.poll(job_id)
+            if on_progress and status.get("total"):
+                on_progress(status.get("completed", 0), status["total"])
+            if status["status"] in FINAL_STATUSES:
+                return status
+            if timeout is not None and time.monotonic() - started >= timeout:
+                return status
+            time.sleep(poll_interval)
+
+    def ingest_batch_results(self, jobs: List[Dict[str, Any]], output_path: Optional[str],
+                             parse_content) -> List[Dict[str, Any]]:
+        """
+        Turn a Batch API result file into the same result dicts process_batch returns.
+
+        Args:
+            jobs: The submitted jobs (matched to result lines by batch_id)
+            output_path: Result file from the submitter (None if nothing came back)
+            parse_content: Function(raw_text) -> dict, e.g. svc.parse_json_content
+
+        Returns:
+            List of results, sorted by batch_id; jobs without a result line are failures
+        """
+        lines = read_batch_results(output_path) if output_path else {}
+        results = []
+        for job in jobs:
+            line = lines.get(custom_id_for(job['batch_id']))
+            try:
+                if line is None:
+                    raise ValueError("No result returned for this request")
+                if line["error"]:
+                    raise ValueError(line["error"])
+                result = parse_content(line["content"]) if line["content"] else {}
+                if not result:
+                    raise ValueError("Empty response content")
+                result['batch_id'] = job['batch_id']
+                result['success'] = True
+                results.append(result)
+            except Exception as e:
+                results.append({
+                    'batch_id': job['batch_id'],
+                    'success': False,
+                    'error': str(e),
+                    'job': job
+                })
+
+        results.sort(key=lambda x: x['batch_id'])
+        return results
+
+    def process_batch_offline(self, jobs: List[Dict[str, Any]], build_request, submitter,
+                              model: str, parse_content, work_dir: str = ".batch_jobs",
+                              poll_interval: float = 60.0, timeout: Optional[float] = None,
+                              on_progress=None) -> List[Dict[str, Any]]:
+        """
+        Submit, wait for and ingest one offline batch (Batch API pricing and limits).
+
+        For runs that outlive the process, call submit_batch_offline, keep the
+        job_id, and later call wait_for_batch + ingest_batch_results.
+        """
+        submitted = self.submit_batch_offline(jobs, build_request, submitter, model, work_dir)
+        failed_ids = {r['batch_id'] for r in submitted['failed']}
+        pending = [job for job in jobs if job['batch_id'] not in failed_ids]
+        output_path = None
+        if submitted['job_id']:
+            status = self.wait_for_batch(submitter, submitted['job_id'], poll_interval, timeout, on_progress)
+            output_path = status.get("output_path")
+        results = self.ingest_batch_results(pending, output_path, parse_content) + submitted['failed']
+        results.sort(key=lambda x: x['batch_id'])
+        return results
+
     @staticmethod
     def create_emotion_variations(emotions: List[str], intensity: str = "Medium") -> List[Dict[str, Any]]:
         """Helper: Create variation set for multiple emotions"""
@@ -141,5 +417,7 @@ class BatchProcessor:
             "successful": len(successful),
             "failed": len(failed),
             "success_rate": len(successful) / len(results) * 100 if results else 0,
+            "timed_out": sum(1 for r in failed if r.get('outcome') == "timeout"),
+            "cancelled": sum(1 for r in failed if r.get('outcome') == "cancelled"),
             "failed_jobs": [r['batch_id'] for r in failed]
         }
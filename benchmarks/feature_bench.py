@@ -0,0 +1,154 @@
+"""
+Feature Benchmark
+=================
+Runs every OpenAIService feature method offline through a ReplayTransport
+and reports latency percentiles, attempts and outcomes per feature.
+
+Replay (no network, no key):
+    python benchmarks/feature_bench.py --iterations 20 --latency 0.2 0.8 --error-rate 0.05
+
+Record real responses into cassettes (needs OPENAI_API_KEY):
+    python benchmarks/feature_bench.py --record cassettes --iterations 1
+
+Requests without a recording are answered with synthetic JSON, so the
+hot paths (image preprocessing, prompt building, retries, parsing) are
+exercised even with an empty cassette directory.
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image
+
+from call_metrics import percentile
+from openai_service import OpenAIService
+from rate_limiter import RateLimiter, RetryPolicy
+from transport import RecordingTransport, ReplayTransport
+
+MASTER_DNA = "Woman, late 20s, olive skin, dark brown wavy shoulder-length hair, hazel eyes, small mole above left lip."
+
+
+class BenchUpload(io.BytesIO):
+    """Minimal stand-in for a Streamlit UploadedFile"""
+    type = "image/jpeg"
+    name = "bench.jpg"
+
+
+def make_image(width: int = 1536, height: int = 2048, seed: int = 7) -> BenchUpload:
+    """Deterministic noisy JPEG so every run builds byte-identical requests"""
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8)
+    buf = BenchUpload()
+    Image.fromarray(pixels).save(buf, format="JPEG", quality=90)
+    return buf
+
+
+def make_frames(count: int = 6) -> list:
+    svc = OpenAIService(api_key="sk-bench")
+    return [svc._filelike_to_data_url(make_image(640, 1136, seed=i), "video_review") for i in range(count)]
+
+
+SCENARIOS = [
+    ("drmotion", lambda svc, img, frames: svc.drmotion_generate(
+        img, "Kling 1.5", "Walking Runway", "Happy / Excited / Joyful", MASTER_DNA, "Medium")),
+    ("drmotion_stream", lambda svc, img, frames: svc.drmotion_generate(
+        img, "Kling 1.5", "Walking Runway", "Happy / Excited / Joyful", MASTER_DNA, "Medium",
+        on_field=lambda path, value: None)),
+    ("drmotion_many", lambda svc, img, frames: svc.drmotion_generate_many(
+        img, [{"emotion": "Happy / Excited / Joyful"}, {"emotion": "Authentic / Natural"},
+              {"emotion": "Professional / Confident"}], "Walking Runway", MASTER_DNA)),
+    ("product_review", lambda svc, img, frames: svc.drmotion_product_review(
+        img, "Vitamin C serum, 30ml", "English", "Authentic / Natural", MASTER_DNA)),
+    ("kling_motion", lambda svc, img, frames: svc.drmotion_kling_motion(
+        img, "Playful / Fun", ["sunglasses", "coffee cup"], MASTER_DNA)),
+    ("video_review", lambda svc, img, frames: svc.drmotion_video_review(frames, MASTER_DNA)),
+    ("wardrobe", lambda svc, img, frames: svc.wardrobe_fuse_filelike(img, MASTER_DNA)),
+    ("multi_angle", lambda svc, img, frames: svc.multi_angle_planner_filelike(img, MASTER_DNA)),
+    ("captions", lambda svc, img, frames: svc.captions_generate_filelike(img)),
+    ("cloner", lambda svc, img, frames: svc.cloner_analyze_filelike(img, MASTER_DNA)),
+    ("perfectcloner", lambda svc, img, frames: svc.perfectcloner_analyze_filelike(img, MASTER_DNA)),
+    ("poser", lambda svc, img, frames: svc.poser_variations_filelike(img, MASTER_DNA, "Editorial")),
+]
+
+
+def build_service(args, records: list) -> OpenAIService:
+    if args.record:
+        api_key = os.environ.get("OPENAI_API_KEY")
+        if not api_key:
+            sys.exit("OPENAI_API_KEY is required for --record")
+        svc = OpenAIService(api_key=api_key, model=args.model, metrics_sink=records.append)
+        svc.transport = RecordingTransport(svc.transport, args.record)
+        return svc
+    latency = tuple(args.latency) if len(args.latency) == 2 else args.latency[0]
+    transport = ReplayTransport(args.cassettes, latency=latency, error_rate=args.error_rate,
+                                error_status=args.error_status, seed=args.seed)
+    return OpenAIService(
+        api_key="sk-replay",
+        model=args.model,
+        rate_limiter=RateLimiter(rpm=1_000_000, tpm=1_000_000_000),
+        retry_policy=RetryPolicy(max_retries=4, base_delay=0.05, max_delay=0.5),
+        metrics_sink=records.append,
+        transport=transport,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of OpenAIService feature methods")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--cassettes", default="cassettes", help="Cassette directory to replay from")
+    parser.add_argument("--record", default=None, help="Record live responses into this directory")
+    parser.add_argument("--latency", type=float, nargs="+", default=[0.0],
+                        help="Synthetic latency in seconds: fixed, or MIN MAX")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--only", nargs="*", help="Run only these scenarios")
+    args = parser.parse_args()
+
+    records = []
+    svc = build_service(args, records)
+    image = make_image()
+    frames = make_frames()
+
+    wall = {}
+    for name, run in SCENARIOS:
+        if args.only and name not in args.only:
+            continue
+        started = time.perf_counter()
+        for _ in range(args.iterations):
+            image.seek(0)
+            run(svc, image, frames)
+        wall[name] = time.perf_counter() - started
+
+    by_feature = defaultdict(list)
+    for record in records:
+        by_feature[record["feature"]].append(record)
+
+    print(f"{'scenario':<16}{'wall s':>9}")
+    for name, seconds in wall.items():
+        print(f"{name:<16}{seconds:>9.2f}")
+    print()
+    print(f"{'feature':<16}{'calls':>6}{'p50 ms':>9}{'p95 ms':>9}{'ttfb50':>8}{'attempts':>9}  outcomes")
+    for feature, items in sorted(by_feature.items()):
+        latencies = [r["latency_ms"] for r in items]
+        ttfbs = [r["ttfb_ms"] for r in items if r.get("ttfb_ms") is not None]
+        outcomes = defaultdict(int)
+        for r in items:
+            outcomes[r["outcome"]] += 1
+        print(f"{feature:<16}{len(items):>6}{percentile(latencies, 50):>9.1f}{percentile(latencies, 95):>9.1f}"
+              f"{(percentile(ttfbs, 50) if ttfbs else 0):>8.1f}"
+              f"{sum(r['attempts'] for r in items) / len(items):>9.2f}  {dict(outcomes)}")
+    if isinstance(svc.transport, ReplayTransport):
+        print(f"\ntransport: {svc.transport.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Video Ingestion Benchmark
+=========================
+Peak memory and bytes copied when turning an uploaded video into
+keyframes, for three ingestion paths:
+
+    legacy   getvalue() + NamedTemporaryFile (the previous implementation)
+    spooled  chunked copy into a memfd (the fallback for OpenCV < 4.11)
+    stream   OpenCV reads the upload in place (extract_keyframes_from_video)
+
+    python benchmarks/ingest_bench.py --size-mb 200
+
+Each path runs in a fresh process. The upload itself is already held in
+memory by Streamlit, so it is loaded first and the peak RSS is reported
+on top of that baseline (Linux only; reads /proc/self/status and io).
+"""
+
+import argparse
+import base64
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MB = 1024 * 1024
+
+
+class BenchUpload(io.BytesIO):
+    """Minimal stand-in for a Streamlit UploadedFile"""
+    type = "video/mp4"
+    name = "bench.mp4"
+
+
+def make_video(path: str, size_mb: int, width: int = 720, height: int = 1280, fps: int = 30) -> str:
+    """Noise video of roughly size_mb (noise defeats compression, so size tracks frame count)"""
+    import cv2
+    import numpy as np
+
+    def write(frames: int):
+        rng = np.random.default_rng(3)
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+        for _ in range(frames):
+            writer.write(rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8))
+        writer.release()
+
+    frames = 60
+    for _ in range(3):
+        write(frames)
+        frames = max(30, int(frames * size_mb * MB / os.path.getsize(path)))
+    return path
+
+
+def memory_kb() -> dict:
+    values = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("VmRSS", "VmHWM"):
+                values[key] = int(rest.split()[0])
+    return values
+
+
+def bytes_written() -> int:
+    """Bytes this process has passed to write() so far (temp files and memfds alike)"""
+    with open("/proc/self/io") as f:
+        for line in f:
+            if line.startswith("wchar:"):
+                return int(line.split()[1])
+    return 0
+
+
+def reset_peak() -> bool:
+    """Restart VmHWM from the current RSS (Linux 4.0+)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def legacy_extract(video_file, num_frames: int = 5) -> list:
+    """The ingestion path before streaming: full copy, temp file, seek per frame"""
+    import cv2
+
+    with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as tmp:
+        tmp.write(video_file.getvalue())
+        tmp_path = tmp.name
+    frames = []
+    try:
+        cap = cv2.VideoCapture(tmp_path)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        for i in range(num_frames):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(i * (total - 1) / (num_frames - 1)))
+            ok, frame = cap.read()
+            if ok:
+                _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+                frames.append(base64.b64encode(buffer).decode('utf-8'))
+        cap.release()
+    finally:
+        os.unlink(tmp_path)
+    return frames
+
+
+def measure(mode: str, path: str):
+    """Child process: load the upload, then run one ingestion path"""
+    import cv2  # noqa: F401  (library load is not part of the measurement)
+    import video_analyzer
+    from video_analyzer import extract_keyframes_from_video
+
+    if mode == "spooled":
+        video_analyzer._stream_capture = lambda video_file: None
+    with open(path, "rb") as f:
+        upload = BenchUpload(f.read())
+    baseline = memory_kb()["VmRSS"]
+    written = bytes_written()
+    exact = reset_peak()
+
+    started = time.perf_counter()
+    if mode == "legacy":
+        frames = legacy_extract(upload)
+    else:
+        frames = extract_keyframes_from_video(upload, dedup_threshold=None)
+    elapsed = time.perf_counter() - started
+
+    peak = memory_kb()["VmHWM"]
+    print(f"{mode:>8}: {len(frames)} frames in {elapsed:.2f}s, upload {len(upload.getbuffer()) / MB:.0f} MB, "
+          f"peak RSS +{(peak - baseline) / 1024:.0f} MB over the upload, "
+          f"copied to a file {(bytes_written() - written) / MB:.0f} MB"
+          + ("" if exact else " (peak includes interpreter start-up)"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=200, help="Size of the synthetic upload")
+    parser.add_argument("--video", help="Use this file instead of a synthetic upload")
+    parser.add_argument("--measure", choices=["legacy", "spooled", "stream"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure, args.video)
+        return
+    if not os.path.exists("/proc/self/status"):
+        sys.exit("Peak RSS is read from /proc; run this benchmark on Linux")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.video or make_video(os.path.join(tmp, "upload.mp4"), args.size_mb)
+        for mode in ("legacy", "spooled", "stream"):
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--measure", mode, "--video", path],
+                           check=True, stderr=subprocess.DEVNULL)
+
+
+if __name__ == "__main__":
+    main()
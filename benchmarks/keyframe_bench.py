@@ -0,0 +1,111 @@
+"""
+Keyframe Extraction Benchmark
+=============================
+Times the two frame-read strategies behind extract_keyframes_from_video,
+a single forward grab()/retrieve() pass versus a seek per frame, over a
+range of frame counts, and reports where the cheaper one changes.
+
+Synthetic reels (30, 60 and 180 seconds by default):
+    python benchmarks/keyframe_bench.py --frames 3 5 8 16 32 64 128
+
+Real reels (long-GOP H.264/HEVC exports show the seek cost best):
+    python benchmarks/keyframe_bench.py --video reel_a.mp4 reel_b.mov
+
+Synthetic reels are written with OpenCV's MPEG-4 encoder, whose GOP is
+fixed at 12 frames; seeking is correspondingly cheap on them.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from video_analyzer import _align_to_keyframes, _mp4_keyframes, _plan_frame_reads, _read_frames
+
+
+def make_reel(path: str, seconds: int, fps: int = 30, width: int = 540, height: int = 960) -> str:
+    """Deterministic moving-gradient reel"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    yy, xx = np.mgrid[0:height, 0:width]
+    base = np.stack([xx % 256, yy % 256, ((xx + yy) // 2) % 256], axis=-1).astype(np.uint8)
+    for i in range(seconds * fps):
+        frame = np.roll(base, (i * 3, i * 2), axis=(0, 1))
+        cv2.rectangle(frame, (i * 5 % width, 200), (i * 5 % width + 80, 360), (255, 255, 255), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def even_indices(total_frames: int, count: int) -> list:
+    if total_frames <= count:
+        return list(range(total_frames))
+    return [int(i * (total_frames - 1) / (count - 1)) for i in range(count)]
+
+
+def time_strategy(path: str, indices: list, strategy: str, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        frames = _read_frames(path, indices, strategy)
+        best = min(best, time.perf_counter() - started)
+        if len(frames) != len(indices):
+            print(f"⚠️ {strategy} read {len(frames)}/{len(indices)} frames")
+    return best * 1000
+
+
+def bench_video(path: str, frame_counts: list, repeats: int):
+    cap = cv2.VideoCapture(path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    cap.release()
+    with open(path, "rb") as f:
+        keyframes = _mp4_keyframes(f.read())
+    gop = "unknown" if keyframes is None else (
+        "all-intra" if not keyframes else f"{total / max(1, len(keyframes)):.0f} frames avg")
+    print(f"\n{os.path.basename(path)}: {total} frames, {total / fps:.0f}s, GOP {gop}")
+    print(f"{'frames':>7} {'sequential ms':>14} {'seek ms':>9} {'faster':>11} {'planner':>11}")
+
+    crossover = None
+    for count in frame_counts:
+        indices = _align_to_keyframes(even_indices(total, count), keyframes)
+        sequential_ms = time_strategy(path, indices, "sequential", repeats)
+        seek_ms = time_strategy(path, indices, "seek", repeats)
+        faster = "seek" if seek_ms < sequential_ms else "sequential"
+        planned = _plan_frame_reads(indices, keyframes)[0]
+        if faster == "sequential" and crossover is None:
+            crossover = count
+        print(f"{count:>7} {sequential_ms:>14.1f} {seek_ms:>9.1f} {faster:>11} {planned:>11}")
+    if crossover:
+        print(f"Sequential pass wins from {crossover} frames")
+    else:
+        print("Seeking wins at every frame count tested")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", nargs="*", default=[], help="Real video files to benchmark")
+    parser.add_argument("--durations", type=int, nargs="*", default=[30, 60, 180],
+                        help="Synthetic reel lengths in seconds (ignored with --video)")
+    parser.add_argument("--frames", type=int, nargs="*", default=[3, 5, 8, 16, 32, 64, 128, 256])
+    parser.add_argument("--repeats", type=int, default=2, help="Best of N runs per measurement")
+    args = parser.parse_args()
+
+    if args.video:
+        for path in args.video:
+            bench_video(path, args.frames, args.repeats)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for seconds in args.durations:
+            path = make_reel(os.path.join(tmp, f"reel_{seconds}s.mp4"), seconds)
+            bench_video(path, args.frames, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Call Metrics
+============
+Usage and latency capture for every model call: tokens, images, request
+size, time to first byte, total latency and outcome.
+"""
+
+import contextvars
+import math
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from model_pricing import estimate_cost
+
+# Set by the HTTP response hook when headers arrive, read back by the caller.
+# ContextVars keep threads and asyncio tasks from seeing each other's timings.
+_first_byte_at: contextvars.ContextVar = contextvars.ContextVar("first_byte_at", default=None)
+# Per-attempt measurements a hedged call hands back from the attempt that won
+ATTEMPT_CONTEXT_VARS = (_first_byte_at,)
+
+
+def note_first_byte():
+    """Record that response headers arrived now (for transports that bypass httpx)"""
+    _first_byte_at.set(time.perf_counter())
+
+
+def _mark_first_byte(response):
+    note_first_byte()
+
+
+async def _amark_first_byte(response):
+    note_first_byte()
+
+
+def install_ttfb_hook(http_client, is_async: bool = False):
+    """Register the time-to-first-byte response hook on an httpx client (idempotent)"""
+    hook = _amark_first_byte if is_async else _mark_first_byte
+    hooks = dict(http_client.event_hooks)
+    responses = list(hooks.get("response", []))
+    if hook not in responses:
+        responses.append(hook)
+        hooks["response"] = responses
+        http_client.event_hooks = hooks
+
+
+def request_stats(messages: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Image count and approximate payload size of a chat `messages` list"""
+    images = 0
+    size = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            size += len(content.encode("utf-8"))
+            continue
+        for part in content or []:
+            if part.get("type") == "image_url":
+                images += 1
+                size += len((part.get("image_url") or {}).get("url", ""))
+            else:
+                size += len(part.get("text", "").encode("utf-8"))
+    return {"image_count": images, "request_bytes": size}
+
+
+class CallTimer:
+    """Measures one model call and turns it into a metrics record"""
+
+    def __init__(self, feature: str, model: str, messages: List[Dict[str, Any]]):
+        self.feature = feature
+        self.model = model
+        self.messages = messages
+        self.started = time.perf_counter()
+        self.first_byte: Optional[float] = None
+        self.attempts = 0
+        # Extra fields merged into the record (e.g. the route that served the call)
+        self.tags: Dict[str, Any] = {}
+        _first_byte_at.set(None)
+
+    def mark_first_byte(self):
+        """Record first byte explicitly (streaming: first chunk received)"""
+        if self.first_byte is None:
+            self.first_byte = time.perf_counter()
+
+    def record(self, outcome: str, usage=None,
+               extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Build the metrics record.
+
+        Args:
+            outcome: "ok", "cache_hit", "coalesced", "repaired", "repair_partial",
+                     "continued", "empty", "parse_error" or "error"
+            usage: The response's `usage` object (or None)
+            extra: Additional fields to merge into the record
+        """
+        finished = time.perf_counter()
+        first_byte = self.first_byte or _first_byte_at.get()
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", 0) or 0
+        record = {
+            "timestamp": datetime.now().isoformat(),
+            "feature": self.feature,
+            "model": self.model,
+            "outcome": outcome,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens,
+            **request_stats(self.messages),
+            "ttfb_ms": round((first_byte - self.started) * 1000, 1) if first_byte else None,
+            "latency_ms": round((finished - self.started) * 1000, 1),
+            "attempts": self.attempts,
+            "cost_usd": round(estimate_cost(self.model, prompt_tokens, completion_tokens, cached_tokens), 6),
+        }
+        record.update(self.tags)
+        if extra:
+            record.update(extra)
+        return record
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (pct in 0-100) of a non-empty list"""
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
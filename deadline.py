@@ -0,0 +1,206 @@
+"""
+Deadline
+========
+Per-call and per-batch time limits and cooperative cancellation.
+
+A deadline scope is opened where the limit is known (a Streamlit button,
+BatchProcessor.process_batch) and read by OpenAIService right before each
+HTTP request, so the remaining time becomes the request timeout and no
+retry or rate-limit wait runs past it:
+
+    with deadline_scope(60, token):
+        data = svc.drmotion_kling_motion(...)
+
+Scopes nest (the tighter limit wins) and follow the call into worker
+threads that copy the context.
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Optional
+
+
+class DeadlineExceeded(TimeoutError):
+    """The call's deadline passed before it could finish"""
+
+
+class Cancelled(Exception):
+    """The call was cancelled through its CancellationToken"""
+
+
+class CancellationToken:
+    """Thread-safe flag shared by everything that should stop together (e.g. one batch)"""
+
+    def __init__(self, *parents: Optional["CancellationToken"]):
+        """
+        Args:
+            parents: Tokens whose cancellation also cancels this one (e.g. the
+                     enclosing scope's); cancelling this one leaves them alone
+        """
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._children = weakref.WeakSet()
+        self.reason = ""
+        for parent in parents:
+            if parent is not None:
+                parent._adopt(self)
+
+    def _adopt(self, child: "CancellationToken"):
+        with self._lock:
+            if not self._event.is_set():
+                self._children.add(child)
+                return
+        child.cancel(self.reason)
+
+    def cancel(self, reason: str = "cancelled"):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            children = list(self._children)
+        for child in children:
+            child.cancel(reason)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise Cancelled(self.reason)
+
+    def wait(self, seconds: float) -> bool:
+        """Sleep up to `seconds`; True if cancelled meanwhile"""
+        return self._event.wait(seconds)
+
+
+class Deadline:
+    """Absolute expiry time plus an optional cancellation token"""
+
+    def __init__(self, seconds: Optional[float] = None, token: Optional[CancellationToken] = None,
+                 expires_at: Optional[float] = None):
+        """
+        Args:
+            seconds: Time allowed from now (None = no limit)
+            token: Cancellation token checked alongside the deadline
+            expires_at: Absolute time.monotonic() expiry (overrides seconds)
+        """
+        if expires_at is None and seconds is not None:
+            expires_at = time.monotonic() + seconds
+        self.expires_at = expires_at
+        self.token = token
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None when unbounded"""
+        if self.expires_at is None:
+            return None
+        return self.expires_at - time.monotonic()
+
+    def check(self):
+        """Raise Cancelled or DeadlineExceeded if the call should stop now"""
+        if self.token is not None:
+            self.token.raise_if_cancelled()
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded("Deadline exceeded")
+
+    def timeout(self, cap: Optional[float] = None) -> Optional[float]:
+        """HTTP timeout for the next request: the remaining time, bounded by `cap`"""
+        self.check()
+        remaining = self.remaining()
+        if remaining is None:
+            return cap
+        return remaining if cap is None else min(cap, remaining)
+
+    def sleep(self, seconds: float):
+        """Wait before a retry; raises instead of sleeping past the deadline or through a cancel"""
+        self.check()
+        remaining = self.remaining()
+        if remaining is not None and seconds >= remaining:
+            raise DeadlineExceeded(f"Deadline exceeded (next retry in {seconds:.1f}s)")
+        if self.token is not None:
+            if self.token.wait(seconds):
+                self.token.raise_if_cancelled()
+        else:
+            time.sleep(seconds)
+
+    async def asleep(self, seconds: float):
+        """Async sleep(); the token is checked when the wait ends"""
+        self.check()
+        remaining = self.remaining()
+        if remaining is not None and seconds >= remaining:
+            raise DeadlineExceeded(f"Deadline exceeded (next retry in {seconds:.1f}s)")
+        await asyncio.sleep(seconds)
+        self.check()
+
+    def within(self, seconds: Optional[float] = None,
+               token: Optional[CancellationToken] = None) -> "Deadline":
+        """Nested deadline: the earlier of this one and `seconds` from now"""
+        expires_at = self.expires_at
+        if seconds is not None:
+            candidate = time.monotonic() + seconds
+            expires_at = candidate if expires_at is None else min(expires_at, candidate)
+        return Deadline(token=token or self.token, expires_at=expires_at)
+
+
+_UNBOUNDED = Deadline()
+_current: contextvars.ContextVar = contextvars.ContextVar("deadline", default=_UNBOUNDED)
+
+
+def current_deadline() -> Deadline:
+    """Deadline of the innermost active scope (unbounded if none)"""
+    return _current.get()
+
+
+@contextmanager
+def use_deadline(deadline: Deadline):
+    """Make an existing Deadline current, e.g. a batch deadline inside a worker thread"""
+    reset = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(reset)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float] = None, token: Optional[CancellationToken] = None):
+    """
+    Apply a time limit and/or cancellation token to every model call in the block.
+
+    Args:
+        seconds: Time allowed for the block (None keeps the enclosing limit)
+        token: Cancellation token (None keeps the enclosing token)
+    """
+    with use_deadline(current_deadline().within(seconds, token)) as deadline:
+        yield deadline
+
+
+class FailedCall(dict):
+    """
+    Empty result of a model call that did not complete.
+
+    Behaves like the `{}` feature methods have always returned on failure,
+    but carries why: outcome is "timeout", "cancelled", "error" or "parse_error".
+    """
+
+    def __init__(self, outcome: str, error: str = ""):
+        super().__init__()
+        self.outcome = outcome
+        self.error = error
+
+    def describe(self) -> str:
+        if self.outcome == "timeout":
+            return "Timed out"
+        if self.outcome == "cancelled":
+            return "Cancelled"
+        return self.error or "Generation failed"
+
+
+def outcome_of(result) -> str:
+    """A FailedCall's outcome, "empty" for {} and "ok" for any other result"""
+    return getattr(result, "outcome", "ok" if result else "empty")
@@ -0,0 +1,167 @@
+"""
+Feature Schemas
+===============
+JSON Schemas for every feature's output, sent as strict structured outputs
+and used for fast local validation so a dropped or empty key can be
+repaired with a small follow-up call instead of a full regeneration.
+"""
+
+from typing import Any, Dict, List, Optional
+
+
+def _obj(properties: Dict[str, Any]) -> Dict[str, Any]:
+    """Strict-mode object: every property required, nothing extra allowed"""
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+STR = {"type": "string"}
+STR_LIST = {"type": "array", "items": STR}
+INT = {"type": "integer"}
+
+
+FEATURE_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    "drmotion": _obj({
+        "character_analysis": STR,
+        "emotion_breakdown": STR,
+        "physics_notes": STR,
+        "micro_expressions": STR_LIST,
+        "body_language_cues": STR_LIST,
+        "temporal_flow": _obj({"seconds_0_2": STR, "seconds_3_5": STR, "seconds_6_8": STR}),
+        "final_video_prompt": STR,
+    }),
+    "drmotion_many": _obj({
+        "variants": {"type": "array", "items": _obj({
+            "variation_id": INT,
+            "emotion_breakdown": STR,
+            "micro_expressions": STR_LIST,
+            "final_video_prompt": STR,
+        })},
+    }),
+    "product_review": _obj({
+        "script_analysis": STR,
+        "script": STR,
+        "clip_1_visual_prompt": STR,
+        "clip_1_acting_notes": STR,
+        "clip_2_visual_prompt": STR,
+        "clip_2_continuity": STR,
+        "director_notes": STR,
+    }),
+    "kling_motion": _obj({
+        "character_analysis": STR,
+        "narrative_concept": STR,
+        "category_approach": STR,
+        "element_integration_plan": STR,
+        "shots": {"type": "array", "items": _obj({
+            "shot_number": INT,
+            "duration": STR,
+            "shot_type": STR,
+            "description": STR,
+            "camera": STR,
+            "acting": STR,
+            "props_visible": STR,
+            "transition_to_next": STR,
+        })},
+        "kling_prompt": STR,
+        "negative_prompt": STR,
+        "audio_mood": STR,
+        "director_notes": STR,
+    }),
+    "video_review": _obj({
+        "detected_motion": STR,
+        "motion_details": STR,
+        "motion_speed": STR,
+        "motion_style": STR,
+        "detected_emotion": STR,
+        "emotion_confidence": STR,
+        "micro_expressions": STR_LIST,
+        "body_language_cues": STR_LIST,
+        "lighting_analysis": STR,
+        "camera_analysis": STR,
+        "environment": STR,
+        "color_grading": STR,
+        "veo3_prompt": STR,
+        "kling_prompt": STR,
+        "seedance_prompt": STR,
+        "director_notes": STR,
+    }),
+    "wardrobe": _obj({"outfit_description": STR, "fused_prompt": STR}),
+    "multi_angle": _obj({
+        "grid_prompt": STR,
+        "angles": {"type": "array", "items": _obj({"id": INT, "name": STR, "description": STR})},
+    }),
+    "captions": _obj({"caption": STR, "hashtags": STR_LIST}),
+    "cloner": _obj({"full_prompt": STR, "negative_prompt": STR}),
+    "perfectcloner": _obj({"recreation_prompt": STR, "negative_prompt": STR, "notes": STR}),
+    "poser": _obj({
+        "prompts": {"type": "array", "items": _obj({
+            "pose_name": STR, "pose_description": STR, "facial_expression": STR,
+        })},
+        "scene_lock": STR,
+    }),
+}
+
+
+def get_schema(feature: str) -> Optional[Dict[str, Any]]:
+    """Output schema for a feature, or None if the feature has no schema"""
+    return FEATURE_SCHEMAS.get(feature)
+
+
+def response_format_for(feature: str, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    response_format for a feature's request.
+
+    Args:
+        feature: Feature name (see FEATURE_SCHEMAS)
+        fields: Restrict the schema to these top-level fields (repair calls)
+
+    Returns:
+        A strict json_schema response_format, or json_object if the feature has no schema
+    """
+    schema = get_schema(feature)
+    if schema is None:
+        return {"type": "json_object"}
+    name = feature
+    if fields:
+        schema = _obj({key: schema["properties"][key] for key in fields if key in schema["properties"]})
+        name = f"{feature}_repair"
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def _matches(value: Any, schema: Dict[str, Any]) -> bool:
+    kind = schema.get("type")
+    if kind == "string":
+        return isinstance(value, str) and bool(value.strip())
+    if kind == "integer":
+        return isinstance(value, int) and not isinstance(value, bool)
+    if kind == "array":
+        return isinstance(value, list) and bool(value) and all(_matches(v, schema["items"]) for v in value)
+    if kind == "object":
+        return isinstance(value, dict) and not find_invalid_fields(value, schema)
+    return True
+
+
+def find_invalid_fields(data: Dict[str, Any], schema: Dict[str, Any],
+                        fields: Optional[List[str]] = None) -> List[str]:
+    """
+    Top-level fields that are missing, empty or of the wrong type.
+
+    Empty strings and empty lists count as invalid because the UI would
+    render them as blanks.
+
+    Args:
+        data: Parsed model output
+        schema: Object schema from FEATURE_SCHEMAS
+        fields: Check only these fields (default: every required field)
+    """
+    keys = fields if fields is not None else schema.get("required", [])
+    if not isinstance(data, dict):
+        return list(keys)
+    return [
+        key for key in keys
+        if key not in data or not _matches(data[key], schema["properties"][key])
+    ]
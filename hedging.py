@@ -0,0 +1,267 @@
+"""
+Hedging
+=======
+Opt-in hedged requests for interactive features. If a call has not
+returned by the feature's observed p90 latency, an identical duplicate is
+sent and whichever finishes first wins. A credit budget caps hedges at a
+small share of requests (5% by default), so the tail shrinks without
+doubling spend.
+
+Async losers are cancelled. A sync loser cannot be interrupted mid-request
+(the SDK call is blocking); its result is simply discarded.
+
+The policy's `enabled` is only the process default; callers switch hedging
+per call or per session with hedging_scope:
+
+    with hedging_scope(st.session_state.hedge):
+        data = svc.drmotion_kling_motion(...)
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, Optional, Tuple
+
+from call_metrics import ATTEMPT_CONTEXT_VARS, percentile
+
+# Features hedged by default: the long generations whose p99 hurts most
+DEFAULT_HEDGED_FEATURES = ("kling_motion",)
+
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedge")
+# Per-scope override of HedgePolicy.enabled (None = use the policy's default)
+_requested: contextvars.ContextVar = contextvars.ContextVar("hedging", default=None)
+
+
+@contextmanager
+def hedging_scope(enabled: bool):
+    """Turn hedging on or off for every model call in the block, whatever the shared default"""
+    reset = _requested.set(enabled)
+    try:
+        yield
+    finally:
+        _requested.reset(reset)
+
+
+def _run_with_context(fn: Callable[[], Any]) -> Tuple[Any, contextvars.Context]:
+    """Call fn and return its result with the context it ran in"""
+    return fn(), contextvars.copy_context()
+
+
+async def _arun_with_context(coro_fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, contextvars.Context]:
+    return await coro_fn(), contextvars.copy_context()
+
+
+def _adopt_context(ctx: contextvars.Context):
+    """Carry the winning attempt's measurements (TTFB) to the caller; its deadline and token stay behind"""
+    for var in ATTEMPT_CONTEXT_VARS:
+        if var in ctx:
+            var.set(ctx[var])
+
+
+class HedgePolicy:
+    """Per-feature hedge delays learned from observed latency, with a spend budget"""
+
+    def __init__(self, features: Iterable[str] = DEFAULT_HEDGED_FEATURES, enabled: bool = False,
+                 pct: float = 90, budget: float = 0.05, burst: float = 2.0,
+                 min_samples: int = 20, window: int = 200, min_delay: float = 1.0):
+        """
+        Args:
+            features: Features eligible for hedging
+            enabled: Default when no hedging_scope is active (hedging is opt-in)
+            pct: Latency percentile after which a duplicate is sent
+            budget: Hedges allowed per eligible request (0.05 = at most 5% extra requests)
+            burst: Most unused hedge credit that can be saved up
+            min_samples: Observations needed before a feature is hedged
+            window: Most recent latencies kept per feature
+            min_delay: Never hedge sooner than this many seconds
+        """
+        self.features = set(features)
+        self.enabled = enabled
+        self.pct = pct
+        self.budget = budget
+        self.burst = burst
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self._latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self._credit = 0.0
+        self._counts = {"requests": 0, "hedged": 0, "hedge_wins": 0, "over_budget": 0}
+        self._lock = threading.Lock()
+        self._seeded = False
+
+    def observe(self, feature: str, latency_ms: float):
+        """Record how long one completed call took"""
+        with self._lock:
+            self._latencies[feature].append(latency_ms)
+
+    def seed(self, records: Iterable[Dict[str, Any]]):
+        """Learn latencies from previously recorded call metrics (once per process)"""
+        with self._lock:
+            if self._seeded:
+                return
+            self._seeded = True
+        for record in records:
+            if (record.get("outcome") == "ok" and record.get("feature") in self.features
+                    and record.get("latency_ms") is not None):
+                self.observe(record["feature"], record["latency_ms"])
+
+    def active(self, feature: str) -> bool:
+        """Whether calls for `feature` may be hedged in the current scope"""
+        requested = _requested.get()
+        enabled = self.enabled if requested is None else requested
+        return enabled and feature in self.features
+
+    def delay_for(self, feature: str) -> Optional[float]:
+        """Seconds to wait before hedging a call, or None if the feature is not hedged"""
+        if not self.active(feature):
+            return None
+        with self._lock:
+            samples = list(self._latencies.get(feature, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return max(self.min_delay, percentile(samples, self.pct) / 1000)
+
+    def would_hedge(self, feature: str) -> bool:
+        """Whether the next call for `feature` could be hedged: it is eligible and a credit is available"""
+        if self.delay_for(feature) is None:
+            return False
+        with self._lock:
+            return min(self.burst, self._credit + self.budget) >= 1
+
+    def _earn(self):
+        with self._lock:
+            self._counts["requests"] += 1
+            self._credit = min(self.burst, self._credit + self.budget)
+
+    def _spend(self) -> bool:
+        """Take one hedge credit; False when the budget is exhausted"""
+        with self._lock:
+            if self._credit < 1:
+                self._counts["over_budget"] += 1
+                return False
+            self._credit -= 1
+            self._counts["hedged"] += 1
+            return True
+
+    def _finish(self, feature: str, started: float, hedge: str):
+        self.observe(feature, (time.perf_counter() - started) * 1000)
+        if hedge == "hedge":
+            with self._lock:
+                self._counts["hedge_wins"] += 1
+
+    def run(self, feature: str, fn: Callable[[], Any]) -> Tuple[Any, str]:
+        """
+        Call fn, racing a duplicate if it is slower than the feature's hedge delay.
+
+        Returns:
+            (result, hedge) where hedge is "" (not hedged), "primary" or "hedge"
+            (which attempt produced the result)
+        """
+        started = time.perf_counter()
+        delay = self.delay_for(feature)
+        if delay is None:
+            result = fn()
+            if feature in self.features:
+                self.observe(feature, (time.perf_counter() - started) * 1000)
+            return result, ""
+
+        self._earn()
+        primary = _executor.submit(contextvars.copy_context().run, _run_with_context, fn)
+        try:
+            result, ctx = primary.result(timeout=delay)
+            hedge = ""
+        except FutureTimeout:
+            if not self._spend():
+                result, ctx = primary.result()
+                hedge = ""
+            else:
+                duplicate = _executor.submit(contextvars.copy_context().run, _run_with_context, fn)
+                (result, ctx), winner = self._first_success({primary: "primary", duplicate: "hedge"})
+                hedge = winner
+        _adopt_context(ctx)
+        self._finish(feature, started, hedge)
+        return result, hedge
+
+    @staticmethod
+    def _first_success(attempts: Dict[Any, str]) -> Tuple[Any, str]:
+        """Result of the first attempt to succeed; raises the first error if all fail"""
+        pending = set(attempts)
+        first_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.cancel()
+                    return future.result(), attempts[future]
+                first_error = first_error or future.exception()
+        raise first_error
+
+    async def arun(self, feature: str, coro_fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, str]:
+        """Async run(); the losing attempt is cancelled"""
+        started = time.perf_counter()
+        delay = self.delay_for(feature)
+        if delay is None:
+            result = await coro_fn()
+            if feature in self.features:
+                self.observe(feature, (time.perf_counter() - started) * 1000)
+            return result, ""
+
+        self._earn()
+        tasks = {asyncio.ensure_future(_arun_with_context(coro_fn)): "primary"}
+        try:
+            done, _ = await asyncio.wait(set(tasks), timeout=delay)
+            if not done and self._spend():
+                tasks[asyncio.ensure_future(_arun_with_context(coro_fn))] = "hedge"
+            (result, ctx), hedge = await self._afirst_success(tasks)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        if len(tasks) == 1:
+            hedge = ""
+        _adopt_context(ctx)
+        self._finish(feature, started, hedge)
+        return result, hedge
+
+    @staticmethod
+    async def _afirst_success(tasks: Dict[asyncio.Future, str]) -> Tuple[Any, str]:
+        pending = set(tasks)
+        first_error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), tasks[task]
+                first_error = first_error or task.exception()
+        raise first_error
+
+    def stats(self) -> Dict[str, Any]:
+        """Hedge counts, extra-request rate and the current delay per feature"""
+        with self._lock:
+            counts = dict(self._counts)
+        requests = counts["requests"]
+        with hedging_scope(True):
+            delays = {feature: self.delay_for(feature) for feature in sorted(self.features)}
+        return {
+            **counts,
+            "hedge_rate": round(counts["hedged"] / requests * 100, 1) if requests else 0,
+            "delay_ms": {feature: round(d * 1000) if d else None for feature, d in delays.items()},
+        }
+
+
+_shared_policy: Optional[HedgePolicy] = None
+_shared_lock = threading.Lock()
+
+
+def get_hedge_policy() -> HedgePolicy:
+    """Process-wide hedge policy (disabled until switched on)"""
+    global _shared_policy
+    with _shared_lock:
+        if _shared_policy is None:
+            _shared_policy = HedgePolicy()
+        return _shared_policy
@@ -0,0 +1,268 @@
+"""
+Image Preprocessor
+==================
+Fix orientation, downscale and re-encode uploads before they are sent to the
+vision model, with per-feature size/quality/detail profiles.
+"""
+
+import base64
+import hashlib
+import io
+import math
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+
+# max_side: longest edge after downscaling (never upscaled)
+# format/quality: re-encode settings
+# detail: OpenAI vision detail level ("low", "high" or "auto")
+DEFAULT_PROFILE = {"max_side": 1536, "format": "JPEG", "quality": 85, "detail": "auto"}
+
+IMAGE_PROFILES: Dict[str, Dict[str, Any]] = {
+    "captions": {"max_side": 768, "format": "JPEG", "quality": 75, "detail": "low"},
+    "poser": {"max_side": 1024, "format": "JPEG", "quality": 80, "detail": "auto"},
+    "wardrobe": {"max_side": 1280, "format": "JPEG", "quality": 85, "detail": "auto"},
+    "multi_angle": {"max_side": 1024, "format": "JPEG", "quality": 80, "detail": "auto"},
+    "product_review": {"max_side": 1280, "format": "JPEG", "quality": 85, "detail": "auto"},
+    "drmotion": {"max_side": 1536, "format": "JPEG", "quality": 85, "detail": "high"},
+    "kling_motion": {"max_side": 1536, "format": "JPEG", "quality": 85, "detail": "high"},
+    "cloner": {"max_side": 2048, "format": "JPEG", "quality": 90, "detail": "high"},
+    "perfectcloner": {"max_side": 2048, "format": "JPEG", "quality": 90, "detail": "high"},
+}
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+def estimate_image_tokens(width: int, height: int, detail: str = "auto") -> int:
+    """
+    Estimate vision input tokens for one image (OpenAI GPT-4o tiling rules).
+
+    Low detail is a flat 85 tokens. High/auto: fit within 2048x2048, scale the
+    shortest side down to 768, then 170 tokens per 512px tile plus 85.
+    """
+    if detail == "low" or width <= 0 or height <= 0:
+        return 85
+    scale = min(1.0, 2048 / max(width, height))
+    w, h = width * scale, height * scale
+    scale = min(1.0, 768 / min(w, h))
+    w, h = w * scale, h * scale
+    tiles = math.ceil(w / 512) * math.ceil(h / 512)
+    return 170 * tiles + 85
+
+
+def preprocess_image(content: bytes, max_side: int = 1536, fmt: str = "JPEG",
+                     quality: int = 85, detail: str = "auto",
+                     mime: str = "image/jpeg") -> Tuple[bytes, str, Dict[str, Any]]:
+    """
+    Apply EXIF orientation, downscale and re-encode an image.
+
+    Args:
+        content: Raw uploaded bytes
+        max_side: Longest edge after resizing (images are never upscaled)
+        fmt: Output format (JPEG or WEBP)
+        quality: Encoder quality (1-95)
+        detail: Vision detail level the image will be sent with
+        mime: Original MIME type, used when the bytes are passed through unchanged
+
+    Returns:
+        (bytes, mime_type, report) where report holds bytes and estimated
+        image tokens before and after preprocessing
+    """
+    report = {
+        "bytes_before": len(content),
+        "bytes_after": len(content),
+        "size_before": None,
+        "size_after": None,
+        "tokens_before": 0,
+        "tokens_after": 0,
+        "detail": detail,
+        "reencoded": False,
+    }
+    if not PIL_AVAILABLE:
+        return content, mime, report
+
+    try:
+        img = Image.open(io.BytesIO(content))
+        img.load()
+    except Exception:
+        return content, mime, report
+
+    report["size_before"] = img.size
+    # Uploads are sent without an explicit detail today, which the API treats as "auto"
+    report["tokens_before"] = estimate_image_tokens(*img.size, detail="auto")
+
+    rotated = _has_orientation(img)
+    if rotated:
+        img = ImageOps.exif_transpose(img)
+
+    if max(img.size) > max_side:
+        scale = max_side / max(img.size)
+        img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))),
+                         Image.LANCZOS)
+        resized = True
+    else:
+        resized = False
+
+    fmt = fmt.upper()
+    if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[-1])
+            img = background
+        else:
+            img = img.convert("RGB")
+
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt, quality=quality, optimize=True)
+    encoded = buffer.getvalue()
+
+    if not resized and not rotated and len(encoded) >= len(content):
+        # Re-encoding a small, upright image would only make it bigger
+        report["size_after"] = img.size
+        report["tokens_after"] = estimate_image_tokens(*img.size, detail=detail)
+        return content, mime, report
+
+    report.update({
+        "bytes_after": len(encoded),
+        "size_after": img.size,
+        "tokens_after": estimate_image_tokens(*img.size, detail=detail),
+        "reencoded": True,
+    })
+    return encoded, MIME_TYPES.get(fmt, "image/jpeg"), report
+
+
+def _has_orientation(img) -> bool:
+    try:
+        return img.getexif().get(0x0112, 1) != 1
+    except Exception:
+        return False
+
+
+class EncodedImageMemo:
+    """
+    Bounded in-memory memo of encoded data URLs.
+
+    Keyed by the SHA-256 of the upload plus the preprocessing parameters, so a
+    batch that sends the same image N times only decodes/resizes/encodes it once.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Args:
+            max_bytes: Total size of stored data URLs before least recently used ones are dropped
+        """
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Tuple[str, Dict[str, Any]]]" = OrderedDict()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(content: bytes, profile: Dict[str, Any]) -> Tuple:
+        digest = hashlib.sha256(content).hexdigest()
+        return (digest, profile["max_side"], profile["format"], profile["quality"], profile["detail"])
+
+    def get(self, key: Tuple) -> Optional[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Tuple, data_url: str, report: Dict[str, Any]):
+        size = len(data_url)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= len(self._entries.pop(key)[0])
+            self._entries[key] = (data_url, report)
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                _, (old_url, _) = self._entries.popitem(last=False)
+                self._total_bytes -= len(old_url)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "entries": len(self._entries), "size_bytes": self._total_bytes}
+
+
+class ImagePreprocessor:
+    """Turns uploads into data URLs using per-feature profiles and tracks the savings"""
+
+    def __init__(self, profiles: Optional[Dict[str, Dict[str, Any]]] = None,
+                 memo: Optional[EncodedImageMemo] = None):
+        """
+        Initialize preprocessor.
+
+        Args:
+            profiles: Per-feature overrides merged over IMAGE_PROFILES,
+                      e.g. {"captions": {"detail": "high"}}
+            memo: Encoded-image memo to share (a private one is created if omitted)
+        """
+        self.memo = memo if memo is not None else EncodedImageMemo()
+        self.profiles = {name: dict(profile) for name, profile in IMAGE_PROFILES.items()}
+        for name, override in (profiles or {}).items():
+            self.profiles.setdefault(name, dict(DEFAULT_PROFILE)).update(override)
+        self._lock = threading.Lock()
+        self.last_reports: Dict[str, Dict[str, Any]] = {}
+        self._totals = {"images": 0, "bytes_before": 0, "bytes_after": 0,
+                        "tokens_before": 0, "tokens_after": 0}
+
+    def profile_for(self, feature: str) -> Dict[str, Any]:
+        return {**DEFAULT_PROFILE, **self.profiles.get(feature, {})}
+
+    def to_data_url(self, content: bytes, mime: str = "image/jpeg",
+                    feature: str = "general") -> Tuple[str, str]:
+        """
+        Preprocess raw image bytes for a feature.
+
+        Returns:
+            (data_url, detail)
+        """
+        profile = self.profile_for(feature)
+        key = self.memo.make_key(content, profile)
+        memoized = self.memo.get(key)
+        if memoized is not None:
+            data_url, report = memoized
+            self._record(feature, report)
+            return data_url, profile["detail"]
+
+        encoded, out_mime, report = preprocess_image(
+            content, max_side=profile["max_side"], fmt=profile["format"],
+            quality=profile["quality"], detail=profile["detail"], mime=mime,
+        )
+        b64 = base64.b64encode(encoded).decode("utf-8")
+        data_url = f"data:{out_mime};base64,{b64}"
+        self.memo.put(key, data_url, report)
+        self._record(feature, report)
+        return data_url, profile["detail"]
+
+    def _record(self, feature: str, report: Dict[str, Any]):
+        with self._lock:
+            self.last_reports[feature] = report
+            self._totals["images"] += 1
+            for key in ("bytes_before", "bytes_after", "tokens_before", "tokens_after"):
+                self._totals[key] += report[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Cumulative bytes and estimated image tokens before/after preprocessing"""
+        with self._lock:
+            totals = dict(self._totals)
+        totals["bytes_saved"] = totals["bytes_before"] - totals["bytes_after"]
+        totals["tokens_saved"] = totals["tokens_before"] - totals["tokens_after"]
+        totals["memo"] = self.memo.stats()
+        return totals
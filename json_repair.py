@@ -0,0 +1,255 @@
+"""
+JSON Repair
+===========
+Tolerant parser for model output that json.loads rejects: truncated
+completions, unterminated strings, trailing or missing commas, single
+quotes, bare keys and stray text around the object.
+
+Well-formed input takes the json.loads fast path. Otherwise every field
+that can be read is kept, and the paths whose values were cut off or
+skipped are reported, so only those fields need to be regenerated.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Tuple
+
+from json_stream import FieldPath
+
+_SCALAR = re.compile(r"-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null|True|False|None")
+_BARE_KEY = re.compile(r"[A-Za-z_$][\w$\-]*")
+_LITERALS: Dict[str, Any] = {"true": True, "false": False, "null": None,
+                             "True": True, "False": False, "None": None}
+_ESCAPES = {'"': '"', "'": "'", "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+# A quote inside a string only closes it when followed by one of these, the end,
+# or the next "key": (a missing comma). A comma only counts when what follows it
+# can start the next member: a key inside an object, a value inside an array.
+_AFTER_STRING = ",:}]"
+_NEXT_KEY = re.compile(r"\s*\"[^\"\\]*\"\s*:")
+_MEMBER_AFTER_COMMA = re.compile(r"\s*(?:[\"'][^\"'\\]*[\"']\s*:|[A-Za-z_$][\w$\-]*\s*:|[}\]]|$)")
+_VALUE_AFTER_COMMA = re.compile(r"\s*(?:[\"'{\[\]\-\d]|true\b|false\b|null\b|$)")
+_MISSING = object()
+
+
+class _TolerantParser:
+    """Recursive-descent parser that never fails on syntax; damage is recorded instead"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+        self.damaged: List[FieldPath] = []
+        self._hit_end = False
+
+    def parse(self) -> Any:
+        starts = [i for i in (self.text.find("{"), self.text.find("[")) if i >= 0]
+        if not starts:
+            raise json.JSONDecodeError("No JSON object found", self.text, 0)
+        self.pos = min(starts)
+        return self._value(())
+
+    # -------------------- HELPERS --------------------
+
+    def _at_end(self) -> bool:
+        return self.pos >= len(self.text)
+
+    def _skip_ws(self):
+        while self.pos < len(self.text) and self.text[self.pos].isspace():
+            self.pos += 1
+
+    def _damage(self, path: FieldPath):
+        if path not in self.damaged:
+            self.damaged.append(path)
+
+    def _truncated(self, path: FieldPath):
+        """Record where the text ran out (only the innermost path is reported)"""
+        if not self._hit_end:
+            self._hit_end = True
+            self._damage(path)
+
+    def _skip_garbage(self):
+        """Skip an unreadable value up to the next delimiter"""
+        self.pos += 1
+        while self.pos < len(self.text) and self.text[self.pos] not in ",}]":
+            self.pos += 1
+
+    # -------------------- GRAMMAR --------------------
+
+    def _value(self, path: FieldPath) -> Any:
+        self._skip_ws()
+        if self._at_end():
+            self._truncated(path)
+            return _MISSING
+        ch = self.text[self.pos]
+        if ch == "{":
+            return self._object(path)
+        if ch == "[":
+            return self._array(path)
+        if ch in "\"'":
+            return self._string(path, "member" if path and isinstance(path[-1], str) else "element")
+        match = _SCALAR.match(self.text, self.pos)
+        if match:
+            self.pos = match.end()
+            if self._at_end():
+                self._truncated(path)
+            token = match.group()
+            if token in _LITERALS:
+                return _LITERALS[token]
+            return float(token) if any(c in token for c in ".eE") else int(token)
+        self._skip_garbage()
+        self._damage(path)
+        return _MISSING
+
+    def _string(self, path: FieldPath, role: str) -> str:
+        """Quoted string; role is "key", "member" (object value) or "element" (array item or root)"""
+        text = self.text
+        quote = text[self.pos]
+        self.pos += 1
+        out = []
+        while self.pos < len(text):
+            ch = text[self.pos]
+            if ch == "\\":
+                if self.pos + 1 >= len(text):
+                    break
+                nxt = text[self.pos + 1]
+                if nxt == "u" and re.fullmatch(r"[0-9a-fA-F]{4}", text[self.pos + 2:self.pos + 6]):
+                    out.append(chr(int(text[self.pos + 2:self.pos + 6], 16)))
+                    self.pos += 6
+                    continue
+                out.append(_ESCAPES.get(nxt, nxt))
+                self.pos += 2
+                continue
+            if ch == quote and self._closes(self.pos + 1, role):
+                self.pos += 1
+                return "".join(out)
+            # Otherwise an unescaped quote inside the value (e.g. "say "hi" now"): keep it
+            out.append(ch)
+            self.pos += 1
+        self.pos = len(text)
+        self._truncated(path)
+        return "".join(out)
+
+    def _closes(self, after: int, role: str) -> bool:
+        """Whether a quote whose next character is at `after` ends the string"""
+        text = self.text
+        while after < len(text) and text[after].isspace():
+            after += 1
+        if after >= len(text):
+            return True
+        ch = text[after]
+        if ch == ",":
+            follows = _MEMBER_AFTER_COMMA if role == "member" else _VALUE_AFTER_COMMA
+            return role == "key" or bool(follows.match(text, after + 1))
+        return ch in _AFTER_STRING or bool(_NEXT_KEY.match(text, after))
+
+    def _key(self, path: FieldPath) -> Any:
+        """Object key: quoted or bare; _MISSING if unreadable"""
+        ch = self.text[self.pos]
+        if ch in "\"'":
+            key = self._string(path, "key")
+            return _MISSING if self._hit_end else key
+        match = _BARE_KEY.match(self.text, self.pos)
+        if match:
+            self.pos = match.end()
+            return match.group()
+        self._skip_garbage()
+        self._damage(path)
+        return _MISSING
+
+    def _object(self, path: FieldPath) -> Dict[str, Any]:
+        self.pos += 1
+        obj: Dict[str, Any] = {}
+        while True:
+            self._skip_ws()
+            if self._at_end():
+                self._truncated(path)
+                return obj
+            ch = self.text[self.pos]
+            if ch == "}":
+                self.pos += 1
+                return obj
+            if ch == ",":
+                self.pos += 1
+                continue
+            if ch == "]":
+                # Mismatched bracket: end the object here and let the parent consume it
+                self._damage(path)
+                return obj
+            key = self._key(path)
+            if key is _MISSING:
+                continue
+            self._skip_ws()
+            if self._at_end():
+                self._truncated(path + (key,))
+                return obj
+            if self.text[self.pos] in ":=":
+                self.pos += 1
+            value = self._value(path + (key,))
+            if value is not _MISSING:
+                obj[key] = value
+
+    def _array(self, path: FieldPath) -> List[Any]:
+        self.pos += 1
+        arr: List[Any] = []
+        while True:
+            self._skip_ws()
+            if self._at_end():
+                self._truncated(path)
+                return arr
+            ch = self.text[self.pos]
+            if ch == "]":
+                self.pos += 1
+                return arr
+            if ch == ",":
+                self.pos += 1
+                continue
+            if ch == "}":
+                self._damage(path)
+                return arr
+            value = self._value(path + (len(arr),))
+            if value is not _MISSING:
+                arr.append(value)
+
+
+def parse_tolerant(text: str) -> Tuple[Any, List[FieldPath]]:
+    """
+    Parse JSON, recovering what it can from truncated or malformed text.
+
+    Args:
+        text: Model output (code fences and surrounding prose are tolerated)
+
+    Returns:
+        (value, damaged_paths); damaged_paths is empty for valid JSON and
+        otherwise lists where values were cut off or skipped, e.g.
+        [("shots", 3, "acting")] or [()] when the text ended between fields
+
+    Raises:
+        json.JSONDecodeError: Nothing usable could be recovered
+    """
+    try:
+        return json.loads(text), []
+    except ValueError:
+        pass
+    parser = _TolerantParser(text)
+    value = parser.parse()
+    if value is _MISSING or (not value and parser.damaged):
+        raise json.JSONDecodeError("Unrecoverable JSON", text, parser.pos)
+    return value, parser.damaged
+
+
+def damaged_fields(paths: List[FieldPath]) -> List[str]:
+    """Top-level keys touched by damaged paths, in order"""
+    fields = []
+    for path in paths:
+        if path and isinstance(path[0], str) and path[0] not in fields:
+            fields.append(path[0])
+    return fields
+
+
+def format_path(path: FieldPath) -> str:
+    """Readable path, e.g. ("shots", 3, "acting") -> shots[3].acting and () -> <root>"""
+    if not path:
+        return "<root>"
+    out = ""
+    for part in path:
+        out += f"[{part}]" if isinstance(part, int) else (f".{part}" if out else str(part))
+    return out
@@ -0,0 +1,146 @@
+"""
+Incremental JSON Parser
+=======================
+Feed a streamed JSON completion chunk by chunk and get a callback as soon as
+each top-level field (or each element of a top-level array) is complete.
+"""
+
+import json
+from typing import Any, Callable, List, Optional, Tuple
+
+
+FieldPath = Tuple[Any, ...]
+
+
+class IncrementalJSONParser:
+    """
+    Character-level scanner for a single JSON object arriving in pieces.
+
+    Emits on_field(path, value) where path is ("key",) for a top-level field
+    and ("key", i) for the i-th element of a top-level array, e.g.
+    ("detected_motion",), ("shots", 0), ("final_video_prompt",).
+    Anything before the first '{' (such as a ```json fence) is ignored.
+    """
+
+    def __init__(self, on_field: Callable[[FieldPath, Any], None], max_depth: int = 2):
+        """
+        Args:
+            on_field: Callback invoked with (path, value) for each completed field
+            max_depth: Longest path to emit (1 = top-level fields only, 2 = also array elements)
+        """
+        self.on_field = on_field
+        self.max_depth = max_depth
+        self._text = ""
+        self._pos = 0
+        self._stack: List[dict] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._started = False
+        self.done = False
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far"""
+        return self._text
+
+    def feed(self, chunk: str):
+        """Consume the next piece of streamed text"""
+        if not chunk:
+            return
+        self._text += chunk
+        text = self._text
+        while self._pos < len(text):
+            self._step(text, self._pos, text[self._pos])
+            self._pos += 1
+
+    def _step(self, text: str, pos: int, ch: str):
+        if self.done:
+            return
+        if not self._started:
+            if ch == "{":
+                self._started = True
+                self._stack.append({"type": "obj", "key": None, "expect": "key",
+                                    "index": 0, "value_start": None, "path": ()})
+            return
+
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                top = self._stack[-1]
+                if top["type"] == "obj" and top["expect"] == "key":
+                    try:
+                        top["key"] = json.loads(text[self._string_start:pos + 1])
+                    except ValueError:
+                        top["key"] = text[self._string_start + 1:pos]
+                else:
+                    self._complete(top, self._string_start, pos + 1)
+            return
+
+        top = self._stack[-1]
+        if ch == '"':
+            self._in_string = True
+            self._string_start = pos
+            if not (top["type"] == "obj" and top["expect"] == "key"):
+                top["value_start"] = pos
+        elif ch in "{[":
+            top["value_start"] = pos
+            child_path = top["path"] + ((top["key"],) if top["type"] == "obj" else (top["index"],))
+            self._stack.append({"type": "obj" if ch == "{" else "arr", "key": None, "expect": "key",
+                                "index": 0, "value_start": None, "path": child_path})
+        elif ch in "}]":
+            self._flush_scalar(top, pos)
+            self._stack.pop()
+            if not self._stack:
+                self.done = True
+                return
+            parent = self._stack[-1]
+            self._complete(parent, parent["value_start"], pos + 1)
+        elif ch == ":":
+            top["expect"] = "value"
+        elif ch == ",":
+            self._flush_scalar(top, pos)
+            if top["type"] == "obj":
+                top["expect"] = "key"
+                top["key"] = None
+            else:
+                top["index"] += 1
+        elif not ch.isspace() and top["value_start"] is None:
+            # Start of a number / true / false / null
+            top["value_start"] = pos
+            top["scalar"] = True
+
+    def _flush_scalar(self, top: dict, end: int):
+        if top.get("scalar") and top["value_start"] is not None:
+            self._complete(top, top["value_start"], end)
+
+    def _complete(self, container: dict, start: Optional[int], end: int):
+        container["scalar"] = False
+        container["value_start"] = None
+        if start is None:
+            return
+        path = container["path"] + (
+            (container["key"],) if container["type"] == "obj" else (container["index"],)
+        )
+        if len(path) > self.max_depth:
+            return
+        try:
+            value = json.loads(self._text[start:end])
+        except ValueError:
+            return
+        self.on_field(path, value)
+
+
+def replay_fields(data: Any, on_field: Callable[[FieldPath, Any], None], max_depth: int = 2):
+    """Emit the same events IncrementalJSONParser would for an already-parsed object"""
+    if not isinstance(data, dict):
+        return
+    for key, value in data.items():
+        if isinstance(value, list) and max_depth >= 2:
+            for i, item in enumerate(value):
+                on_field((key, i), item)
+        on_field((key,), value)
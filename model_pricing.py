@@ -0,0 +1,54 @@
+"""
+Model Pricing
+=============
+Approximate OpenAI list prices used to estimate spend (and spend saved)
+"""
+
+from typing import Dict
+
+
+# USD per 1M tokens. Keys are matched by longest prefix so dated snapshots
+# (e.g. "gpt-4o-2024-08-06") resolve to their family price.
+MODEL_PRICING: Dict[str, Dict[str, float]] = {
+    "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+    "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
+    "gpt-4.1-nano": {"input": 0.10, "cached_input": 0.025, "output": 0.40},
+    "gpt-4.1-mini": {"input": 0.40, "cached_input": 0.10, "output": 1.60},
+    "gpt-4.1": {"input": 2.00, "cached_input": 0.50, "output": 8.00},
+    "gpt-4-turbo": {"input": 10.00, "cached_input": 10.00, "output": 30.00},
+}
+
+DEFAULT_PRICING = MODEL_PRICING["gpt-4o"]
+
+
+def get_pricing(model: str) -> Dict[str, float]:
+    """Return the price row for a model, falling back to gpt-4o pricing"""
+    best = ""
+    for prefix in MODEL_PRICING:
+        if (model or "").startswith(prefix) and len(prefix) > len(best):
+            best = prefix
+    return MODEL_PRICING[best] if best else DEFAULT_PRICING
+
+
+def estimate_cost(model: str, prompt_tokens: int = 0, completion_tokens: int = 0,
+                  cached_tokens: int = 0) -> float:
+    """
+    Estimate the USD cost of one call.
+
+    Args:
+        model: OpenAI model name
+        prompt_tokens: Total input tokens (including cached ones)
+        completion_tokens: Output tokens
+        cached_tokens: Portion of prompt_tokens served from the provider prompt cache
+
+    Returns:
+        Estimated cost in USD
+    """
+    price = get_pricing(model)
+    cached = min(cached_tokens or 0, prompt_tokens or 0)
+    uncached = (prompt_tokens or 0) - cached
+    return (
+        uncached * price["input"]
+        + cached * price["cached_input"]
+        + (completion_tokens or 0) * price["output"]
+    ) / 1_000_000
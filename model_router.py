@@ -0,0 +1,180 @@
+"""
+Model Router
+============
+Per-feature routing table: a primary and a fallback model with a latency
+SLO and timeout for each route. Cheap features can run on a faster model,
+and a primary that times out, errors, or misses its SLO is skipped in
+favour of the fallback until a cooldown has passed.
+
+Fallbacks are opt-in per feature: "*" has none, so quality-sensitive
+features (drmotion, cloner...) never drop to a smaller model. Rate limits
+are not a reason to fall back; the primary's retry schedule, which honours
+Retry-After, handles them.
+
+Routes can be overridden without code changes in model_routes.json:
+    {"captions": {"primary": "gpt-4o-mini", "fallback": "default", "slo_ms": 4000, "timeout": 15,
+                  "retries": 1}}
+"default" means the model the service was created with (the sidebar model),
+and "retries" caps the primary's retries before the fallback is tried.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from call_metrics import percentile
+
+DEFAULT_MODEL = "default"
+
+# "*" applies to every feature without its own entry
+DEFAULT_ROUTES: Dict[str, Dict[str, Any]] = {
+    "*": {"primary": DEFAULT_MODEL, "fallback": None, "slo_ms": 30000, "timeout": 90.0},
+    "captions": {"primary": "gpt-4o-mini", "fallback": DEFAULT_MODEL, "slo_ms": 5000, "timeout": 20.0},
+    "poser": {"primary": "gpt-4o-mini", "fallback": DEFAULT_MODEL, "slo_ms": 8000, "timeout": 30.0},
+    "video_review": {"primary": DEFAULT_MODEL, "fallback": "gpt-4o-mini", "slo_ms": 60000, "timeout": 120.0},
+    "kling_motion": {"primary": DEFAULT_MODEL, "fallback": "gpt-4o-mini", "slo_ms": 60000, "timeout": 120.0},
+}
+
+ROUTES_PATH = "model_routes.json"
+
+
+class ModelRouter:
+    """Chooses the model order for each call and tracks how each route performs"""
+
+    def __init__(self, routes: Optional[Dict[str, Dict[str, Any]]] = None,
+                 routes_path: Optional[str] = ROUTES_PATH, primary_retries: Optional[int] = None,
+                 window: int = 20, error_streak: int = 3, cooldown_seconds: float = 120.0):
+        """
+        Args:
+            routes: Routing table (defaults to DEFAULT_ROUTES)
+            routes_path: Optional JSON file whose entries override the table
+            primary_retries: Retries on the primary before falling back, for routes without
+                             their own "retries" (None keeps the service's retry policy)
+            window: Recent calls kept per (feature, model) for the SLO check
+            error_streak: Consecutive failures that demote a primary
+            cooldown_seconds: How long a demoted primary is skipped
+        """
+        self.routes = {feature: dict(route) for feature, route in (routes or DEFAULT_ROUTES).items()}
+        if routes_path and os.path.exists(routes_path):
+            try:
+                with open(routes_path, 'r', encoding='utf-8') as f:
+                    for feature, route in json.load(f).items():
+                        self.routes[feature] = {**self.routes.get(feature, self.routes.get("*", {})), **route}
+            except Exception as e:
+                print(f"Error loading model routes: {e}")
+        self.primary_retries = primary_retries
+        self.error_streak = error_streak
+        self.cooldown_seconds = cooldown_seconds
+        self._latencies: Dict[Tuple[str, str], Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self._failures: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._demoted_until: Dict[Tuple[str, str], float] = {}
+        self.decisions: Deque[Dict[str, Any]] = deque(maxlen=500)
+        self._lock = threading.Lock()
+
+    def route_for(self, feature: str, default_model: str) -> Dict[str, Any]:
+        """Resolved route for a feature ("default" replaced by default_model)"""
+        route = {**self.routes.get("*", {}), **self.routes.get(feature, {})}
+        primary = route.get("primary") or DEFAULT_MODEL
+        fallback = route.get("fallback")
+        route["primary"] = default_model if primary == DEFAULT_MODEL else primary
+        route["fallback"] = default_model if fallback == DEFAULT_MODEL else fallback
+        if route["fallback"] == route["primary"]:
+            route["fallback"] = None
+        return route
+
+    def plan(self, feature: str, default_model: str) -> List[Dict[str, Any]]:
+        """
+        Ordered attempts for one call.
+
+        Returns:
+            [{"model", "role", "timeout", "retries", "reason"}, ...]; the
+            primary comes first unless it is demoted
+        """
+        route = self.route_for(feature, default_model)
+        retries = route.get("retries", self.primary_retries) if route["fallback"] else None
+        primary = {"model": route["primary"], "role": "primary", "timeout": route.get("timeout"),
+                   "retries": retries, "reason": "primary"}
+        if not route["fallback"]:
+            return [primary]
+        fallback = {"model": route["fallback"], "role": "fallback", "timeout": route.get("timeout"),
+                    "retries": None, "reason": "primary failed"}
+
+        with self._lock:
+            demoted_until = self._demoted_until.get((feature, route["primary"]), 0)
+        if time.monotonic() < demoted_until:
+            fallback["reason"] = "primary demoted"
+            primary["reason"] = "probe after fallback"
+            return [fallback, primary]
+        return [primary, fallback]
+
+    def record(self, feature: str, leg: Dict[str, Any], latency_ms: float, ok: bool,
+               error: Optional[str] = None):
+        """Log one attempt and update the route's health"""
+        key = (feature, leg["model"])
+        slo_ms = {**self.routes.get("*", {}), **self.routes.get(feature, {})}.get("slo_ms")
+        with self._lock:
+            if ok:
+                self._failures[key] = 0
+                self._latencies[key].append(latency_ms)
+                recent = list(self._latencies[key])
+                # Demote a primary whose recent p90 misses its SLO
+                if (leg["role"] == "primary" and slo_ms and len(recent) >= 5
+                        and percentile(recent, 90) > slo_ms):
+                    self._demote(key, f"p90 {percentile(recent, 90):.0f}ms > SLO {slo_ms}ms")
+            else:
+                self._failures[key] += 1
+                if leg["role"] == "primary" and self._failures[key] >= self.error_streak:
+                    self._demote(key, f"{self._failures[key]} consecutive failures")
+            self.decisions.append({
+                "timestamp": datetime.now().isoformat(),
+                "feature": feature,
+                "model": leg["model"],
+                "role": leg["role"],
+                "reason": leg["reason"],
+                "latency_ms": round(latency_ms, 1),
+                "ok": ok,
+                "error": error,
+            })
+
+    def _demote(self, key: Tuple[str, str], why: str):
+        """Skip a primary for cooldown_seconds (caller holds the lock)"""
+        if time.monotonic() < self._demoted_until.get(key, 0):
+            return
+        self._demoted_until[key] = time.monotonic() + self.cooldown_seconds
+        self._latencies[key].clear()
+        self._failures[key] = 0
+        print(f"⚠️ ROUTE DEMOTED {key[0]}: {key[1]} ({why}), using fallback for {self.cooldown_seconds:.0f}s")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Latency per (feature, model) route and whether the route is currently demoted"""
+        now = time.monotonic()
+        with self._lock:
+            keys = {key for key, values in self._latencies.items() if values}
+            keys.update(key for key, until in self._demoted_until.items() if now < until)
+            stats = {}
+            for feature, model in sorted(keys):
+                values = list(self._latencies.get((feature, model), ()))
+                stats[f"{feature} → {model}"] = {
+                    "calls": len(values),
+                    "p50_ms": round(percentile(values, 50)) if values else None,
+                    "p90_ms": round(percentile(values, 90)) if values else None,
+                    "demoted": now < self._demoted_until.get((feature, model), 0),
+                }
+            return stats
+
+
+_shared_router: Optional[ModelRouter] = None
+_shared_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """Process-wide router, so route health is shared by every session"""
+    global _shared_router
+    with _shared_lock:
+        if _shared_router is None:
+            _shared_router = ModelRouter()
+        return _shared_router
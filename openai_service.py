@@ -1,9 +1,254 @@
-import base64
+import hashlib
 import json
-from typing import Any, Dict, List
+import time
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple
 
-from openai import OpenAI
+from openai import DefaultHttpxClient, OpenAI
+from call_metrics import CallTimer, install_ttfb_hook
 from emotion_engine import EmotionEngine
+from feature_schemas import find_invalid_fields, get_schema, response_format_for
+from image_preprocessor import EncodedImageMemo, ImagePreprocessor
+from deadline import (Cancelled, Deadline, DeadlineExceeded, FailedCall, current_deadline, deadline_scope,
+                      outcome_of)
+from hedging import HedgePolicy
+from json_repair import damaged_fields, format_path, parse_tolerant
+from json_stream import FieldPath, IncrementalJSONParser, replay_fields
+from model_router import ModelRouter, get_model_router
+from rate_limiter import RateLimiter, RetryPolicy, estimate_request_tokens, get_shared_limiter
+from response_cache import ResponseCache, request_fingerprint
+from single_flight import SingleFlight, get_single_flight
+from token_budget import TokenBudget, get_token_budget
+from transport import OpenAITransport
+from video_analyzer import describe_motion
+
+
+# Static system prompts. They contain no per-request values so every request for a
+# feature starts with a byte-identical prefix the provider can serve from its prompt cache;
+# model, intensity, language, DNA, emotion data and images all go in the user message.
+
+DRMOTION_INSTRUCTIONS = (
+    "You are Dr. Motion, an AI Video Prompt Specialist.\n\n"
+    "MODEL OPTIMIZATION:\n"
+    "Apply the VIDEO MODEL GUIDE supplied with the request (strengths and preferred descriptors "
+    "of the target video model).\n\n"
+    "YOUR MISSION:\n"
+    "Create a video generation prompt that produces ULTRA-REALISTIC human motion and emotion.\n"
+    "The AI model must see a REAL PERSON, not a robotic avatar.\n\n"
+    "CRITICAL REQUIREMENTS:\n"
+    "1. EMOTION AUTHENTICITY:\n"
+    "   - Use the provided Emotion Database breakdown\n"
+    "   - Describe SPECIFIC micro-expressions (not just 'looks happy')\n"
+    "   - Include EXACT facial muscle activations (e.g., 'orbicularis oculi contracts creating crow's feet')\n"
+    "   - Map emotion to BODY LANGUAGE (shoulders, hands, posture, weight distribution)\n"
+    "   - Describe TEMPORAL PROGRESSION (how emotion evolves over 8 seconds)\n\n"
+    "2. PHYSICS REALISM:\n"
+    "   - Hair physics: How hair moves with motion (gravity, momentum, wind resistance)\n"
+    "   - Cloth simulation: Fabric folding, stretching, natural draping\n"
+    "   - Skin subsurface scattering: Light penetrating skin\n"
+    "   - Weight transfer: How body weight shifts realistically\n"
+    "   - Momentum and inertia: Natural movement follow-through\n\n"
+    "3. HUMAN IMPERFECTIONS:\n"
+    "   - Include asymmetries (one eye slightly different)\n"
+    "   - Natural micro-movements (breathing, blinking, micro-adjustments)\n"
+    "   - Timing variations (not perfectly mechanical)\n"
+    "   - Environmental reactions (squinting in light, hair blown by wind)\n\n"
+    "4. LIGHTING & CINEMATOGRAPHY:\n"
+    "   - Describe light source changes during motion\n"
+    "   - Shadow dynamics\n"
+    "   - Camera movement that enhances emotion\n"
+    "   - Depth of field adjustments\n\n"
+    "OUTPUT JSON STRUCTURE:\n"
+    "{\n"
+    "  'character_analysis': 'Brief analysis of the input image',\n"
+    "  'emotion_breakdown': 'How the specific emotion manifests in this motion',\n"
+    "  'physics_notes': 'Key physics simulations needed',\n"
+    "  'micro_expressions': 'List of 3-5 specific facial details',\n"
+    "  'body_language_cues': 'List of 3-5 body movement details',\n"
+    "  'temporal_flow': {\n"
+    "    'seconds_0_2': 'What happens in first 2 seconds',\n"
+    "    'seconds_3_5': 'Middle progression',\n"
+    "    'seconds_6_8': 'How it concludes'\n"
+    "  },\n"
+    "  'final_video_prompt': 'The complete, detailed prompt for the AI video model'\n"
+    "}\n"
+)
+
+PRODUCT_REVIEW_INSTRUCTIONS = (
+    "You are a Director of AI-Generated Product Reviews.\n"
+    "Create a cohesive 16-second product review split into TWO 8-second clips.\n\n"
+    "CRITICAL: This must feel like REAL user-generated content, not a corporate ad.\n\n"
+    "REQUIREMENTS:\n"
+    "1. SCRIPT AUTHENTICITY:\n"
+    "   - Language: the SCRIPT LANGUAGE given with the request\n"
+    "   - Tone: the TONE given with the request\n"
+    "   - Must include natural speech patterns:\n"
+    "     * Filler words: 'like', 'um', 'actually', 'you know' (for casual tones)\n"
+    "     * Contractions: 'it's', 'I'm', 'you're' (not 'it is')\n"
+    "     * Conversational flow: NOT scripted-sounding\n"
+    "     * Emotional authenticity: Match the vocal qualities from emotion database\n\n"
+    "2. VISUAL STORYTELLING:\n"
+    "   CLIP A (0-8s): THE HOOK\n"
+    "   - Focus on FACE and ACTING\n"
+    "   - Establish emotion immediately\n"
+    "   - Direct eye contact with camera (talking to viewer)\n"
+    "   - Include specific micro-expressions from emotion database\n"
+    "   - Show the product BRIEFLY in hand or frame\n\n"
+    "   CLIP B (8-16s): THE DEMO\n"
+    "   - Shift focus to PRODUCT usage\n"
+    "   - Continue same emotion intensity\n"
+    "   - Show hands interacting with product\n"
+    "   - Maintain lighting/aesthetic consistency from Clip A\n"
+    "   - Include result/benefit shots\n\n"
+    "3. CONTINUITY:\n"
+    "   - Lighting must match between clips\n"
+    "   - Clothing/styling identical\n"
+    "   - Background consistent\n"
+    "   - Emotional arc flows naturally\n\n"
+    "4. EMOTION MAPPING:\n"
+    "   Use the provided emotion breakdown to inform:\n"
+    "   - Facial expressions in Clip A\n"
+    "   - Body language throughout\n"
+    "   - Energy level\n"
+    "   - Vocal delivery style\n\n"
+    "OUTPUT JSON:\n"
+    "{\n"
+    "  'script_analysis': 'Brief note on script tone and language',\n"
+    "  'script': 'The actual spoken dialogue (natural, authentic)',\n"
+    "  'clip_1_visual_prompt': 'Detailed prompt for Clip A (face/acting)',\n"
+    "  'clip_1_acting_notes': 'Specific micro-expressions and cues',\n"
+    "  'clip_2_visual_prompt': 'Detailed prompt for Clip B (product demo)',\n"
+    "  'clip_2_continuity': 'How this matches Clip A',\n"
+    "  'director_notes': 'Overall guidance for consistency'\n"
+    "}\n"
+)
+
+KLING_MOTION_INSTRUCTIONS = (
+    "You are Dr. Motion KLING SPECIALIST, an expert multi-shot video director "
+    "specifically optimized for the Kling model family (Kling 3.0 / Kling Omni).\n\n"
+    "MODEL OPTIMIZATION:\n"
+    "Apply the TARGET MODEL GUIDE supplied with the request.\n\n"
+    "YOUR MISSION:\n"
+    "Create a MULTI-SHOT cinematic 9-second video sequence with the requested NUMBER OF SHOTS.\n"
+    "Each shot must flow naturally into the next, creating a cohesive mini-narrative.\n"
+    "The AI model must look like a REAL PERSON with authentic emotion and natural motion.\n\n"
+    "The request specifies the VIDEO CATEGORY (vibe), PROPS/ELEMENTS to integrate, "
+    "SETTING and CAMERA STYLE.\n\n"
+    "CRITICAL MULTI-SHOT REQUIREMENTS:\n"
+    "1. SHOT PLANNING (NUMBER OF SHOTS across 9 seconds):\n"
+    "   - Each shot has a clear purpose in the narrative\n"
+    "   - Smooth transitions between shots (cut, dissolve, or continuous)\n"
+    "   - Props/elements must appear NATURALLY (not forced)\n"
+    "   - Character identity MUST be consistent across all shots\n"
+    "   - Lighting and color grading must match across shots\n\n"
+    "2. PROP/ELEMENT INTEGRATION:\n"
+    "   - Props should feel like natural parts of the scene\n"
+    "   - Show realistic interaction (hands gripping, fingers typing, etc.)\n"
+    "   - Props enhance the narrative, not distract from it\n"
+    "   - Include physics for props (weight, material, reflection)\n\n"
+    "3. EMOTION & ACTING:\n"
+    "   - Use the provided Emotion Database for authentic behavior\n"
+    "   - Emotion should evolve across shots (arc)\n"
+    "   - Include micro-expressions and body language\n"
+    "   - Match the video category vibe throughout\n\n"
+    "4. CINEMATOGRAPHY:\n"
+    "   - Camera movements should enhance the category vibe\n"
+    "   - Depth of field changes between shots\n"
+    "   - Lighting creates mood appropriate to category\n"
+    "   - Each shot has purposeful framing\n\n"
+    "5. REALISM REQUIREMENTS:\n"
+    "   - Natural skin texture with pores, imperfections\n"
+    "   - Realistic hair physics (individual strands)\n"
+    "   - Cloth simulation (fabric weight, draping, movement)\n"
+    "   - Physics-accurate prop interaction\n"
+    "   - Subsurface scattering on skin\n"
+    "   - Natural breathing, blinking, micro-movements\n\n"
+    "OUTPUT JSON STRUCTURE:\n"
+    "{\n"
+    "  'character_analysis': 'Brief analysis of the AI model from the image',\n"
+    "  'narrative_concept': 'The mini-story/concept for this 9-second sequence',\n"
+    "  'category_approach': 'How the category vibe is achieved throughout',\n"
+    "  'element_integration_plan': 'How each prop/element is woven into the sequence',\n"
+    "  'shots': [\n"
+    "    {\n"
+    "      'shot_number': 1,\n"
+    "      'duration': '0s-3s',\n"
+    "      'shot_type': 'Close-up / Medium / Wide / etc.',\n"
+    "      'description': 'What happens in this shot',\n"
+    "      'camera': 'Camera angle and movement',\n"
+    "      'acting': 'Character emotion and action',\n"
+    "      'props_visible': 'Which props appear and how',\n"
+    "      'transition_to_next': 'How this transitions to the next shot'\n"
+    "    }\n"
+    "  ],\n"
+    "  'kling_prompt': 'The COMPLETE, DETAILED prompt for Kling (500+ words). This is the MAIN output. Ultra-detailed, cinematic, multi-shot sequence described shot-by-shot with ALL details: character appearance, emotion, action, camera, lighting, props, physics, transitions. Optimized specifically for Kling video generation.',\n"
+    "  'negative_prompt': 'What to AVOID (bad anatomy, blurry, cartoon, etc.)',\n"
+    "  'audio_mood': 'Suggested audio/music mood and style for this sequence',\n"
+    "  'director_notes': 'Key tips for achieving the best result with this prompt'\n"
+    "}\n"
+)
+
+VIDEO_REVIEW_INSTRUCTIONS = (
+    "You are Dr. Motion Video Analyst, an expert at detecting human motion, emotion, "
+    "and body language from video keyframes.\n\n"
+    "You are given sequential keyframes extracted from a short reel/video. "
+    "Analyze the person's movement across frames and determine:\n\n"
+    "PHASE 1 - MOTION DETECTION:\n"
+    "1. PRIMARY MOTION: What is the person doing? (e.g., walking, dancing, posing, "
+    "talking, hair flip, turning, sitting, standing up, hand gestures, etc.)\n"
+    "2. MOTION DETAILS: Describe the exact body mechanics - how arms move, hip sway, "
+    "head position changes, weight transfer, footwork, hand gestures across frames\n"
+    "3. MOTION SPEED: Slow/medium/fast, any acceleration or deceleration\n"
+    "4. MOTION STYLE: Sensual, energetic, casual, dramatic, elegant, playful, etc.\n\n"
+    "PHASE 2 - EMOTION DETECTION:\n"
+    "1. PRIMARY EMOTION: What emotion is the person expressing?\n"
+    "2. MICRO-EXPRESSIONS: Specific facial details you observe across frames\n"
+    "3. BODY LANGUAGE CUES: How emotion manifests in posture and movement\n"
+    "4. ENERGY LEVEL: Low/medium/high and how it changes\n\n"
+    "PHASE 3 - VISUAL STYLE:\n"
+    "1. LIGHTING: Type, direction, mood\n"
+    "2. CAMERA: Angle, movement, framing\n"
+    "3. ENVIRONMENT: Background, setting, props\n"
+    "4. AESTHETIC: Color grading, mood, overall vibe\n\n"
+    "PHASE 4 - GENERATE PROMPTS:\n"
+    "Using your analysis, generate THREE model-specific prompts that would recreate "
+    "this exact motion and emotion with the user's AI character (from Master DNA).\n\n"
+    "MODEL-SPECIFIC OPTIMIZATION:\n"
+    "- Veo3: Google's latest model. Excels at physics accuracy, realistic motion, "
+    "dialogue-capable, natural lighting. Use descriptors: 'physically accurate motion', "
+    "'realistic gravity and momentum', 'natural light interaction', 'cinematic quality', "
+    "'fluid body dynamics', 'photorealistic rendering'.\n"
+    "- Kling: Excels at high-detail textures, smooth camera movements, photorealistic skin, "
+    "dynamic cloth physics. Use descriptors: '8k quality', 'cinematic camera', "
+    "'photorealistic skin texture', 'dynamic lighting', 'detailed hair physics'.\n"
+    "- Seedance (Seed Video): ByteDance's dance/motion model. Masters rhythmic body movement, "
+    "dance choreography, fluid transitions, expressive full-body motion. Use descriptors: "
+    "'fluid dance motion', 'rhythmic body movement', 'expressive choreography', "
+    "'smooth motion transitions', 'dynamic full-body expression', 'musical rhythm sync'.\n\n"
+    "Match the EMOTION INTENSITY given with the request.\n\n"
+    "OUTPUT JSON STRUCTURE:\n"
+    "{\n"
+    "  'detected_motion': 'Primary motion type detected',\n"
+    "  'motion_details': 'Detailed description of body mechanics across frames',\n"
+    "  'motion_speed': 'Speed and rhythm of movement',\n"
+    "  'motion_style': 'Overall style classification',\n"
+    "  'detected_emotion': 'Primary emotion detected',\n"
+    "  'emotion_confidence': 'High/Medium/Low',\n"
+    "  'micro_expressions': ['List of 3-5 observed facial details'],\n"
+    "  'body_language_cues': ['List of 3-5 body movement observations'],\n"
+    "  'lighting_analysis': 'Lighting setup description',\n"
+    "  'camera_analysis': 'Camera angle and movement description',\n"
+    "  'environment': 'Background and setting description',\n"
+    "  'color_grading': 'Color mood and grading style',\n"
+    "  'veo3_prompt': 'Complete detailed prompt optimized for Veo3',\n"
+    "  'kling_prompt': 'Complete detailed prompt optimized for Kling',\n"
+    "  'seedance_prompt': 'Complete detailed prompt optimized for Seedance',\n"
+    "  'director_notes': 'Key notes for recreating this motion authentically'\n"
+    "}\n"
+)
+
+FieldCallback = Callable[[FieldPath, Any], None]
+# (index in the variations list, labelled result) for drmotion_generate_many
+VariantCallback = Callable[[int, Dict[str, Any]], None]
 
 
 class OpenAIService:
@@ -13,14 +258,112 @@ class OpenAIService:
     NEW: Integrated EmotionEngine for ultra-realistic human behavior simulation.
     """
 
-    def __init__(self, api_key: str, model: str = "gpt-4o"):
-        self.client = OpenAI(api_key=api_key)
+    # Model-specific guidance for DrMotion single clips
+    DRMOTION_MODEL_GUIDES = {
+        "Kling 1.5": "Kling excels at: High detail textures, smooth camera movements, realistic cloth physics. Use descriptors: '8k quality', 'cinematic camera orbit', 'photorealistic skin texture', 'dynamic lighting shifts'.",
+        "Veo 2 / Sora": "Veo/Sora masters: Physics accuracy, fluid dynamics, complex lighting. Use descriptors: 'physically accurate motion', 'realistic gravity', 'natural light interaction', 'consistent world physics'.",
+        "Luma Dream Machine": "Luma strengths: Keyframe precision, style consistency, smooth transitions. Use descriptors: 'cinematic movement', 'start state to end state', 'dramatic camera work', 'keyframe animation'.",
+        "Runway Gen-3 Alpha": "Runway Gen-3 best for: Structure preservation, facial consistency, controlled motion. Use descriptors: 'maintain facial features', 'smooth natural motion', 'structural coherence', 'speed control'.",
+        "Minimax": "Minimax optimized for: Chinese features, fast generation, emotional expressions. Use descriptors: 'expressive faces', 'cultural authenticity', 'rapid motion', 'clear emotions'.",
+        "Haiper": "Haiper strong at: Quick iterations, style variety, artistic motion. Use descriptors: 'creative movement', 'artistic interpretation', 'varied styles', 'expressive motion'."
+    }
+    DRMOTION_DEFAULT_GUIDE = "Focus on realistic motion, natural physics, and authentic emotions."
+
+    # Kling multi-shot model guides, passed to the model in the user message
+    KLING_MODEL_GUIDES = {
+        "Kling 3.0": (
+            "Kling 3.0 is the latest generation with SUPERIOR capabilities:\n"
+            "- Ultra-high detail textures (8K quality, photorealistic skin pores)\n"
+            "- Advanced cloth physics simulation (realistic fabric draping, stretching, flowing)\n"
+            "- Dynamic hair physics with individual strand rendering\n"
+            "- Cinematic camera movements with smooth transitions\n"
+            "- Photorealistic skin with subsurface scattering\n"
+            "- Advanced lighting with real-time shadow dynamics\n"
+            "- Multi-shot consistency (character identity preservation across cuts)\n"
+            "- Natural motion with realistic momentum and inertia\n"
+            "USE DESCRIPTORS: '8k cinematic quality', 'photorealistic skin texture with visible pores', "
+            "'dynamic lighting shifts', 'smooth camera orbit', 'natural cloth physics simulation', "
+            "'realistic hair dynamics', 'cinematic depth of field', 'film grain subtlety'."
+        ),
+        "Kling Omni": (
+            "Kling Omni is the OMNI-capable model with enhanced understanding:\n"
+            "- Multimodal comprehension (understands context, emotion, narrative)\n"
+            "- Superior character consistency across multi-shot sequences\n"
+            "- Enhanced physics engine (gravity, momentum, cloth, hair, liquid)\n"
+            "- Advanced emotional expression rendering\n"
+            "- Better object interaction physics (hands + props)\n"
+            "- Narrative coherence across shots (story flow)\n"
+            "- Enhanced facial micro-expression rendering\n"
+            "- Natural prop/object interaction (holding, using, placing)\n"
+            "USE DESCRIPTORS: '8k cinematic quality', 'narrative coherence', 'photorealistic rendering', "
+            "'natural object interaction', 'seamless shot transitions', 'emotional depth', "
+            "'character consistency across cuts', 'physically accurate prop interaction'."
+        )
+    }
+
+    # Follow-up turn sent when an answer stops at max_tokens (finish_reason=length)
+    CONTINUE_PROMPT = (
+        "Your previous message was cut off. Continue EXACTLY where it stopped: output only the "
+        "remaining characters of the same JSON, with no repetition, preamble or code fences."
+    )
+    MAX_CONTINUATIONS = 2
+
+    # Rough output size of one variant in drmotion_generate_many, used to split batches
+    DRMOTION_VARIANT_TOKENS = 700
+    DRMOTION_MANY_OVERHEAD_TOKENS = 200
+    # Features whose output length scales with the request (variants per chunk), so
+    # they keep the max_tokens they were sized with instead of a learned budget
+    FIXED_BUDGET_FEATURES = {"drmotion_many"}
+
+    def __init__(self, api_key: str, model: str = "gpt-4o", cache: Optional[ResponseCache] = None,
+                 image_profiles: Optional[Dict[str, Dict[str, Any]]] = None,
+                 image_memo: Optional[EncodedImageMemo] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 http_client=None,
+                 metrics_sink: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 transport=None,
+                 single_flight: Optional[SingleFlight] = None,
+                 structured_outputs: bool = True,
+                 token_budget: Optional[TokenBudget] = None,
+                 router: Optional[ModelRouter] = None,
+                 hedge_policy: Optional[HedgePolicy] = None,
+                 call_timeout: Optional[float] = 180.0):
+        if http_client is None:
+            http_client = DefaultHttpxClient()
+        install_ttfb_hook(http_client)
+        # Retries are scheduled by retry_policy so they respect the shared rate limiter
+        self.client = OpenAI(api_key=api_key, max_retries=0, http_client=http_client)
+        # Where completions are sent: the API by default, or a Recording/ReplayTransport
+        self.transport = transport or OpenAITransport(self.client, on_headers=self._observe_rate_headers)
+        # Called with one record per model call (see call_metrics.CallTimer.record)
+        self.metrics_sink = metrics_sink
         self.model = model
+        self.cache = cache
+        self.images = ImagePreprocessor(image_profiles, memo=image_memo)
+        self._limiter_scope = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+        self.rate_limiter = rate_limiter or get_shared_limiter(model, scope=self._limiter_scope)
+        self.retry_policy = retry_policy or RetryPolicy()
+        # Per-feature strict JSON schemas (feature_schemas); models that reject them fall back to json_object
+        self.structured_outputs = structured_outputs
+        self._schema_rejected = set()
+        # Learned per-feature max_tokens (the method's value is the default until enough samples exist)
+        self.token_budget = token_budget or get_token_budget()
+        # Identical concurrent requests share one API call
+        self.single_flight = single_flight or get_single_flight()
+        # Per-feature primary/fallback models; `model` is the route's "default"
+        self.router = router or get_model_router()
+        # Duplicate slow interactive calls after the feature's p90 (None disables hedging)
+        self.hedge_policy = hedge_policy
+        # Upper bound on one feature call, including retries, fallback and continuations;
+        # callers can tighten it with deadline.deadline_scope
+        self.call_timeout = call_timeout
 
     # -------------------- DR. MOTION (VIDEO) - ENHANCED --------------------
 
     def drmotion_generate(self, uploaded_file, model_choice: str, motion_type: str,
-                         emotion: str, master_dna: str, intensity: str = "Medium") -> Dict[str, Any]:
+                         emotion: str, master_dna: str, intensity: str = "Medium",
+                         on_field: Optional[FieldCallback] = None) -> Dict[str, Any]:
         """
         Enhanced single-clip generation with deep Emotion Engine integration.
 
@@ -31,74 +374,35 @@ class OpenAIService:
             emotion: Emotion from EmotionEngine database
             master_dna: Character identity description
             intensity: Emotion intensity (Subtle, Medium, Strong)
+            on_field: Optional callback(path, value); when given the completion is streamed
+                      and each top-level field is reported as soon as it is complete
         """
-        data_url = self._filelike_to_data_url(uploaded_file)
-
-        # Model-specific guidance
-        model_guides = {
-            "Kling 1.5": "Kling excels at: High detail textures, smooth camera movements, realistic cloth physics. Use descriptors: '8k quality', 'cinematic camera orbit', 'photorealistic skin texture', 'dynamic lighting shifts'.",
-            "Veo 2 / Sora": "Veo/Sora masters: Physics accuracy, fluid dynamics, complex lighting. Use descriptors: 'physically accurate motion', 'realistic gravity', 'natural light interaction', 'consistent world physics'.",
-            "Luma Dream Machine": "Luma strengths: Keyframe precision, style consistency, smooth transitions. Use descriptors: 'cinematic movement', 'start state to end state', 'dramatic camera work', 'keyframe animation'.",
-            "Runway Gen-3 Alpha": "Runway Gen-3 best for: Structure preservation, facial consistency, controlled motion. Use descriptors: 'maintain facial features', 'smooth natural motion', 'structural coherence', 'speed control'.",
-            "Minimax": "Minimax optimized for: Chinese features, fast generation, emotional expressions. Use descriptors: 'expressive faces', 'cultural authenticity', 'rapid motion', 'clear emotions'.",
-            "Haiper": "Haiper strong at: Quick iterations, style variety, artistic motion. Use descriptors: 'creative movement', 'artistic interpretation', 'varied styles', 'expressive motion'."
-        }
-        guide = model_guides.get(model_choice, "Focus on realistic motion, natural physics, and authentic emotions.")
+        request = self._build_drmotion_generate(
+            uploaded_file, model_choice, motion_type, emotion, master_dna, intensity
+        )
+        if on_field:
+            return self._stream_chat_json(**request, on_field=on_field)
+        return self._call_chat_json(**request)
+
+    def _build_drmotion_generate(self, uploaded_file, model_choice: str, motion_type: str,
+                                emotion: str, master_dna: str, intensity: str = "Medium") -> Dict[str, Any]:
+        """Build the chat request for drmotion_generate"""
+        image_part = self._image_part(uploaded_file, "drmotion")
+
+        guide = self.DRMOTION_MODEL_GUIDES.get(model_choice, self.DRMOTION_DEFAULT_GUIDE)
 
         # Get emotion breakdown from EmotionEngine
         emotion_prompt_section = EmotionEngine.build_emotion_prompt_section(emotion, intensity)
         motion_specific_cues = EmotionEngine.get_motion_specific_cues(motion_type, emotion)
 
-        instructions = (
-            f"You are Dr. Motion, an AI Video Prompt Specialist for {model_choice}.\n\n"
-            f"MODEL OPTIMIZATION:\n{guide}\n\n"
-            "YOUR MISSION:\n"
-            "Create a video generation prompt that produces ULTRA-REALISTIC human motion and emotion.\n"
-            "The AI model must see a REAL PERSON, not a robotic avatar.\n\n"
-            "CRITICAL REQUIREMENTS:\n"
-            "1. EMOTION AUTHENTICITY:\n"
-            "   - Use the provided Emotion Database breakdown\n"
-            "   - Describe SPECIFIC micro-expressions (not just 'looks happy')\n"
-            "   - Include EXACT facial muscle activations (e.g., 'orbicularis oculi contracts creating crow's feet')\n"
-            "   - Map emotion to BODY LANGUAGE (shoulders, hands, posture, weight distribution)\n"
-            "   - Describe TEMPORAL PROGRESSION (how emotion evolves over 8 seconds)\n\n"
-            "2. PHYSICS REALISM:\n"
-            "   - Hair physics: How hair moves with motion (gravity, momentum, wind resistance)\n"
-            "   - Cloth simulation: Fabric folding, stretching, natural draping\n"
-            "   - Skin subsurface scattering: Light penetrating skin\n"
-            "   - Weight transfer: How body weight shifts realistically\n"
-            "   - Momentum and inertia: Natural movement follow-through\n\n"
-            "3. HUMAN IMPERFECTIONS:\n"
-            "   - Include asymmetries (one eye slightly different)\n"
-            "   - Natural micro-movements (breathing, blinking, micro-adjustments)\n"
-            "   - Timing variations (not perfectly mechanical)\n"
-            "   - Environmental reactions (squinting in light, hair blown by wind)\n\n"
-            "4. LIGHTING & CINEMATOGRAPHY:\n"
-            "   - Describe light source changes during motion\n"
-            "   - Shadow dynamics\n"
-            "   - Camera movement that enhances emotion\n"
-            "   - Depth of field adjustments\n\n"
-            "OUTPUT JSON STRUCTURE:\n"
-            "{\n"
-            "  'character_analysis': 'Brief analysis of the input image',\n"
-            "  'emotion_breakdown': 'How the specific emotion manifests in this motion',\n"
-            "  'physics_notes': 'Key physics simulations needed',\n"
-            "  'micro_expressions': 'List of 3-5 specific facial details',\n"
-            "  'body_language_cues': 'List of 3-5 body movement details',\n"
-            "  'temporal_flow': {\n"
-            "    'seconds_0_2': 'What happens in first 2 seconds',\n"
-            "    'seconds_3_5': 'Middle progression',\n"
-            "    'seconds_6_8': 'How it concludes'\n"
-            "  },\n"
-            "  'final_video_prompt': 'The complete, detailed prompt for the AI video model'\n"
-            "}\n"
-        )
+        instructions = DRMOTION_INSTRUCTIONS
 
         user_text = (
-            f"MASTER CHARACTER DNA:\n{master_dna}\n\n"
             f"VIDEO MODEL: {model_choice}\n"
+            f"VIDEO MODEL GUIDE:\n{guide}\n\n"
             f"MOTION TYPE: {motion_type}\n"
             f"EMOTION INTENSITY: {intensity}\n\n"
+            f"MASTER CHARACTER DNA:\n{master_dna}\n\n"
             f"--- EMOTION DATABASE BREAKDOWN ---\n"
             f"{emotion_prompt_section}\n\n"
             f"--- MOTION-SPECIFIC ACTING CUES ---\n"
@@ -113,10 +417,204 @@ class OpenAIService:
             {"role": "system", "content": instructions},
             {"role": "user", "content": [
                 {"type": "text", "text": user_text},
-                {"type": "image_url", "image_url": {"url": data_url}}
+                image_part
+            ]},
+        ]
+        return {"messages": messages, "max_tokens": 2500, "feature": "drmotion"}
+
+    def drmotion_generate_many(self, uploaded_file, variations: List[Dict[str, Any]], motion_type: str,
+                               master_dna: str, emotion: str = "Authentic / Natural",
+                               intensity: str = "Medium", model_choice: str = "Kling 1.5",
+                               max_tokens: int = 4000,
+                               on_variant: Optional[VariantCallback] = None) -> List[Dict[str, Any]]:
+        """
+        Generate several DrMotion variants in as few requests as possible.
+
+        The image, instructions and Master DNA are sent once per request and the
+        model returns one `final_video_prompt` object per variation. Batches whose
+        estimated output would exceed max_tokens are split into several requests.
+
+        Args:
+            uploaded_file: Image file
+            variations: List of dicts overriding 'emotion', 'intensity' and/or 'model'
+            motion_type: Type of motion shared by all variants
+            master_dna: Character identity description
+            emotion: Default emotion for variations that don't set one
+            intensity: Default intensity for variations that don't set one
+            model_choice: Default video model for variations that don't set one
+            max_tokens: Output budget per request
+            on_variant: Called with (index in variations, result) as soon as each
+                        variant is final, e.g. to journal it
+
+        Returns:
+            One result dict per variation, in input order. Variants the model
+            skipped are regenerated individually with drmotion_generate, except
+            those of a chunk that was cancelled or timed out, which come back
+            with an 'error'.
+        """
+        variants = self._normalize_variants(variations, emotion, intensity, model_choice)
+        results: Dict[int, Dict[str, Any]] = {}
+        for chunk in self._chunk_variants(variants, max_tokens):
+            data = self._call_chat_json(**self._build_drmotion_generate_many(
+                uploaded_file, chunk, motion_type, master_dna, max_tokens
+            ))
+            collected = self._collect_variants(chunk, data)
+            results.update(collected)
+            self._notify_variants(on_variant, variants, collected)
+
+        for variant in variants:
+            if variant["variation_id"] not in results:
+                results[variant["variation_id"]] = self.drmotion_generate(
+                    uploaded_file, variant["model"], motion_type, variant["emotion"],
+                    master_dna, variant["intensity"]
+                )
+                self._notify_variants(on_variant, variants,
+                                      {variant["variation_id"]: results[variant["variation_id"]]})
+        return [self._label_variant(variant, results[variant["variation_id"]]) for variant in variants]
+
+    @staticmethod
+    def _normalize_variants(variations: List[Dict[str, Any]], emotion: str, intensity: str,
+                            model_choice: str) -> List[Dict[str, Any]]:
+        return [
+            {
+                "variation_id": i + 1,
+                "emotion": var.get("emotion", emotion),
+                "intensity": var.get("intensity", intensity),
+                "model": var.get("model", model_choice),
+            }
+            for i, var in enumerate(variations)
+        ]
+
+    def drmotion_many_calls(self, count: int, max_tokens: int = 4000) -> int:
+        """Most sequential requests drmotion_generate_many can make: every chunk, then each variant again"""
+        return len(self._chunk_variants([{}] * count, max_tokens)) + count
+
+    def _chunk_variants(self, variants: List[Dict[str, Any]], max_tokens: int) -> List[List[Dict[str, Any]]]:
+        per_request = max(1, (max_tokens - self.DRMOTION_MANY_OVERHEAD_TOKENS) // self.DRMOTION_VARIANT_TOKENS)
+        return [variants[i:i + per_request] for i in range(0, len(variants), per_request)]
+
+    @staticmethod
+    def _collect_variants(chunk: List[Dict[str, Any]], data: Dict[str, Any]) -> Dict[int, Dict[str, Any]]:
+        if outcome_of(data) in ("cancelled", "timeout"):
+            # Regenerating after a cancel or timeout is doomed and multiplies the cost: fail the chunk
+            return {variant["variation_id"]: data for variant in chunk}
+        expected = {variant["variation_id"] for variant in chunk}
+        collected = {}
+        for item in data.get("variants") or []:
+            if not isinstance(item, dict):
+                continue
+            try:
+                variation_id = int(item.get("variation_id"))
+            except (TypeError, ValueError):
+                continue
+            if variation_id in expected and item.get("final_video_prompt"):
+                collected[variation_id] = item
+        return collected
+
+    def _notify_variants(self, on_variant: Optional[VariantCallback], variants: List[Dict[str, Any]],
+                         collected: Dict[int, Dict[str, Any]]):
+        if on_variant is None:
+            return
+        for variation_id, result in collected.items():
+            on_variant(variation_id - 1, self._label_variant(variants[variation_id - 1], result))
+
+    @staticmethod
+    def _label_variant(variant: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+        if isinstance(result, FailedCall):
+            result = {"error": result.describe(), "outcome": result.outcome}
+        elif not result.get("final_video_prompt") and "error" not in result:
+            # A variant with no prompt is a failure too: keep it out of the journal and analytics
+            result = {**result, "error": "No final_video_prompt returned", "outcome": "empty"}
+        result = dict(result)
+        if isinstance(result.get("micro_expressions"), str):
+            # json_object fallbacks may still answer with a string; variants always carry a list
+            result["micro_expressions"] = [result["micro_expressions"]]
+        result.setdefault("emotion", variant["emotion"])
+        result.setdefault("intensity", variant["intensity"])
+        result.setdefault("model", variant["model"])
+        return result
+
+    def _build_drmotion_generate_many(self, uploaded_file, variants: List[Dict[str, Any]],
+                                      motion_type: str, master_dna: str,
+                                      max_tokens: int = 4000) -> Dict[str, Any]:
+        """Build the chat request for one chunk of drmotion_generate_many"""
+        image_part = self._image_part(uploaded_file, "drmotion")
+
+        instructions = (
+            "You are Dr. Motion, an AI Video Prompt Specialist.\n\n"
+            "YOUR MISSION:\n"
+            "Create SEVERAL video generation prompts for the SAME character and motion, one per requested "
+            "variation (emotion / intensity / target video model). Each must produce ULTRA-REALISTIC human "
+            "motion and emotion. The AI model must see a REAL PERSON, not a robotic avatar.\n\n"
+            "CRITICAL REQUIREMENTS FOR EVERY VARIANT:\n"
+            "1. EMOTION AUTHENTICITY: use that variation's Emotion Database breakdown, SPECIFIC micro-expressions, "
+            "EXACT facial muscle activations, body language and how the emotion evolves over 8 seconds.\n"
+            "2. PHYSICS REALISM: hair physics, cloth simulation, skin subsurface scattering, weight transfer, "
+            "momentum and inertia.\n"
+            "3. HUMAN IMPERFECTIONS: asymmetries, breathing, blinking, micro-adjustments, timing variations.\n"
+            "4. LIGHTING & CINEMATOGRAPHY: light changes during motion, shadow dynamics, camera movement that "
+            "enhances emotion, depth of field.\n"
+            "5. MODEL OPTIMIZATION: use the descriptors recommended for that variation's video model.\n"
+            "Variants must be clearly distinct from each other; do not copy text between them.\n\n"
+            "OUTPUT JSON STRUCTURE:\n"
+            "{\n"
+            "  'variants': [\n"
+            "    {\n"
+            "      'variation_id': 1,\n"
+            "      'emotion_breakdown': 'How this emotion manifests in this motion',\n"
+            "      'micro_expressions': ['List of 3-5 specific facial details'],\n"
+            "      'final_video_prompt': 'The complete, detailed prompt for this variation\'s AI video model'\n"
+            "    }\n"
+            "  ]\n"
+            "}\n"
+            "Return exactly one object per requested variation_id."
+        )
+
+        emotion_sections = {}
+        motion_cues = {}
+        for variant in variants:
+            key = (variant["emotion"], variant["intensity"])
+            if key not in emotion_sections:
+                emotion_sections[key] = EmotionEngine.build_emotion_prompt_section(*key)
+            if variant["emotion"] not in motion_cues:
+                motion_cues[variant["emotion"]] = EmotionEngine.get_motion_specific_cues(
+                    motion_type, variant["emotion"]
+                )
+
+        models = sorted({variant["model"] for variant in variants})
+        guides_text = "\n".join(
+            f"- {m}: {self.DRMOTION_MODEL_GUIDES.get(m, self.DRMOTION_DEFAULT_GUIDE)}" for m in models
+        )
+        variations_text = "\n".join(
+            f"- variation_id {v['variation_id']}: EMOTION {v['emotion']} | INTENSITY {v['intensity']} | "
+            f"VIDEO MODEL {v['model']}"
+            for v in variants
+        )
+        emotions_text = "\n\n".join(
+            f"[{emo} - {inten}]\n{section}" for (emo, inten), section in emotion_sections.items()
+        )
+        cues_text = "\n\n".join(f"[{emo}]\n{cues}" for emo, cues in motion_cues.items())
+
+        user_text = (
+            f"MASTER CHARACTER DNA:\n{master_dna}\n\n"
+            f"MOTION TYPE: {motion_type}\n\n"
+            f"--- VARIATIONS TO GENERATE ---\n{variations_text}\n\n"
+            f"--- VIDEO MODEL OPTIMIZATION ---\n{guides_text}\n\n"
+            f"--- EMOTION DATABASE BREAKDOWNS ---\n{emotions_text}\n\n"
+            f"--- MOTION-SPECIFIC ACTING CUES ---\n{cues_text}\n\n"
+            "TASK: For EACH variation, synthesize the matching information into a professional video prompt.\n"
+            "Each prompt should be SPECIFIC, DETAILED, and ACTIONABLE for its AI model.\n"
+            "Return JSON as specified above."
+        )
+
+        messages = [
+            {"role": "system", "content": instructions},
+            {"role": "user", "content": [
+                {"type": "text", "text": user_text},
+                image_part
             ]},
         ]
-        return self._call_chat_json(messages, max_tokens=2500)
+        return {"messages": messages, "max_tokens": max_tokens, "feature": "drmotion_many"}
 
     def drmotion_product_review(self, uploaded_file, product_info: str, language: str,
                                emotion: str, master_dna: str, intensity: str = "Medium") -> Dict[str, Any]:
@@ -124,65 +622,26 @@ class OpenAIService:
         Enhanced 2-part product review sequence with emotion engine integration.
         Generates realistic script + visual prompts with authentic human behavior.
         """
-        data_url = self._filelike_to_data_url(uploaded_file)
+        return self._call_chat_json(**self._build_drmotion_product_review(
+            uploaded_file, product_info, language, emotion, master_dna, intensity
+        ))
+
+    def _build_drmotion_product_review(self, uploaded_file, product_info: str, language: str,
+                                      emotion: str, master_dna: str, intensity: str = "Medium") -> Dict[str, Any]:
+        """Build the chat request for drmotion_product_review"""
+        image_part = self._image_part(uploaded_file, "product_review")
 
         # Get emotion details
         emotion_prompt_section = EmotionEngine.build_emotion_prompt_section(emotion, intensity)
 
-        instructions = (
-            "You are a Director of AI-Generated Product Reviews.\n"
-            "Create a cohesive 16-second product review split into TWO 8-second clips.\n\n"
-            "CRITICAL: This must feel like REAL user-generated content, not a corporate ad.\n\n"
-            "REQUIREMENTS:\n"
-            "1. SCRIPT AUTHENTICITY:\n"
-            f"   - Language: {language}\n"
-            f"   - Tone: {emotion}\n"
-            "   - Must include natural speech patterns:\n"
-            "     * Filler words: 'like', 'um', 'actually', 'you know' (for casual tones)\n"
-            "     * Contractions: 'it's', 'I'm', 'you're' (not 'it is')\n"
-            "     * Conversational flow: NOT scripted-sounding\n"
-            "     * Emotional authenticity: Match the vocal qualities from emotion database\n\n"
-            "2. VISUAL STORYTELLING:\n"
-            "   CLIP A (0-8s): THE HOOK\n"
-            "   - Focus on FACE and ACTING\n"
-            "   - Establish emotion immediately\n"
-            "   - Direct eye contact with camera (talking to viewer)\n"
-            "   - Include specific micro-expressions from emotion database\n"
-            "   - Show the product BRIEFLY in hand or frame\n\n"
-            "   CLIP B (8-16s): THE DEMO\n"
-            "   - Shift focus to PRODUCT usage\n"
-            "   - Continue same emotion intensity\n"
-            "   - Show hands interacting with product\n"
-            "   - Maintain lighting/aesthetic consistency from Clip A\n"
-            "   - Include result/benefit shots\n\n"
-            "3. CONTINUITY:\n"
-            "   - Lighting must match between clips\n"
-            "   - Clothing/styling identical\n"
-            "   - Background consistent\n"
-            "   - Emotional arc flows naturally\n\n"
-            "4. EMOTION MAPPING:\n"
-            "   Use the provided emotion breakdown to inform:\n"
-            "   - Facial expressions in Clip A\n"
-            "   - Body language throughout\n"
-            "   - Energy level\n"
-            "   - Vocal delivery style\n\n"
-            "OUTPUT JSON:\n"
-            "{\n"
-            "  'script_analysis': 'Brief note on script tone and language',\n"
-            "  'script': 'The actual spoken dialogue (natural, authentic)',\n"
-            "  'clip_1_visual_prompt': 'Detailed prompt for Clip A (face/acting)',\n"
-            "  'clip_1_acting_notes': 'Specific micro-expressions and cues',\n"
-            "  'clip_2_visual_prompt': 'Detailed prompt for Clip B (product demo)',\n"
-            "  'clip_2_continuity': 'How this matches Clip A',\n"
-            "  'director_notes': 'Overall guidance for consistency'\n"
-            "}\n"
-        )
+        instructions = PRODUCT_REVIEW_INSTRUCTIONS
 
         user_text = (
-            f"MASTER CHARACTER DNA:\n{master_dna}\n\n"
-            f"PRODUCT DETAILS: {product_info}\n"
             f"SCRIPT LANGUAGE: {language}\n"
-            f"EMOTIONAL INTENSITY: {intensity}\n\n"
+            f"TONE: {emotion}\n"
+            f"EMOTIONAL INTENSITY: {intensity}\n"
+            f"PRODUCT DETAILS: {product_info}\n\n"
+            f"MASTER CHARACTER DNA:\n{master_dna}\n\n"
             f"--- EMOTION DATABASE BREAKDOWN ---\n"
             f"{emotion_prompt_section}\n\n"
             "TASK: Create an authentic, engaging product review video plan.\n"
@@ -196,11 +655,11 @@ class OpenAIService:
                 "role": "user",
                 "content": [
                     {"type": "text", "text": user_text},
-                    {"type": "image_url", "image_url": {"url": data_url}},
+                    image_part,
                 ],
             },
         ]
-        return self._call_chat_json(messages, max_tokens=3000)
+        return {"messages": messages, "max_tokens": 3000, "feature": "product_review"}
 
     # -------------------- KLING MOTION (Multi-Shot 9s) --------------------
 
@@ -208,7 +667,8 @@ class OpenAIService:
                               master_dna: str, intensity: str = "Medium",
                               num_shots: int = 3, setting: str = "Auto-detect",
                               camera_style: str = "Dynamic Mix",
-                              model_target: str = "Kling 3.0") -> Dict[str, Any]:
+                              model_target: str = "Kling 3.0",
+                              on_field: Optional[FieldCallback] = None) -> Dict[str, Any]:
         """
         Generate a multi-shot 9-second video prompt optimized for Kling 3.0 / Kling Omni.
 
@@ -225,41 +685,26 @@ class OpenAIService:
             setting: Environment/setting for the video
             camera_style: Camera movement style
             model_target: Target model (Kling 3.0 or Kling Omni)
+            on_field: Optional callback(path, value) for progressive rendering; fields such as
+                      ("shots", i) and ("kling_prompt",) arrive while the completion streams
         """
-        data_url = self._filelike_to_data_url(uploaded_file)
-
-        # Model-specific optimization
-        model_guides = {
-            "Kling 3.0": (
-                "Kling 3.0 is the latest generation with SUPERIOR capabilities:\n"
-                "- Ultra-high detail textures (8K quality, photorealistic skin pores)\n"
-                "- Advanced cloth physics simulation (realistic fabric draping, stretching, flowing)\n"
-                "- Dynamic hair physics with individual strand rendering\n"
-                "- Cinematic camera movements with smooth transitions\n"
-                "- Photorealistic skin with subsurface scattering\n"
-                "- Advanced lighting with real-time shadow dynamics\n"
-                "- Multi-shot consistency (character identity preservation across cuts)\n"
-                "- Natural motion with realistic momentum and inertia\n"
-                "USE DESCRIPTORS: '8k cinematic quality', 'photorealistic skin texture with visible pores', "
-                "'dynamic lighting shifts', 'smooth camera orbit', 'natural cloth physics simulation', "
-                "'realistic hair dynamics', 'cinematic depth of field', 'film grain subtlety'."
-            ),
-            "Kling Omni": (
-                "Kling Omni is the OMNI-capable model with enhanced understanding:\n"
-                "- Multimodal comprehension (understands context, emotion, narrative)\n"
-                "- Superior character consistency across multi-shot sequences\n"
-                "- Enhanced physics engine (gravity, momentum, cloth, hair, liquid)\n"
-                "- Advanced emotional expression rendering\n"
-                "- Better object interaction physics (hands + props)\n"
-                "- Narrative coherence across shots (story flow)\n"
-                "- Enhanced facial micro-expression rendering\n"
-                "- Natural prop/object interaction (holding, using, placing)\n"
-                "USE DESCRIPTORS: '8k cinematic quality', 'narrative coherence', 'photorealistic rendering', "
-                "'natural object interaction', 'seamless shot transitions', 'emotional depth', "
-                "'character consistency across cuts', 'physically accurate prop interaction'."
-            )
-        }
-        guide = model_guides.get(model_target, model_guides["Kling 3.0"])
+        request = self._build_drmotion_kling_motion(
+            uploaded_file, category, elements, master_dna, intensity,
+            num_shots, setting, camera_style, model_target
+        )
+        if on_field:
+            return self._stream_chat_json(**request, on_field=on_field)
+        return self._call_chat_json(**request)
+
+    def _build_drmotion_kling_motion(self, uploaded_file, category: str, elements: list,
+                                     master_dna: str, intensity: str = "Medium",
+                                     num_shots: int = 3, setting: str = "Auto-detect",
+                                     camera_style: str = "Dynamic Mix",
+                                     model_target: str = "Kling 3.0") -> Dict[str, Any]:
+        """Build the chat request for drmotion_kling_motion"""
+        image_part = self._image_part(uploaded_file, "kling_motion")
+
+        guide = self.KLING_MODEL_GUIDES.get(model_target, self.KLING_MODEL_GUIDES["Kling 3.0"])
 
         # Get emotion section based on category mapping
         category_emotion_map = {
@@ -277,81 +722,18 @@ class OpenAIService:
 
         elements_text = ", ".join(elements) if elements else "No specific props"
 
-        instructions = (
-            f"You are Dr. Motion KLING SPECIALIST, an expert multi-shot video director "
-            f"specifically optimized for {model_target}.\n\n"
-            f"MODEL OPTIMIZATION:\n{guide}\n\n"
-            "YOUR MISSION:\n"
-            f"Create a MULTI-SHOT {num_shots}-shot cinematic 9-second video sequence.\n"
-            "Each shot must flow naturally into the next, creating a cohesive mini-narrative.\n"
-            "The AI model must look like a REAL PERSON with authentic emotion and natural motion.\n\n"
-            f"VIDEO CATEGORY/VIBE: {category}\n"
-            f"PROPS/ELEMENTS TO INTEGRATE: {elements_text}\n"
-            f"SETTING/ENVIRONMENT: {setting}\n"
-            f"CAMERA STYLE: {camera_style}\n\n"
-            "CRITICAL MULTI-SHOT REQUIREMENTS:\n"
-            f"1. SHOT PLANNING ({num_shots} shots across 9 seconds):\n"
-            "   - Each shot has a clear purpose in the narrative\n"
-            "   - Smooth transitions between shots (cut, dissolve, or continuous)\n"
-            "   - Props/elements must appear NATURALLY (not forced)\n"
-            "   - Character identity MUST be consistent across all shots\n"
-            "   - Lighting and color grading must match across shots\n\n"
-            "2. PROP/ELEMENT INTEGRATION:\n"
-            "   - Props should feel like natural parts of the scene\n"
-            "   - Show realistic interaction (hands gripping, fingers typing, etc.)\n"
-            "   - Props enhance the narrative, not distract from it\n"
-            "   - Include physics for props (weight, material, reflection)\n\n"
-            "3. EMOTION & ACTING:\n"
-            "   - Use the provided Emotion Database for authentic behavior\n"
-            "   - Emotion should evolve across shots (arc)\n"
-            "   - Include micro-expressions and body language\n"
-            "   - Match the video category vibe throughout\n\n"
-            "4. CINEMATOGRAPHY:\n"
-            "   - Camera movements should enhance the category vibe\n"
-            "   - Depth of field changes between shots\n"
-            "   - Lighting creates mood appropriate to category\n"
-            "   - Each shot has purposeful framing\n\n"
-            "5. REALISM REQUIREMENTS:\n"
-            "   - Natural skin texture with pores, imperfections\n"
-            "   - Realistic hair physics (individual strands)\n"
-            "   - Cloth simulation (fabric weight, draping, movement)\n"
-            "   - Physics-accurate prop interaction\n"
-            "   - Subsurface scattering on skin\n"
-            "   - Natural breathing, blinking, micro-movements\n\n"
-            "OUTPUT JSON STRUCTURE:\n"
-            "{\n"
-            "  'character_analysis': 'Brief analysis of the AI model from the image',\n"
-            "  'narrative_concept': 'The mini-story/concept for this 9-second sequence',\n"
-            "  'category_approach': 'How the category vibe is achieved throughout',\n"
-            "  'element_integration_plan': 'How each prop/element is woven into the sequence',\n"
-            "  'shots': [\n"
-            "    {\n"
-            "      'shot_number': 1,\n"
-            "      'duration': '0s-3s',\n"
-            "      'shot_type': 'Close-up / Medium / Wide / etc.',\n"
-            "      'description': 'What happens in this shot',\n"
-            "      'camera': 'Camera angle and movement',\n"
-            "      'acting': 'Character emotion and action',\n"
-            "      'props_visible': 'Which props appear and how',\n"
-            "      'transition_to_next': 'How this transitions to the next shot'\n"
-            "    }\n"
-            "  ],\n"
-            "  'kling_prompt': 'The COMPLETE, DETAILED prompt for Kling (500+ words). This is the MAIN output. Ultra-detailed, cinematic, multi-shot sequence described shot-by-shot with ALL details: character appearance, emotion, action, camera, lighting, props, physics, transitions. Optimized specifically for Kling video generation.',\n"
-            "  'negative_prompt': 'What to AVOID (bad anatomy, blurry, cartoon, etc.)',\n"
-            "  'audio_mood': 'Suggested audio/music mood and style for this sequence',\n"
-            "  'director_notes': 'Key tips for achieving the best result with this prompt'\n"
-            "}\n"
-        )
+        instructions = KLING_MOTION_INSTRUCTIONS
 
         user_text = (
-            f"MASTER CHARACTER DNA:\n{master_dna}\n\n"
             f"TARGET MODEL: {model_target}\n"
+            f"TARGET MODEL GUIDE:\n{guide}\n\n"
             f"VIDEO CATEGORY: {category}\n"
             f"EMOTION INTENSITY: {intensity}\n"
             f"NUMBER OF SHOTS: {num_shots}\n"
             f"PROPS/ELEMENTS: {elements_text}\n"
             f"SETTING: {setting}\n"
             f"CAMERA STYLE: {camera_style}\n\n"
+            f"MASTER CHARACTER DNA:\n{master_dna}\n\n"
             f"--- EMOTION DATABASE BREAKDOWN ---\n"
             f"{emotion_prompt_section}\n\n"
             "TASK: Create a cinematic multi-shot 9-second video sequence.\n"
@@ -367,15 +749,17 @@ class OpenAIService:
             {"role": "system", "content": instructions},
             {"role": "user", "content": [
                 {"type": "text", "text": user_text},
-                {"type": "image_url", "image_url": {"url": data_url}}
+                image_part
             ]},
         ]
-        return self._call_chat_json(messages, max_tokens=4000)
+        return {"messages": messages, "max_tokens": 4000, "feature": "kling_motion"}
 
     # -------------------- VIDEO REVIEW (Motion Detection) --------------------
 
     def drmotion_video_review(self, frames_data_urls: list, master_dna: str,
-                              intensity: str = "Medium") -> Dict[str, Any]:
+                              intensity: str = "Medium",
+                              on_field: Optional[FieldCallback] = None,
+                              motion: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Analyze a reel/video (via extracted keyframes) to detect the person's motion,
         emotion, and style, then generate prompts for Veo3, Kling, and Seedance models.
@@ -384,76 +768,40 @@ class OpenAIService:
             frames_data_urls: List of base64 data URLs of extracted keyframes
             master_dna: Character identity description
             intensity: Emotion intensity (Subtle, Medium, Strong)
+            on_field: Optional callback(path, value) for progressive rendering, e.g.
+                      ("detected_motion",) arrives long before ("seedance_prompt",)
+            motion: Optional motion profile from extract_motion_keyframes; its energy
+                    curve and speed/acceleration summary are sent with the frames
         """
+        request = self._build_drmotion_video_review(frames_data_urls, master_dna, intensity, motion)
+        if on_field:
+            return self._stream_chat_json(**request, on_field=on_field)
+        return self._call_chat_json(**request)
+
+    def _build_drmotion_video_review(self, frames_data_urls: list, master_dna: str,
+                                     intensity: str = "Medium",
+                                     motion: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Build the chat request for drmotion_video_review"""
+        # Label frames with their time and why they were picked when the motion pre-pass chose them
+        stamps = (motion or {}).get("keyframes") or []
+        if len(stamps) != len(frames_data_urls):
+            stamps = []
+
         # Build image content blocks for all frames
         image_blocks = []
         for i, url in enumerate(frames_data_urls):
-            image_blocks.append({"type": "text", "text": f"--- KEYFRAME {i+1} of {len(frames_data_urls)} ---"})
+            label = f"--- KEYFRAME {i+1} of {len(frames_data_urls)} ---"
+            if stamps:
+                label = f"--- KEYFRAME {i+1} of {len(frames_data_urls)} (t={stamps[i]['t']:.1f}s, {stamps[i]['reason']}) ---"
+            image_blocks.append({"type": "text", "text": label})
             image_blocks.append({"type": "image_url", "image_url": {"url": url}})
 
-        instructions = (
-            "You are Dr. Motion Video Analyst, an expert at detecting human motion, emotion, "
-            "and body language from video keyframes.\n\n"
-            "You are given sequential keyframes extracted from a short reel/video. "
-            "Analyze the person's movement across frames and determine:\n\n"
-            "PHASE 1 - MOTION DETECTION:\n"
-            "1. PRIMARY MOTION: What is the person doing? (e.g., walking, dancing, posing, "
-            "talking, hair flip, turning, sitting, standing up, hand gestures, etc.)\n"
-            "2. MOTION DETAILS: Describe the exact body mechanics - how arms move, hip sway, "
-            "head position changes, weight transfer, footwork, hand gestures across frames\n"
-            "3. MOTION SPEED: Slow/medium/fast, any acceleration or deceleration\n"
-            "4. MOTION STYLE: Sensual, energetic, casual, dramatic, elegant, playful, etc.\n\n"
-            "PHASE 2 - EMOTION DETECTION:\n"
-            "1. PRIMARY EMOTION: What emotion is the person expressing?\n"
-            "2. MICRO-EXPRESSIONS: Specific facial details you observe across frames\n"
-            "3. BODY LANGUAGE CUES: How emotion manifests in posture and movement\n"
-            "4. ENERGY LEVEL: Low/medium/high and how it changes\n\n"
-            "PHASE 3 - VISUAL STYLE:\n"
-            "1. LIGHTING: Type, direction, mood\n"
-            "2. CAMERA: Angle, movement, framing\n"
-            "3. ENVIRONMENT: Background, setting, props\n"
-            "4. AESTHETIC: Color grading, mood, overall vibe\n\n"
-            "PHASE 4 - GENERATE PROMPTS:\n"
-            "Using your analysis, generate THREE model-specific prompts that would recreate "
-            "this exact motion and emotion with the user's AI character (from Master DNA).\n\n"
-            "MODEL-SPECIFIC OPTIMIZATION:\n"
-            "- Veo3: Google's latest model. Excels at physics accuracy, realistic motion, "
-            "dialogue-capable, natural lighting. Use descriptors: 'physically accurate motion', "
-            "'realistic gravity and momentum', 'natural light interaction', 'cinematic quality', "
-            "'fluid body dynamics', 'photorealistic rendering'.\n"
-            "- Kling: Excels at high-detail textures, smooth camera movements, photorealistic skin, "
-            "dynamic cloth physics. Use descriptors: '8k quality', 'cinematic camera', "
-            "'photorealistic skin texture', 'dynamic lighting', 'detailed hair physics'.\n"
-            "- Seedance (Seed Video): ByteDance's dance/motion model. Masters rhythmic body movement, "
-            "dance choreography, fluid transitions, expressive full-body motion. Use descriptors: "
-            "'fluid dance motion', 'rhythmic body movement', 'expressive choreography', "
-            "'smooth motion transitions', 'dynamic full-body expression', 'musical rhythm sync'.\n\n"
-            f"EMOTION INTENSITY: {intensity}\n\n"
-            "OUTPUT JSON STRUCTURE:\n"
-            "{\n"
-            "  'detected_motion': 'Primary motion type detected',\n"
-            "  'motion_details': 'Detailed description of body mechanics across frames',\n"
-            "  'motion_speed': 'Speed and rhythm of movement',\n"
-            "  'motion_style': 'Overall style classification',\n"
-            "  'detected_emotion': 'Primary emotion detected',\n"
-            "  'emotion_confidence': 'High/Medium/Low',\n"
-            "  'micro_expressions': ['List of 3-5 observed facial details'],\n"
-            "  'body_language_cues': ['List of 3-5 body movement observations'],\n"
-            "  'lighting_analysis': 'Lighting setup description',\n"
-            "  'camera_analysis': 'Camera angle and movement description',\n"
-            "  'environment': 'Background and setting description',\n"
-            "  'color_grading': 'Color mood and grading style',\n"
-            "  'veo3_prompt': 'Complete detailed prompt optimized for Veo3',\n"
-            "  'kling_prompt': 'Complete detailed prompt optimized for Kling',\n"
-            "  'seedance_prompt': 'Complete detailed prompt optimized for Seedance',\n"
-            "  'director_notes': 'Key notes for recreating this motion authentically'\n"
-            "}\n"
-        )
+        instructions = VIDEO_REVIEW_INSTRUCTIONS
 
         user_content = [
             {"type": "text", "text": (
-                f"MASTER CHARACTER DNA (use this identity for all prompts):\n{master_dna}\n\n"
                 f"EMOTION INTENSITY: {intensity}\n\n"
+                f"MASTER CHARACTER DNA (use this identity for all prompts):\n{master_dna}\n\n"
                 "TASK: Analyze the following keyframes from a video reel. Detect the exact motion, "
                 "emotion, and style of the person. Then generate prompts for Veo3, Kling, and Seedance "
                 "that would recreate this EXACT motion and emotion using MY character (Master DNA).\n\n"
@@ -463,17 +811,28 @@ class OpenAIService:
                 "- Include physics (hair, cloth, skin), micro-expressions, temporal flow\n"
                 "- The prompts should make the AI model see a REAL PERSON, not a robotic avatar\n\n"
             )}
-        ] + image_blocks
+        ]
+        if motion:
+            user_content.append({"type": "text", "text": (
+                "LOCAL MOTION ANALYSIS (frame differencing over the whole clip, not just these keyframes):\n"
+                f"{describe_motion(motion)}\n"
+                "Use it for the timing, speed and acceleration of the motion between keyframes.\n\n"
+            )})
+        user_content += image_blocks
 
         messages = [
             {"role": "system", "content": instructions},
             {"role": "user", "content": user_content},
         ]
-        return self._call_chat_json(messages, max_tokens=4000)
+        return {"messages": messages, "max_tokens": 4000, "feature": "video_review"}
 
     # -------------------- DIGITAL WARDROBE --------------------
     def wardrobe_fuse_filelike(self, uploaded_file, master_dna: str) -> Dict[str, Any]:
-        data_url = self._filelike_to_data_url(uploaded_file)
+        return self._call_chat_json(**self._build_wardrobe_fuse_filelike(uploaded_file, master_dna))
+
+    def _build_wardrobe_fuse_filelike(self, uploaded_file, master_dna: str) -> Dict[str, Any]:
+        """Build the chat request for wardrobe_fuse_filelike"""
+        image_part = self._image_part(uploaded_file, "wardrobe")
         instructions = (
             "Analyze outfit image (fabric, cut, texture, color). IGNORE the person/body.\n"
             "Fuse this outfit description with the user's locked 'Master Face DNA'.\n"
@@ -483,13 +842,17 @@ class OpenAIService:
         user_text = f"MASTER DNA:\n{master_dna}\n\nTask: Wear this outfit.\nOutput JSON."
         messages = [
             {"role": "system", "content": instructions},
-            {"role": "user", "content": [{"type": "text", "text": user_text}, {"type": "image_url", "image_url": {"url": data_url}}]},
+            {"role": "user", "content": [{"type": "text", "text": user_text}, image_part]},
         ]
-        return self._call_chat_json(messages, max_tokens=1500)
+        return {"messages": messages, "max_tokens": 1500, "feature": "wardrobe"}
 
     # -------------------- MULTI-ANGLE GRID PLANNER --------------------
     def multi_angle_planner_filelike(self, uploaded_file, master_dna: str) -> Dict[str, Any]:
-        data_url = self._filelike_to_data_url(uploaded_file)
+        return self._call_chat_json(**self._build_multi_angle_planner_filelike(uploaded_file, master_dna))
+
+    def _build_multi_angle_planner_filelike(self, uploaded_file, master_dna: str) -> Dict[str, Any]:
+        """Build the chat request for multi_angle_planner_filelike"""
+        image_part = self._image_part(uploaded_file, "multi_angle")
         safe_dna_snippet = (master_dna or "")[:200]
 
         instructions = (
@@ -513,11 +876,11 @@ class OpenAIService:
                 "role": "user",
                 "content": [
                     {"type": "text", "text": user_text},
-                    {"type": "image_url", "image_url": {"url": data_url}},
+                    image_part,
                 ],
             },
         ]
-        return self._call_chat_json(messages, max_tokens=2500)
+        return {"messages": messages, "max_tokens": 2500, "feature": "multi_angle"}
 
     def build_physics_prompt(self, master_dna: str, angle_data: Dict[str, Any]) -> str:
         angle_name = angle_data.get("name", "Unknown Angle")
@@ -539,14 +902,22 @@ class OpenAIService:
 
     # -------------------- CAPTIONS --------------------
     def captions_generate_filelike(self, uploaded_file, style: str = "Engaging", language: str = "English") -> Dict[str, Any]:
-        data_url = self._filelike_to_data_url(uploaded_file)
+        data = self._call_chat_json(**self._build_captions_generate_filelike(uploaded_file, style, language))
+        return self._postprocess_captions(data)
+
+    def _build_captions_generate_filelike(self, uploaded_file, style: str = "Engaging", language: str = "English") -> Dict[str, Any]:
+        """Build the chat request for captions_generate_filelike"""
+        image_part = self._image_part(uploaded_file, "captions")
         instructions = "Analyze image. Write ONE Instagram caption with emojis + EXACTLY 4 hashtags. Return JSON: {caption, hashtags}."
         user_content = f"Style: {style}\nLanguage: {language}"
         messages = [
             {"role": "system", "content": instructions},
-            {"role": "user", "content": [{"type": "text", "text": user_content}, {"type": "image_url", "image_url": {"url": data_url}}]},
+            {"role": "user", "content": [{"type": "text", "text": user_content}, image_part]},
         ]
-        data = self._call_chat_json(messages, max_tokens=600)
+        return {"messages": messages, "max_tokens": 600, "feature": "captions"}
+
+    @staticmethod
+    def _postprocess_captions(data: Dict[str, Any]) -> Dict[str, Any]:
         hashtags = data.get("hashtags") or []
         if isinstance(hashtags, list): hashtags = [str(h) for h in hashtags[:4]]
         return {"caption": data.get("caption", ""), "hashtags": hashtags}
@@ -580,7 +951,20 @@ class OpenAIService:
             use_custom_makeup: If True, use custom_makeup
             custom_makeup: Makeup description to use
         """
-        data_url = self._filelike_to_data_url(uploaded_file)
+        return self._call_chat_json(**self._build_cloner_analyze_filelike(
+            uploaded_file, master_dna, use_custom_hairstyle, custom_hairstyle,
+            use_custom_attire, custom_attire, use_custom_makeup, custom_makeup
+        ))
+
+    def _build_cloner_analyze_filelike(self, uploaded_file, master_dna: str,
+                                       use_custom_hairstyle: bool = False,
+                                       custom_hairstyle: str = "",
+                                       use_custom_attire: bool = False,
+                                       custom_attire: str = "",
+                                       use_custom_makeup: bool = False,
+                                       custom_makeup: str = "") -> Dict[str, Any]:
+        """Build the chat request for cloner_analyze_filelike"""
+        image_part = self._image_part(uploaded_file, "cloner")
 
         # Build override instructions
         override_instructions = []
@@ -739,22 +1123,28 @@ class OpenAIService:
             {"role": "system", "content": instructions},
             {"role": "user", "content": [
                 {"type": "text", "text": user_text},
-                {"type": "image_url", "image_url": {"url": data_url}}
+                image_part
             ]},
         ]
 
-        return self._call_chat_json(messages, max_tokens=2500)
+        return {"messages": messages, "max_tokens": 2500, "feature": "cloner"}
 
 
     def perfectcloner_analyze_filelike(self, uploaded_file, master_dna: str, identity_lock: bool = True) -> Dict[str, Any]:
-        data_url = self._filelike_to_data_url(uploaded_file)
+        return self._call_chat_json(**self._build_perfectcloner_analyze_filelike(
+            uploaded_file, master_dna, identity_lock
+        ))
+
+    def _build_perfectcloner_analyze_filelike(self, uploaded_file, master_dna: str, identity_lock: bool = True) -> Dict[str, Any]:
+        """Build the chat request for perfectcloner_analyze_filelike"""
+        image_part = self._image_part(uploaded_file, "perfectcloner")
         instructions = "Analyze details (camera, lighting). Return JSON: recreation_prompt, negative_prompt, notes."
         user_text = f"Identity Lock: {identity_lock}\nDNA: {master_dna}\nAnalyze."
         messages = [
             {"role": "system", "content": instructions},
-            {"role": "user", "content": [{"type": "text", "text": user_text}, {"type": "image_url", "image_url": {"url": data_url}}]},
+            {"role": "user", "content": [{"type": "text", "text": user_text}, image_part]},
         ]
-        return self._call_chat_json(messages, max_tokens=1500)
+        return {"messages": messages, "max_tokens": 1500, "feature": "perfectcloner"}
 
     # -------------------- PROMPTER --------------------
     def prompter_build(self, master_dna: str, fields: Dict[str, str]) -> str:
@@ -775,27 +1165,59 @@ class OpenAIService:
 
     # -------------------- POSER --------------------
     def poser_variations_filelike(self, uploaded_file, master_dna: str, pose_style: str) -> Dict[str, Any]:
-        data_url = self._filelike_to_data_url(uploaded_file)
+        return self._call_chat_json(**self._build_poser_variations_filelike(uploaded_file, master_dna, pose_style))
+
+    def _build_poser_variations_filelike(self, uploaded_file, master_dna: str, pose_style: str) -> Dict[str, Any]:
+        """Build the chat request for poser_variations_filelike"""
+        image_part = self._image_part(uploaded_file, "poser")
         instructions = "Create 5 pose variations. Return JSON: {prompts: [{pose_name, pose_description, facial_expression}], scene_lock: string}."
         user_text = f"Style: {pose_style}\nReference DNA: {master_dna}\nAnalyze image."
         messages = [
             {"role": "system", "content": instructions},
-            {"role": "user", "content": [{"type": "text", "text": user_text}, {"type": "image_url", "image_url": {"url": data_url}}]}
+            {"role": "user", "content": [{"type": "text", "text": user_text}, image_part]}
         ]
-        return self._call_chat_json(messages)
+        return {"messages": messages, "max_tokens": 1000, "feature": "poser"}
+
+    # -------------------- BATCH API (OFFLINE) --------------------
+    def batch_request(self, method: str, *args, **kwargs) -> Dict[str, Any]:
+        """
+        Build the request a feature method would send, without sending it.
+
+        Args:
+            method: Feature method name, e.g. "drmotion_generate" or "captions_generate_filelike"
+            *args, **kwargs: The feature method's own arguments
+
+        Returns:
+            {"messages", "max_tokens", "feature"} for batch_api.build_batch_line
+        """
+        builder = getattr(self, f"_build_{method}", None)
+        if builder is None:
+            raise ValueError(f"No batch request builder for '{method}'")
+        return builder(*args, **kwargs)
+
+    def parse_json_content(self, raw: str) -> Dict[str, Any]:
+        """Parse a completion's JSON text (e.g. from a Batch API result file)"""
+        return self._parse_text(raw)
 
     # -------------------- HELPERS --------------------
-    def _filelike_to_data_url(self, uploaded_file) -> str:
+    @staticmethod
+    def _read_filelike(uploaded_file) -> bytes:
         if hasattr(uploaded_file, 'getvalue'):
-            content = uploaded_file.getvalue()
-        elif hasattr(uploaded_file, 'read'):
+            return uploaded_file.getvalue()
+        if hasattr(uploaded_file, 'read'):
             uploaded_file.seek(0)
-            content = uploaded_file.read()
-        else:
-            content = uploaded_file
+            return uploaded_file.read()
+        return uploaded_file
+
+    def _filelike_to_data_url(self, uploaded_file, feature: str = "general") -> str:
+        return self._image_part(uploaded_file, feature)["image_url"]["url"]
+
+    def _image_part(self, uploaded_file, feature: str = "general") -> Dict[str, Any]:
+        """Preprocess an upload with the feature's image profile and build the image_url content block"""
+        content = self._read_filelike(uploaded_file)
         mime = getattr(uploaded_file, "type", "image/jpeg") or "image/jpeg"
-        b64 = base64.b64encode(content).decode("utf-8")
-        return f"data:{mime};base64,{b64}"
+        data_url, detail = self.images.to_data_url(content, mime=mime, feature=feature)
+        return {"type": "image_url", "image_url": {"url": data_url, "detail": detail}}
 
     def _sanitize_json_text(self, s: str) -> str:
         if not s: return s
@@ -804,21 +1226,531 @@ class OpenAIService:
         if s.endswith("```"): s = s[:-3]
         return s.strip()
 
-    def _call_chat_json(self, messages: list, max_tokens: int = 1000) -> Dict[str, Any]:
+    def _cache_lookup(self, messages: list, max_tokens: int, feature: str):
+        """Return (cache_key, cached_result); both None when caching does not apply"""
+        if self.cache is None or not self.cache.is_enabled_for(feature):
+            return None, None
+        cache_key = request_fingerprint(self.model, messages, max_tokens)
+        return cache_key, self.cache.get(cache_key, feature)
+
+    def _parse_completion(self, resp) -> Dict[str, Any]:
+        return self._parse_text(resp.choices[0].message.content if resp.choices else None)
+
+    def _parse_text(self, raw: Optional[str]) -> Dict[str, Any]:
+        return self._parse_recovering(raw)[0]
+
+    def _parse_recovering(self, raw: Optional[str]) -> Tuple[Dict[str, Any], List[FieldPath]]:
+        """Parse a completion, salvaging truncated or malformed JSON; returns (data, damaged paths)"""
+        if not raw:
+            print("❌ OPENAI ERROR: Empty response content")
+            return {}, []
+        data, damaged = parse_tolerant(self._sanitize_json_text(raw))
+        if damaged:
+            print(f"⚠️ Recovered malformed JSON, damaged: {', '.join(format_path(p) for p in damaged)}")
+        return data, damaged
+
+    @staticmethod
+    def _parsed_outcome(data: Dict[str, Any], damaged: List[FieldPath],
+                        sizing: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """Metrics outcome and extra fields for a parsed answer"""
+        if damaged:
+            return "recovered", {**sizing, "damaged_paths": [format_path(p) for p in damaged]}
+        return ("ok" if data else "empty"), sizing
+
+    def _cache_store(self, cache_key: Optional[str], data: Dict[str, Any], resp, feature: str,
+                     model: Optional[str] = None):
+        if cache_key is None:
+            return
+        usage = getattr(resp, "usage", None)
+        # Priced at the model that actually answered (the key stays on self.model)
+        self.cache.put(cache_key, data, feature=feature, model=model or self.model, usage={
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        })
+
+    @staticmethod
+    def _report_error(e: Exception):
+        print(f"❌ OPENAI ERROR: {type(e).__name__}: {e}")
+        if hasattr(e, 'response'):
+            print(f"Response: {e.response}")
+
+    def _limiter_for(self, model: str) -> RateLimiter:
+        """Rate limiter for a model (routed models share the process-wide limiter for this key)"""
+        if model == self.model:
+            return self.rate_limiter
+        return get_shared_limiter(model, scope=self._limiter_scope)
+
+    def _retry_delay(self, e: Exception, attempt: int, policy: Optional[RetryPolicy] = None,
+                     limiter: Optional[RateLimiter] = None) -> Optional[float]:
+        """Seconds to wait before retrying after `e`, or None if the error is final"""
+        policy = policy or self.retry_policy
+        if attempt >= policy.max_retries or not policy.is_retryable(e):
+            return None
+        retry_after = policy.retry_after(e)
+        delay = policy.delay_for(attempt, retry_after)
+        if policy.status_code(e) == 429 or type(e).__name__ == "RateLimitError":
+            # Hold every thread sharing this limiter, not just the one that got the 429
+            (limiter or self.rate_limiter).pause(delay)
+        print(f"⚠️ OPENAI RETRY {attempt + 1}/{policy.max_retries} in {delay:.1f}s: "
+              f"{type(e).__name__}")
+        return delay
+
+    def _observe_rate_headers(self, model: str, headers):
+        self._limiter_for(model).observe_headers(headers)
+
+    def _settle_tokens(self, estimated: int, resp, limiter: Optional[RateLimiter] = None):
+        usage = getattr(resp, "usage", None)
+        total = getattr(usage, "total_tokens", None)
+        if total:
+            (limiter or self.rate_limiter).refund(estimated - total)
+
+    def _settling_stream(self, stream, estimated: int, limiter: RateLimiter):
+        """Pass a stream through, returning the unused estimate as soon as its usage chunk arrives"""
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                self._settle_tokens(estimated, chunk, limiter)
+            yield chunk
+
+    @staticmethod
+    def _with_timeout(kwargs: Dict[str, Any], deadline: Deadline) -> Dict[str, Any]:
+        """Request kwargs with the HTTP timeout cut to the time left before the deadline"""
+        timeout = deadline.timeout(kwargs.get("timeout"))
+        if timeout is None:
+            return kwargs
+        return {**kwargs, "timeout": timeout}
+
+    # -------------------- PIPELINE --------------------
+    # Every stage of a model call is a generator that yields its I/O as steps:
+    #   ("create", kwargs)             one chat.completions.create, returns the response
+    #   ("sleep", deadline, seconds)   a rate-limit or retry wait
+    #   ("hedge", feature, stage_fn)   stage_fn() under the hedge policy, returns (result, hedge)
+    #   ("flight", key, stage_fn)      stage_fn() once per key via single_flight, returns (result, shared)
+    # _run performs the steps with blocking calls and AsyncOpenAIService._arun awaits
+    # them, so both services share one implementation of the pipeline.
+
+    def _run(self, stage: Generator) -> Any:
+        """Drive a pipeline stage to completion, performing each step it yields"""
+        send, value = stage.send, None
+        while True:
+            try:
+                step = send(value)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                send, value = stage.send, self._perform(step)
+            except BaseException as e:
+                # Raised inside the stage, so its own handlers and scopes see it
+                send, value = stage.throw, e
+
+    def _perform(self, step: tuple) -> Any:
+        kind = step[0]
+        if kind == "create":
+            return self.transport.create(**step[1])
+        if kind == "sleep":
+            return step[1].sleep(step[2])
+        if kind == "hedge":
+            return self.hedge_policy.run(step[1], lambda: self._run(step[2]()))
+        if kind == "flight":
+            return self.single_flight.do(step[1], lambda: self._run(step[2]()))
+        raise ValueError(f"Unknown pipeline step: {kind}")
+
+    def _completion_stage(self, timer: Optional[CallTimer] = None,
+                          retry_policy: Optional[RetryPolicy] = None, **kwargs) -> Generator:
+        """
+        chat.completions.create behind the model's shared rate limiter, with backoff retries.
+
+        Rate-limit waits, retries and the HTTP timeout all stay within the
+        current deadline scope (see deadline.py).
+        """
+        deadline = current_deadline()
+        limiter = self._limiter_for(kwargs["model"])
+        estimated = estimate_request_tokens(kwargs["messages"], kwargs.get("max_tokens", 0))
+        attempt = 0
+        while True:
+            wait = limiter.reserve(estimated)
+            while wait > 0:
+                yield ("sleep", deadline, wait)
+                wait = limiter.reserve(estimated)
+            if timer is not None:
+                timer.attempts += 1
+            try:
+                resp = yield ("create", self._with_timeout(kwargs, deadline))
+            except Exception as e:
+                # A timeout that used up the deadline is reported as the deadline
+                deadline.check()
+                delay = self._retry_delay(e, attempt, retry_policy, limiter)
+                if delay is None:
+                    raise
+                yield ("sleep", deadline, delay)
+                attempt += 1
+                continue
+            except BaseException:
+                # Abandoned mid-request (e.g. a cancelled hedge loser): nothing will settle it
+                limiter.refund(estimated)
+                raise
+            if kwargs.get("stream"):
+                return self._settling_stream(resp, estimated, limiter)
+            self._settle_tokens(estimated, resp, limiter)
+            return resp
+
+    def _continuation_messages(self, messages: list, text: str) -> list:
+        return messages + [
+            {"role": "assistant", "content": text},
+            {"role": "user", "content": self.CONTINUE_PROMPT},
+        ]
+
+    def _append_continuation(self, text: str, resp, sizing: Dict[str, Any]) -> Tuple[str, bool]:
+        """Add one continuation response to the text; returns (text, still_truncated)"""
+        piece = (resp.choices[0].message.content if resp.choices else "") or ""
+        # The model sometimes re-opens a code fence; the JSON itself must continue verbatim
+        if piece.startswith("```"):
+            piece = piece.split("\n", 1)[1] if "\n" in piece else ""
+        if piece.rstrip().endswith("```"):
+            piece = piece.rstrip()[:-3]
+        sizing["continuations"] += 1
+        sizing["continuation_tokens"] = sizing.get("continuation_tokens", 0) + (
+            getattr(getattr(resp, "usage", None), "completion_tokens", 0) or 0
+        )
+        return text + piece, bool(resp.choices) and resp.choices[0].finish_reason == "length"
+
+    def _continuation_stage(self, messages: list, text: str, max_tokens: int, feature: str,
+                            sizing: Dict[str, Any], model: str) -> Generator:
+        """
+        Ask the model to carry on after a finish_reason=length answer.
+
+        Continuations are plain text (no response_format, which would force a
+        fresh JSON object) and are appended to the partial answer.
+        """
+        for _ in range(self.MAX_CONTINUATIONS):
+            cont_messages = self._continuation_messages(messages, text)
+            timer = CallTimer(feature, model, cont_messages)
+            resp = yield from self._completion_stage(timer=timer, model=model, messages=cont_messages,
+                                                     max_tokens=max_tokens)
+            self._emit_metrics(timer.record("continued", getattr(resp, "usage", None)))
+            text, truncated = self._append_continuation(text, resp, sizing)
+            if not truncated:
+                break
+        return text
+
+    def _budgeted_max_tokens(self, feature: str, max_tokens: int) -> int:
+        """max_tokens to send: the token budget's learned size unless the feature is exempt"""
+        if feature in self.FIXED_BUDGET_FEATURES:
+            return max_tokens
+        return self.token_budget.max_tokens_for(feature, max_tokens)
+
+    def _observe_length(self, feature: str, usage, sizing: Dict[str, Any]):
+        """Feed the answer's full output length (incl. continuations) to the token budget"""
+        if feature in self.FIXED_BUDGET_FEATURES:
+            return
+        tokens = (getattr(usage, "completion_tokens", 0) or 0) + sizing.get("continuation_tokens", 0)
+        self.token_budget.observe(feature, tokens, truncated=sizing["continuations"] > 0)
+
+    def _response_format(self, feature: str, model: str,
+                         fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Strict schema for the feature when enabled and accepted by the model, else json_object"""
+        if not self.structured_outputs or model in self._schema_rejected:
+            return {"type": "json_object"}
+        return response_format_for(feature, fields)
+
+    def _is_schema_rejection(self, e: Exception) -> bool:
+        """True for a 400 complaining about response_format (model without structured outputs)"""
+        message = str(e).lower()
+        return self.retry_policy.status_code(e) == 400 and ("response_format" in message or "json_schema" in message)
+
+    def _schema_completion_stage(self, timer: CallTimer, model: str, messages: list, max_tokens: int,
+                                 feature: str, **kwargs) -> Generator:
+        """_completion_stage with the feature's response_format, falling back to json_object"""
+        response_format = self._response_format(feature, model)
+        try:
+            return (yield from self._completion_stage(timer=timer, model=model, messages=messages,
+                                                      max_tokens=max_tokens, response_format=response_format,
+                                                      **kwargs))
+        except Exception as e:
+            if response_format["type"] != "json_schema" or not self._is_schema_rejection(e):
+                raise
+            print(f"⚠️ Structured outputs rejected for {model}, using json_object: {e}")
+            self._schema_rejected.add(model)
+            return (yield from self._completion_stage(timer=timer, model=model, messages=messages,
+                                                      max_tokens=max_tokens,
+                                                      response_format={"type": "json_object"}, **kwargs))
+
+    def _route_legs(self, feature: str):
+        """Routing plan for a call: (leg, create kwargs) pairs in the order to try them"""
+        for leg in self.router.plan(feature, self.model):
+            extra = {}
+            if leg["timeout"]:
+                extra["timeout"] = leg["timeout"]
+            if leg["retries"] is not None:
+                extra["retry_policy"] = RetryPolicy(max_retries=leg["retries"],
+                                                    base_delay=self.retry_policy.base_delay,
+                                                    max_delay=self.retry_policy.max_delay)
+            yield leg, extra
+
+    def _hedge_stage(self, timer: CallTimer, feature: str, stage_fn: Callable[[], Generator],
+                     stream: bool = False) -> Generator:
+        """Run a completion stage under the hedge policy (streams are never hedged)"""
+        if self.hedge_policy is None or stream:
+            return (yield from stage_fn())
+        resp, hedge = yield ("hedge", feature, stage_fn)
+        if hedge:
+            timer.tags["hedge"] = hedge
+        return resp
+
+    def _route_failed(self, feature: str, leg: Dict[str, Any], started: float, e: Exception,
+                      has_next: bool):
+        self.router.record(feature, leg, (time.perf_counter() - started) * 1000, ok=False,
+                           error=type(e).__name__)
+        if has_next:
+            print(f"⚠️ ROUTE FALLBACK {feature}: {leg['model']} failed ({type(e).__name__})")
+
+    def _json_completion_stage(self, timer: CallTimer, messages: list, max_tokens: int,
+                               feature: str, **kwargs) -> Generator:
+        """
+        Schema completion on the feature's routed model.
+
+        If the primary still fails after its retries, the fallback model (when the
+        route has one) is tried; rate limits are not a reason to switch. Each
+        attempt is logged with the router, and the metrics record carries the
+        model and route that produced the answer.
+        """
+        legs = list(self._route_legs(feature))
+        for i, (leg, extra) in enumerate(legs):
+            timer.model = leg["model"]
+            timer.tags.update({"route": leg["role"], "route_reason": leg["reason"]})
+            started = time.perf_counter()
+            try:
+                resp = yield from self._hedge_stage(timer, feature, lambda: self._schema_completion_stage(
+                    timer, leg["model"], messages, max_tokens, feature, **extra, **kwargs
+                ), stream=kwargs.get("stream", False))
+            except Exception as e:
+                # Deadline, cancel and rate limits end the call on this leg; only real failures
+                # count against the route's health
+                final = (isinstance(e, (DeadlineExceeded, Cancelled)) or self.retry_policy.is_rate_limited(e)
+                         or i + 1 >= len(legs))
+                if not self.retry_policy.is_rate_limited(e):
+                    self._route_failed(feature, leg, started, e, has_next=not final)
+                if final:
+                    raise
+                continue
+            self.router.record(feature, leg, (time.perf_counter() - started) * 1000, ok=True)
+            return resp
+
+    def _repair_request(self, data: Dict[str, Any], raw: str, messages: list, max_tokens: int,
+                        feature: str, model: str,
+                        damaged: Optional[List[FieldPath]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Build a follow-up request for fields that are missing or empty in `data`.
+
+        The original conversation is resent (its prefix is provider-cached) with the
+        model's answer and a request for only the broken fields, so the output is a
+        fraction of a full regeneration. Fields whose JSON was cut off or malformed
+        (`damaged` paths from json_repair) are requested again too. Returns None when
+        nothing needs repair.
+        """
+        schema = get_schema(feature)
+        if schema is None or not data:
+            return None
+        missing = find_invalid_fields(data, schema)
+        for key in damaged_fields(damaged or []):
+            if key in schema["properties"] and key not in missing:
+                missing.append(key)
+        if not missing:
+            return None
+        repair_messages = messages + [
+            {"role": "assistant", "content": raw or ""},
+            {"role": "user", "content": (
+                f"Your JSON is missing, cut off or has empty values for: {', '.join(missing)}. "
+                "Return a JSON object with ONLY these fields, written to the same standard as the rest."
+            )},
+        ]
+        return {
+            "missing": missing,
+            "model": model,
+            "messages": repair_messages,
+            "max_tokens": max_tokens,
+            "response_format": self._response_format(feature, model, missing),
+        }
+
+    def _merge_repair(self, data: Dict[str, Any], feature: str, missing: List[str], patch: Dict[str, Any],
+                      on_field: Optional[FieldCallback] = None) -> List[str]:
+        """Copy valid repaired fields into data; returns the fields still broken"""
+        candidate = {key: patch[key] for key in missing if key in patch}
+        broken = find_invalid_fields(candidate, get_schema(feature), fields=list(candidate))
+        fixed = {key: value for key, value in candidate.items() if key not in broken}
+        data.update(fixed)
+        if on_field:
+            replay_fields(fixed, on_field)
+        return [key for key in missing if key not in fixed]
+
+    def _repair_stage(self, data: Dict[str, Any], feature: str, repair: Dict[str, Any],
+                      on_field: Optional[FieldCallback] = None) -> Generator:
+        """Run the repair call and merge its fields; the original data is kept on failure"""
+        timer = CallTimer(feature, repair["model"], repair["messages"])
+        resp = None
+        try:
+            resp = yield from self._completion_stage(timer=timer, model=repair["model"],
+                                                     messages=repair["messages"],
+                                                     max_tokens=repair["max_tokens"],
+                                                     response_format=repair["response_format"])
+            patch = self._parse_completion(resp)
+        except Exception as e:
+            self._report_error(e)
+            self._emit_metrics(timer.record(self._outcome_for(e), getattr(resp, "usage", None),
+                                            extra={"repair_fields": repair["missing"]}))
+            return data
+        still_missing = self._merge_repair(data, feature, repair["missing"], patch, on_field)
+        self._emit_metrics(timer.record("repaired" if not still_missing else "repair_partial",
+                                        getattr(resp, "usage", None),
+                                        extra={"repair_fields": repair["missing"]}))
+        return data
+
+    def _emit_metrics(self, record: Dict[str, Any]):
+        if self.metrics_sink is None:
+            return
+        try:
+            self.metrics_sink(record)
+        except Exception as e:
+            print(f"Error recording call metrics: {e}")
+
+    @staticmethod
+    def _outcome_for(e: Exception) -> str:
+        if isinstance(e, Cancelled):
+            return "cancelled"
+        if isinstance(e, DeadlineExceeded) or type(e).__name__ == "APITimeoutError":
+            return "timeout"
+        return "parse_error" if isinstance(e, json.JSONDecodeError) else "error"
+
+    def _failed(self, e: Exception) -> FailedCall:
+        """Empty result for a failed call, tagged with why it failed"""
+        return FailedCall(self._outcome_for(e), f"{type(e).__name__}: {e}")
+
+    def _call_chat_json(self, messages: list, max_tokens: int = 1000,
+                        feature: str = "general") -> Dict[str, Any]:
+        return self._run(self._chat_json_stage(messages, max_tokens, feature))
+
+    def _chat_json_stage(self, messages: list, max_tokens: int, feature: str) -> Generator:
+        timer = CallTimer(feature, self.model, messages)
+        cache_key, cached = self._cache_lookup(messages, max_tokens, feature)
+        if cached is not None:
+            self._emit_metrics(timer.record("cache_hit"))
+            return cached
+
+        try:
+            with deadline_scope(self.call_timeout):
+                data, shared = yield (
+                    "flight", self._flight_key(cache_key, messages, max_tokens),
+                    lambda: self._fetch_chat_json_stage(timer, messages, max_tokens, feature, cache_key),
+                )
+        except (Cancelled, DeadlineExceeded) as e:
+            # Stopped while waiting on another caller's identical request
+            self._emit_metrics(timer.record(self._outcome_for(e)))
+            return self._failed(e)
+        if shared:
+            self._emit_metrics(timer.record("coalesced"))
+        return data
+
+    def _flight_key(self, cache_key: Optional[str], messages: list, max_tokens: int) -> str:
+        """Single-flight key: the cache fingerprint, computed here if caching is off"""
+        return cache_key or request_fingerprint(self.model, messages, max_tokens)
+
+    def _fetch_chat_json_stage(self, timer: CallTimer, messages: list, max_tokens: int,
+                               feature: str, cache_key: Optional[str]) -> Generator:
+        sized = self._budgeted_max_tokens(feature, max_tokens)
+        sizing = {"max_tokens": sized, "continuations": 0}
+        resp = None
         try:
-            resp = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                max_tokens=max_tokens,
-                response_format={"type": "json_object"},
-            )
+            resp = yield from self._json_completion_stage(timer, messages, sized, feature)
             raw = resp.choices[0].message.content if resp.choices else None
-            if not raw:
+            if resp.choices and resp.choices[0].finish_reason == "length":
+                raw = yield from self._continuation_stage(messages, raw or "", sized, feature, sizing,
+                                                          timer.model)
+            data, damaged = self._parse_recovering(raw)
+        except Exception as e:
+            self._report_error(e)
+            self._emit_metrics(timer.record(self._outcome_for(e), getattr(resp, "usage", None), extra=sizing))
+            return self._failed(e)
+
+        self._observe_length(feature, getattr(resp, "usage", None), sizing)
+        outcome, extra = self._parsed_outcome(data, damaged, sizing)
+        self._emit_metrics(timer.record(outcome, getattr(resp, "usage", None), extra=extra))
+        repair = self._repair_request(data, raw, messages, max_tokens, feature, timer.model, damaged)
+        if repair is not None:
+            data = yield from self._repair_stage(data, feature, repair)
+        if not damaged:
+            # A salvaged answer may still hold cut-off text; never serve it from cache
+            self._cache_store(cache_key, data, resp, feature, timer.model)
+        return data
+
+    def _stream_chat_json(self, messages: list, max_tokens: int = 1000, feature: str = "general",
+                          on_field: Optional[FieldCallback] = None) -> Dict[str, Any]:
+        """Streaming variant of _call_chat_json that reports fields as they complete"""
+        if self.hedge_policy is not None and self.hedge_policy.would_hedge(feature):
+            # A stream cannot be raced; when a hedge credit is available, hedge the plain call
+            # and report its fields when it lands
+            data = self._call_chat_json(messages, max_tokens, feature)
+            replay_fields(data, on_field)
+            return data
+        timer = CallTimer(feature, self.model, messages)
+        cache_key, cached = self._cache_lookup(messages, max_tokens, feature)
+        if cached is not None:
+            replay_fields(cached, on_field)
+            self._emit_metrics(timer.record("cache_hit"))
+            return cached
+
+        try:
+            with deadline_scope(self.call_timeout):
+                data, shared = self.single_flight.do(
+                    self._flight_key(cache_key, messages, max_tokens),
+                    lambda: self._fetch_stream_json(timer, messages, max_tokens, feature, cache_key, on_field),
+                )
+        except (Cancelled, DeadlineExceeded) as e:
+            self._emit_metrics(timer.record(self._outcome_for(e)))
+            return self._failed(e)
+        if shared:
+            # Another caller made the request; give this one the same field events
+            replay_fields(data, on_field)
+            self._emit_metrics(timer.record("coalesced"))
+        return data
+
+    def _fetch_stream_json(self, timer: CallTimer, messages: list, max_tokens: int, feature: str,
+                           cache_key: Optional[str], on_field: FieldCallback) -> Dict[str, Any]:
+        sized = self._budgeted_max_tokens(feature, max_tokens)
+        sizing = {"max_tokens": sized, "continuations": 0}
+        parser = IncrementalJSONParser(on_field)
+        last_chunk = None
+        finish_reason = None
+        try:
+            stream = self._run(self._json_completion_stage(
+                timer, messages, sized, feature,
+                stream=True, stream_options={"include_usage": True},
+            ))
+            for chunk in stream:
+                last_chunk = chunk
+                if chunk.choices and chunk.choices[0].delta.content:
+                    timer.mark_first_byte()
+                    parser.feed(chunk.choices[0].delta.content)
+                if chunk.choices and chunk.choices[0].finish_reason:
+                    finish_reason = chunk.choices[0].finish_reason
+            if finish_reason == "length" and parser.text:
+                full = self._run(self._continuation_stage(messages, parser.text, sized, feature, sizing,
+                                                          timer.model))
+                parser.feed(full[len(parser.text):])
+            if not parser.text:
                 print("❌ OPENAI ERROR: Empty response content")
+                self._emit_metrics(timer.record("empty", getattr(last_chunk, "usage", None), extra=sizing))
                 return {}
-            return json.loads(self._sanitize_json_text(raw))
+            data, damaged = self._parse_recovering(parser.text)
         except Exception as e:
-            print(f"❌ OPENAI ERROR: {type(e).__name__}: {e}")
-            if hasattr(e, 'response'):
-                print(f"Response: {e.response}")
-            return {}
+            self._report_error(e)
+            self._emit_metrics(timer.record(self._outcome_for(e), getattr(last_chunk, "usage", None), extra=sizing))
+            return self._failed(e)
+
+        self._observe_length(feature, getattr(last_chunk, "usage", None), sizing)
+        outcome, extra = self._parsed_outcome(data, damaged, sizing)
+        self._emit_metrics(timer.record(outcome, getattr(last_chunk, "usage", None), extra=extra))
+        repair = self._repair_request(data, parser.text, messages, max_tokens, feature, timer.model, damaged)
+        if repair is not None:
+            data = self._run(self._repair_stage(data, feature, repair, on_field))
+        if not damaged:
+            self._cache_store(cache_key, data, last_chunk, feature, timer.model)
+        return data
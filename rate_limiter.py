@@ -0,0 +1,285 @@
+"""
+Rate Limiter
+============
+Client-side request/token budgeting and retry scheduling shared by every
+OpenAI call in the process, so concurrent batch threads coordinate instead
+of stampeding the API.
+"""
+
+import email.utils
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Rough vision cost of one image when its size is unknown (one 768x768 high-detail image)
+DEFAULT_IMAGE_TOKENS = 765
+LOW_DETAIL_IMAGE_TOKENS = 85
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+# Tier-1 gpt-4o limits, used until OPENAI_RPM / OPENAI_TPM, configure_limits()
+# or the API's x-ratelimit-limit-* headers say otherwise
+DEFAULT_RPM = 500
+DEFAULT_TPM = 30000
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at capacity per minute (RateLimiter holds the lock)"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (0 if it is available now)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def resize(self, per_minute: float):
+        """Change the limit; added capacity is available at once, removed capacity is taken away"""
+        per_minute = float(per_minute)
+        self._refill(time.monotonic())
+        self.tokens = min(per_minute, self.tokens + max(0.0, per_minute - self.capacity))
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute budget with a shared cooldown"""
+
+    def __init__(self, rpm: int = DEFAULT_RPM, tpm: int = DEFAULT_TPM):
+        """
+        Initialize rate limiter.
+
+        Args:
+            rpm: Requests per minute allowed for this model
+            tpm: Tokens per minute allowed (prompt estimate + max_tokens, as the API counts them)
+        """
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+
+    def reserve(self, tokens: int) -> float:
+        """
+        Try to take one request and `tokens` tokens from the budget.
+
+        Returns:
+            0 if the reservation was made, otherwise the seconds to wait before retrying
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+            if wait > 0:
+                return wait
+            self.requests.consume(1)
+            self.tokens.consume(tokens)
+            return 0.0
+
+    def acquire(self, tokens: int):
+        """Block the calling thread until the reservation succeeds"""
+        while True:
+            wait = self.reserve(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def refund(self, tokens: int):
+        """Return over-estimated tokens once the actual usage is known"""
+        if tokens > 0:
+            with self._lock:
+                self.tokens.refund(tokens)
+
+    def pause(self, seconds: float):
+        """Stop every caller for `seconds` (used when the API answers 429)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    @property
+    def limits(self) -> Dict[str, int]:
+        return {"rpm": int(self.requests.capacity), "tpm": int(self.tokens.capacity)}
+
+    def set_limits(self, rpm: Optional[int] = None, tpm: Optional[int] = None):
+        """Change the per-minute limits of this limiter"""
+        with self._lock:
+            if rpm and rpm != self.requests.capacity:
+                self.requests.resize(rpm)
+            if tpm and tpm != self.tokens.capacity:
+                self.tokens.resize(tpm)
+
+    def observe_headers(self, headers):
+        """Adopt the account's real limits from a response's x-ratelimit-limit-* headers"""
+        if not headers:
+            return
+        self.set_limits(rpm=_header_int(headers, "x-ratelimit-limit-requests"),
+                        tpm=_header_int(headers, "x-ratelimit-limit-tokens"))
+
+
+def _header_int(headers, name: str) -> Optional[int]:
+    try:
+        value = int(headers.get(name) or 0)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter that honours Retry-After"""
+
+    def __init__(self, max_retries: int = 4, base_delay: float = 1.0, max_delay: float = 30.0):
+        """
+        Args:
+            max_retries: Retries after the first attempt
+            base_delay: Backoff for the first retry in seconds (doubles each attempt)
+            max_delay: Cap for any single wait
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @staticmethod
+    def status_code(exc: Exception) -> Optional[int]:
+        status = getattr(exc, "status_code", None)
+        if status is None and getattr(exc, "response", None) is not None:
+            status = getattr(exc.response, "status_code", None)
+        return status
+
+    def is_retryable(self, exc: Exception) -> bool:
+        """Rate limits, timeouts, connection errors and 5xx are retried; other errors are not"""
+        name = type(exc).__name__
+        if name in ("APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError"):
+            return True
+        return self.status_code(exc) in RETRYABLE_STATUS_CODES
+
+    def is_rate_limited(self, exc: Exception) -> bool:
+        """A 429 or any error the server attached a Retry-After to"""
+        return (type(exc).__name__ == "RateLimitError" or self.status_code(exc) == 429
+                or self.retry_after(exc) is not None)
+
+    @staticmethod
+    def retry_after(exc: Exception) -> Optional[float]:
+        """Seconds requested by the server via retry-after-ms / Retry-After, if any"""
+        response = getattr(exc, "response", None)
+        headers = getattr(response, "headers", None)
+        if not headers:
+            return None
+        value = headers.get("retry-after-ms")
+        if value:
+            try:
+                return float(value) / 1000.0
+            except ValueError:
+                pass
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            parsed = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, parsed.timestamp() - time.time())
+
+    def delay_for(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Wait before retry number `attempt` (0-based)"""
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            return min(self.max_delay, max(retry_after, backoff))
+        return backoff
+
+
+def estimate_request_tokens(messages: List[Dict[str, Any]], max_tokens: int = 0) -> int:
+    """
+    Estimate the tokens a request will be charged against TPM.
+
+    Text is counted at ~4 characters per token, images by their detail level,
+    plus the reserved max_tokens.
+    """
+    chars = 0
+    image_tokens = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            chars += len(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                chars += len(part.get("text", ""))
+            elif part.get("type") == "image_url":
+                detail = (part.get("image_url") or {}).get("detail", "auto")
+                image_tokens += LOW_DETAIL_IMAGE_TOKENS if detail == "low" else DEFAULT_IMAGE_TOKENS
+    return chars // 4 + image_tokens + (max_tokens or 0)
+
+
+_shared_limiters: Dict[Tuple[str, str], RateLimiter] = {}
+_shared_lock = threading.Lock()
+_configured_limits: Dict[str, int] = {}
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "") or default)
+    except ValueError:
+        print(f"⚠️ Ignoring {name}={os.getenv(name)!r}: not an integer")
+        return default
+
+
+def default_limits() -> Dict[str, int]:
+    """Limits for new shared limiters: configure_limits(), else OPENAI_RPM / OPENAI_TPM, else tier 1"""
+    with _shared_lock:
+        configured = dict(_configured_limits)
+    return {
+        "rpm": configured.get("rpm") or _env_int("OPENAI_RPM", DEFAULT_RPM),
+        "tpm": configured.get("tpm") or _env_int("OPENAI_TPM", DEFAULT_TPM),
+    }
+
+
+def configure_limits(rpm: Optional[int] = None, tpm: Optional[int] = None):
+    """Set the account's limits for every shared limiter, existing and future"""
+    with _shared_lock:
+        if rpm:
+            _configured_limits["rpm"] = rpm
+        if tpm:
+            _configured_limits["tpm"] = tpm
+        limiters = list(_shared_limiters.values())
+    for limiter in limiters:
+        limiter.set_limits(rpm=rpm, tpm=tpm)
+
+
+def get_shared_limiter(model: str, scope: str = "default", rpm: Optional[int] = None,
+                       tpm: Optional[int] = None) -> RateLimiter:
+    """
+    Return the process-wide limiter for a model.
+
+    The first caller's rpm/tpm win (default_limits() when not given); later
+    callers share that limiter. `scope` separates budgets of different API
+    keys/organizations. Responses' rate-limit headers correct the limits.
+    """
+    key = (scope, model)
+    if rpm is None or tpm is None:
+        defaults = default_limits()
+        rpm = rpm or defaults["rpm"]
+        tpm = tpm or defaults["tpm"]
+    with _shared_lock:
+        if key not in _shared_limiters:
+            _shared_limiters[key] = RateLimiter(rpm=rpm, tpm=tpm)
+        return _shared_limiters[key]
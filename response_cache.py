@@ -0,0 +1,227 @@
+"""
+Response Cache
+==============
+Content-addressed, disk-backed cache for OpenAI chat completions.
+Identical image + Master DNA + options are answered from disk instead of the API.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from model_pricing import estimate_cost
+
+
+def _hash_data_url(url: str) -> str:
+    """Replace a base64 data URL with a hash of the decoded image bytes"""
+    header, _, payload = url.partition(",")
+    try:
+        raw = base64.b64decode(payload)
+    except Exception:
+        raw = payload.encode("utf-8")
+    return f"{header.split(';')[0]};sha256:{hashlib.sha256(raw).hexdigest()}"
+
+
+def normalize_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Return a copy of a chat `messages` payload that is cheap to hash.
+
+    Image data URLs are replaced by the SHA-256 of their decoded bytes so the
+    key does not depend on the (huge) base64 string itself.
+    """
+    normalized = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            parts = []
+            for part in content:
+                if part.get("type") == "image_url":
+                    image_url = dict(part.get("image_url") or {})
+                    url = image_url.get("url", "")
+                    if url.startswith("data:"):
+                        image_url["url"] = _hash_data_url(url)
+                    parts.append({"type": "image_url", "image_url": image_url})
+                else:
+                    parts.append(part)
+            content = parts
+        normalized.append({"role": message.get("role"), "content": content})
+    return normalized
+
+
+def request_fingerprint(model: str, messages: List[Dict[str, Any]], max_tokens: int,
+                        extra: Optional[Dict[str, Any]] = None) -> str:
+    """Build a stable content-addressed key for a chat completion request"""
+    payload = {
+        "model": model,
+        "messages": normalize_messages(messages),
+        "max_tokens": max_tokens,
+        "extra": extra or {},
+    }
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Size-bounded LRU cache of parsed JSON responses stored on disk"""
+
+    def __init__(self, cache_dir: str = ".response_cache",
+                 max_bytes: int = 50 * 1024 * 1024,
+                 ttl_seconds: Optional[float] = 7 * 24 * 3600,
+                 disabled_features: Optional[Iterable[str]] = None):
+        """
+        Initialize response cache.
+
+        Args:
+            cache_dir: Directory holding one JSON file per cached response
+            max_bytes: Total size budget; least recently used entries are evicted beyond it
+            ttl_seconds: Entries older than this are treated as misses (None = never expire)
+            disabled_features: Feature names that must always hit the API
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.disabled_features = set(disabled_features or [])
+        self._lock = threading.Lock()
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "saved_prompt_tokens": 0,
+            "saved_completion_tokens": 0,
+            "saved_cost_usd": 0.0,
+        }
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuild the LRU index from files on disk, oldest access first"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, name[:-5], st.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def is_enabled_for(self, feature: str) -> bool:
+        """Check whether responses for a feature may be cached"""
+        return feature not in self.disabled_features
+
+    def get(self, key: str, feature: str = "") -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached response.
+
+        Returns:
+            The cached result dict, or None on miss/expiry/opt-out
+        """
+        if not self.is_enabled_for(feature):
+            return None
+        with self._lock:
+            if key not in self._index:
+                self._stats["misses"] += 1
+                return None
+            path = self._path(key)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self._drop(key)
+                self._stats["misses"] += 1
+                return None
+
+            if self.ttl_seconds is not None and time.time() - entry.get("created_at", 0) > self.ttl_seconds:
+                self._drop(key)
+                self._stats["misses"] += 1
+                return None
+
+            self._index.move_to_end(key)
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+
+            usage = entry.get("usage") or {}
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+            self._stats["hits"] += 1
+            self._stats["saved_prompt_tokens"] += prompt_tokens
+            self._stats["saved_completion_tokens"] += completion_tokens
+            self._stats["saved_cost_usd"] += estimate_cost(
+                entry.get("model", ""), prompt_tokens, completion_tokens
+            )
+            return entry.get("result")
+
+    def put(self, key: str, result: Dict[str, Any], feature: str = "", model: str = "",
+            usage: Optional[Dict[str, int]] = None):
+        """Store a successful response and evict least recently used entries if over budget"""
+        if not self.is_enabled_for(feature) or not result:
+            return
+        entry = {
+            "created_at": time.time(),
+            "feature": feature,
+            "model": model,
+            "usage": usage or {},
+            "result": result,
+        }
+        blob = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            path = self._path(key)
+            tmp_path = f"{path}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(blob)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Error writing response cache: {e}")
+                return
+            if key in self._index:
+                self._total_bytes -= self._index.pop(key)
+            self._index[key] = len(blob)
+            self._total_bytes += len(blob)
+            while self._total_bytes > self.max_bytes and self._index:
+                oldest = next(iter(self._index))
+                self._drop(oldest)
+
+    def _drop(self, key: str):
+        """Remove an entry from disk and the index (caller holds the lock)"""
+        size = self._index.pop(key, 0)
+        self._total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        """Delete every cached response"""
+        with self._lock:
+            for key in list(self._index):
+                self._drop(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate and estimated spend saved since this process started"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "saved_cost_usd": round(self._stats["saved_cost_usd"], 4),
+                "hit_rate": round(self._stats["hits"] / lookups * 100, 1) if lookups else 0,
+                "entries": len(self._index),
+                "size_bytes": self._total_bytes,
+            }
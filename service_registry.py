@@ -0,0 +1,138 @@
+"""
+Service Registry
+================
+Process-wide OpenAIService instances keyed by (api_key, model), so Streamlit
+reruns and concurrent sessions reuse one long-lived HTTP connection pool
+instead of paying TLS/connection setup on every widget interaction.
+"""
+
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+from openai import DefaultHttpxClient
+
+from hedging import get_hedge_policy
+from image_preprocessor import EncodedImageMemo
+from openai_service import OpenAIService
+from rate_limiter import configure_limits
+from response_cache import ResponseCache
+
+# Connection pool defaults; tune with configure_pool() before the first service is created
+POOL_SETTINGS = {
+    "max_connections": 32,
+    "max_keepalive_connections": 16,
+    "keepalive_expiry": 120.0,
+}
+
+_lock = threading.RLock()
+_http_clients: Dict[str, httpx.Client] = {}
+_services: Dict[Tuple[str, str], OpenAIService] = {}
+_shared: Dict[str, Any] = {}
+
+
+def _key_id(api_key: str) -> str:
+    """Registry key for an API key (the raw key is never used as a dict key)"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def configure_pool(max_connections: Optional[int] = None,
+                   max_keepalive_connections: Optional[int] = None,
+                   keepalive_expiry: Optional[float] = None):
+    """Override pool limits for HTTP clients created after this call"""
+    with _lock:
+        if max_connections is not None:
+            POOL_SETTINGS["max_connections"] = max_connections
+        if max_keepalive_connections is not None:
+            POOL_SETTINGS["max_keepalive_connections"] = max_keepalive_connections
+        if keepalive_expiry is not None:
+            POOL_SETTINGS["keepalive_expiry"] = keepalive_expiry
+
+
+def configure_rate_limits(rpm: Optional[int] = None, tpm: Optional[int] = None):
+    """
+    Set the account's requests/tokens per minute for every service's shared limiter.
+
+    Without this the limits come from OPENAI_RPM / OPENAI_TPM (or tier-1 defaults)
+    and are corrected by the API's x-ratelimit-limit-* response headers.
+    """
+    configure_limits(rpm=rpm, tpm=tpm)
+
+
+def get_http_client(api_key: str) -> httpx.Client:
+    """Shared keep-alive HTTP client for an API key (all models reuse its pool)"""
+    key_id = _key_id(api_key)
+    with _lock:
+        client = _http_clients.get(key_id)
+        if client is None or client.is_closed:
+            client = DefaultHttpxClient(limits=httpx.Limits(**POOL_SETTINGS))
+            _http_clients[key_id] = client
+        return client
+
+
+def get_shared_cache() -> ResponseCache:
+    """Process-wide response cache"""
+    with _lock:
+        if "cache" not in _shared:
+            _shared["cache"] = ResponseCache()
+        return _shared["cache"]
+
+
+def get_shared_image_memo() -> EncodedImageMemo:
+    """Process-wide encoded-image memo"""
+    with _lock:
+        if "image_memo" not in _shared:
+            _shared["image_memo"] = EncodedImageMemo()
+        return _shared["image_memo"]
+
+
+def get_openai_service(api_key: str, model: str = "gpt-4o",
+                       metrics_sink: Optional[Callable[[Dict[str, Any]], None]] = None,
+                       history: Optional[Callable[[], Iterable[Dict[str, Any]]]] = None) -> OpenAIService:
+    """
+    Return the long-lived OpenAIService for (api_key, model).
+
+    The first call builds it with the shared HTTP client, response cache and
+    image memo; later calls from any session or thread get the same object.
+
+    Args:
+        api_key: OpenAI API key
+        model: Chat model
+        metrics_sink: Receives one record per model call; wired when the service is built
+        history: Returns past call records; called once per process to seed the
+                 token budget and hedge policy
+    """
+    key = (_key_id(api_key), model)
+    with _lock:
+        service = _services.get(key)
+        if service is None:
+            service = OpenAIService(
+                api_key=api_key,
+                model=model,
+                cache=get_shared_cache(),
+                image_memo=get_shared_image_memo(),
+                http_client=get_http_client(api_key),
+                hedge_policy=get_hedge_policy(),
+                metrics_sink=metrics_sink,
+            )
+            _services[key] = service
+        if history is not None and not _shared.get("seeded"):
+            _shared["seeded"] = True
+            _seed_from_history(service, list(history()))
+        return service
+
+
+def _seed_from_history(service: OpenAIService, records: List[Dict[str, Any]]):
+    """Learn output lengths and latencies from calls recorded by earlier processes"""
+    service.token_budget.seed(records)
+    get_hedge_policy().seed(records)
+
+
+def close_all():
+    """Close every pooled HTTP client and forget all services"""
+    with _lock:
+        for client in _http_clients.values():
+            client.close()
+        _http_clients.clear()
+        _services.clear()
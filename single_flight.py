@@ -0,0 +1,169 @@
+"""
+Single Flight
+=============
+Request coalescing: concurrent identical generations (same model, image,
+DNA and options) share one in-flight API call and every caller receives
+the result.
+
+A leader that was cancelled or ran out of time fails only itself: its
+waiters, each still bound by their own deadline and cancellation token,
+run the call again instead of inheriting that outcome.
+"""
+
+import asyncio
+import copy
+import threading
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from deadline import Cancelled, DeadlineExceeded, current_deadline
+
+# How often a waiter re-checks its own deadline and token
+WAIT_POLL_SECONDS = 0.1
+PERSONAL_OUTCOMES = ("cancelled", "timeout")
+
+
+def _is_personal(result: Any = None, error: BaseException = None) -> bool:
+    """An outcome that belongs to the caller who got it (its cancel or deadline), not to the request"""
+    if error is not None:
+        return isinstance(error, (Cancelled, DeadlineExceeded, asyncio.CancelledError))
+    return getattr(result, "outcome", None) in PERSONAL_OUTCOMES
+
+
+class _Flight:
+    """One in-flight call shared by its leader and waiting threads"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls by key.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running wait for it and get a deep copy of its result,
+    so later mutation by one caller never leaks into another's dict.
+    Threads and asyncio tasks are tracked separately.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self._async_flights: Dict[Tuple[int, str], asyncio.Future] = {}
+        self.stats = {"leaders": 0, "coalesced": 0}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn() once for all concurrent callers with the same key.
+
+        Returns:
+            (result, shared) where shared is True if this caller waited on another's call
+
+        Raises:
+            Cancelled / DeadlineExceeded: this caller's own scope ended while waiting
+        """
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                if flight is not None:
+                    self.stats["coalesced"] += 1
+                    leader = False
+                else:
+                    flight = _Flight()
+                    self._flights[key] = flight
+                    self.stats["leaders"] += 1
+                    leader = True
+            if leader:
+                break
+
+            deadline = current_deadline()
+            while not flight.done.wait(WAIT_POLL_SECONDS):
+                deadline.check()
+            if _is_personal(flight.result, flight.error):
+                continue  # the leader's cancel or timeout is not ours: run it again
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result), True
+
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+        return flight.result, False
+
+    async def ado(self, key: str, coro_fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Async version of do(); coalesces tasks on the same event loop"""
+        loop = asyncio.get_running_loop()
+        loop_key = (id(loop), key)
+        while True:
+            with self._lock:
+                existing = self._async_flights.get(loop_key)
+                if existing is not None:
+                    self.stats["coalesced"] += 1
+                else:
+                    future = loop.create_future()
+                    self._async_flights[loop_key] = future
+                    self.stats["leaders"] += 1
+            if existing is None:
+                break
+
+            deadline = current_deadline()
+            # shield: a cancelled waiter must not cancel the leader's call
+            shielded = asyncio.shield(existing)
+            try:
+                while not existing.done():
+                    await asyncio.wait({shielded}, timeout=WAIT_POLL_SECONDS)
+                    if not existing.done():
+                        deadline.check()
+            finally:
+                shielded.cancel()
+            if existing.cancelled():
+                continue
+            error = existing.exception()
+            if _is_personal(None if error else existing.result(), error):
+                continue
+            if error is not None:
+                raise error
+            return copy.deepcopy(existing.result()), True
+
+        try:
+            result = await coro_fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._async_flights.pop(loop_key, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Leader/coalesced counters and the share of calls that were coalesced"""
+        with self._lock:
+            total = self.stats["leaders"] + self.stats["coalesced"]
+            return {
+                **self.stats,
+                "in_flight": len(self._flights) + len(self._async_flights),
+                "coalesced_rate": round(self.stats["coalesced"] / total * 100, 1) if total else 0,
+            }
+
+
+_shared_flight = SingleFlight()
+
+
+def get_single_flight() -> SingleFlight:
+    """Process-wide coalescing layer shared by every OpenAIService"""
+    return _shared_flight
@@ -0,0 +1,70 @@
+from batch_journal import BatchJournal, job_key
+from batch_processor import BatchProcessor
+from deadline import FailedCall
+
+
+def _jobs():
+    processor = BatchProcessor(max_workers=2)
+    return processor, processor.create_batch_job(
+        {"motion": "walk", "master_dna": "dna", "image": b"image-bytes"},
+        [{"emotion": "Joy"}, {"emotion": "Anger"}, {"emotion": "Fear"}],
+    )
+
+
+def test_job_key_ignores_batch_position():
+    _, jobs = _jobs()
+    moved = dict(jobs[0], batch_id=99)
+    assert job_key(moved) == job_key(jobs[0])
+    assert job_key(jobs[0]) != job_key(jobs[1])
+
+
+def test_resume_runs_only_unfinished_jobs(tmp_path):
+    processor, jobs = _jobs()
+    journal = BatchJournal.for_jobs(jobs, root=str(tmp_path))
+
+    def interrupted(job):
+        if job["emotion"] == "Fear":
+            return FailedCall("timeout")
+        return {"final_video_prompt": job["emotion"]}
+
+    first = processor.process_batch(jobs, interrupted, journal=journal)
+    assert sorted(r["success"] for r in first) == [False, True, True]
+
+    # A fresh process finds the journal by the batch's content
+    resumed_journal = BatchJournal.for_jobs(jobs, root=str(tmp_path))
+    resumed, pending = processor.split_resumed(jobs, resumed_journal)
+    assert [job["emotion"] for job in pending] == ["Fear"]
+    assert {r["final_video_prompt"] for r in resumed} == {"Joy", "Anger"}
+    assert all(r["resumed"] and r["success"] for r in resumed)
+
+    ran = []
+
+    def finish(job):
+        ran.append(job["emotion"])
+        return {"final_video_prompt": job["emotion"]}
+
+    second = processor.process_batch(jobs, finish, journal=resumed_journal)
+    assert ran == ["Fear"]
+    assert sorted(r["batch_id"] for r in second) == [1, 2, 3]
+    assert all(r["success"] for r in second)
+
+
+def test_finished_journal_starts_over(tmp_path):
+    processor, jobs = _jobs()
+    journal = BatchJournal.for_jobs(jobs, root=str(tmp_path))
+    processor.process_batch(jobs, lambda job: {"final_video_prompt": "x"}, journal=journal)
+
+    again = BatchJournal.for_jobs(jobs, root=str(tmp_path))
+    assert again.completed() == {}
+    assert processor.split_resumed(jobs, again) == ([], jobs)
+
+
+def test_half_written_last_line_is_ignored(tmp_path):
+    _, jobs = _jobs()
+    journal = BatchJournal.for_jobs(jobs, root=str(tmp_path))
+    journal.record(jobs[0], {"final_video_prompt": "Joy"})
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"job_key": "abc", "resu')
+
+    reloaded = BatchJournal(journal.path)
+    assert reloaded.completed() == {job_key(jobs[0]): {"final_video_prompt": "Joy"}}
@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+from json_repair import damaged_fields, format_path, parse_tolerant
+
+
+def test_valid_json_takes_the_fast_path():
+    assert parse_tolerant('{"a": [1, 2], "b": "x"}') == ({"a": [1, 2], "b": "x"}, [])
+
+
+def test_truncated_string_keeps_the_prefix_and_reports_the_field():
+    value, damaged = parse_tolerant('{"character_analysis": "tall", "final_video_prompt": "A woman wal')
+    assert value == {"character_analysis": "tall", "final_video_prompt": "A woman wal"}
+    assert damaged == [("final_video_prompt",)]
+
+
+def test_truncated_after_a_key_drops_only_that_field():
+    value, damaged = parse_tolerant('{"a": 1, "b":')
+    assert value == {"a": 1}
+    assert damaged == [("b",)]
+
+
+def test_truncated_inside_a_nested_array():
+    text = '{"shots": [{"n": 1, "acting": "smile"}, {"n": 2, "acting": "fro'
+    value, damaged = parse_tolerant(text)
+    assert value["shots"][0] == {"n": 1, "acting": "smile"}
+    assert damaged == [("shots", 1, "acting")]
+    assert damaged_fields(damaged) == ["shots"]
+    assert format_path(damaged[0]) == "shots[1].acting"
+
+
+def test_fences_trailing_commas_single_quotes_and_bare_keys():
+    assert parse_tolerant('```json\n{"a": 1,}\n```') == ({"a": 1}, [])
+    assert parse_tolerant("{'a': 'x', b: 2}") == ({"a": "x", "b": 2}, [])
+
+
+def test_unrecoverable_text_raises():
+    with pytest.raises(json.JSONDecodeError):
+        parse_tolerant("no json here")
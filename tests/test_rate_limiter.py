@@ -0,0 +1,123 @@
+import email.utils
+import time
+
+import pytest
+
+import rate_limiter
+from rate_limiter import RateLimiter, RetryPolicy, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", fake)
+    return fake
+
+
+class _Response:
+    def __init__(self, status_code=429, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class _APIError(Exception):
+    def __init__(self, status_code=429, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.response = _Response(status_code, headers)
+
+
+def test_bucket_refills_at_its_per_minute_rate(clock):
+    bucket = TokenBucket(60)
+    bucket.consume(60)
+    assert bucket.wait_time(1, clock.now) == pytest.approx(1.0)
+    clock.now += 30
+    assert bucket.wait_time(30, clock.now) == 0.0
+    assert bucket.wait_time(31, clock.now) == pytest.approx(1.0)
+
+
+def test_bucket_never_exceeds_capacity(clock):
+    bucket = TokenBucket(60)
+    clock.now += 600
+    bucket.wait_time(1, clock.now)
+    assert bucket.tokens == 60
+    bucket.refund(100)
+    assert bucket.tokens == 60
+
+
+def test_request_larger_than_capacity_still_fits_a_full_bucket(clock):
+    bucket = TokenBucket(100)
+    assert bucket.wait_time(500, clock.now) == 0.0
+
+
+def test_resize_adds_and_removes_capacity(clock):
+    bucket = TokenBucket(100)
+    bucket.consume(80)
+    bucket.resize(200)
+    assert (bucket.capacity, bucket.tokens) == (200, 120)
+    bucket.resize(50)
+    assert (bucket.capacity, bucket.tokens) == (50, 50)
+
+
+def test_reserve_waits_on_the_scarcer_budget_and_refund_returns_tokens(clock):
+    limiter = RateLimiter(rpm=600, tpm=6000)
+    assert limiter.reserve(6000) == 0.0
+    assert limiter.reserve(100) == pytest.approx(1.0)
+    limiter.refund(100)
+    assert limiter.reserve(100) == 0.0
+
+
+def test_pause_blocks_every_caller(clock):
+    limiter = RateLimiter(rpm=600, tpm=6000)
+    limiter.pause(5)
+    assert limiter.reserve(1) == pytest.approx(5.0)
+    clock.now += 5
+    assert limiter.reserve(1) == 0.0
+
+
+def test_observe_headers_adopts_account_limits(clock):
+    limiter = RateLimiter(rpm=500, tpm=30000)
+    limiter.observe_headers({"x-ratelimit-limit-requests": "5000", "x-ratelimit-limit-tokens": "bad"})
+    assert limiter.limits == {"rpm": 5000, "tpm": 30000}
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({"retry-after-ms": "1500"}, 1.5),
+    ({"retry-after": "7"}, 7.0),
+    ({"retry-after-ms": "x", "retry-after": "2"}, 2.0),
+    ({}, None),
+])
+def test_retry_after_headers(headers, expected):
+    assert RetryPolicy.retry_after(_APIError(headers=headers)) == expected
+
+
+def test_retry_after_http_date():
+    value = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert RetryPolicy.retry_after(_APIError(headers={"retry-after": value})) == pytest.approx(30, abs=2)
+
+
+def test_retry_after_overrides_a_shorter_backoff_within_max_delay():
+    policy = RetryPolicy(base_delay=0.001, max_delay=10)
+    assert policy.delay_for(0, retry_after=4) == 4
+    assert policy.delay_for(0, retry_after=60) == 10
+
+
+def test_backoff_is_capped():
+    policy = RetryPolicy(base_delay=1, max_delay=3)
+    assert all(0 <= policy.delay_for(attempt) <= 3 for attempt in range(10))
+
+
+def test_retryable_and_rate_limited_errors():
+    policy = RetryPolicy()
+    assert policy.is_retryable(_APIError(503))
+    assert not policy.is_retryable(_APIError(400))
+    assert policy.is_rate_limited(_APIError(429))
+    assert policy.is_rate_limited(_APIError(503, {"retry-after": "3"}))
+    assert not policy.is_rate_limited(_APIError(503))
@@ -0,0 +1,67 @@
+import base64
+
+from response_cache import ResponseCache, request_fingerprint
+
+
+def _messages(image: bytes, dna: str = "dna"):
+    url = "data:image/jpeg;base64," + base64.b64encode(image).decode("ascii")
+    return [
+        {"role": "system", "content": "You are Dr. Motion"},
+        {"role": "user", "content": [
+            {"type": "text", "text": dna},
+            {"type": "image_url", "image_url": {"url": url, "detail": "high"}},
+        ]},
+    ]
+
+
+def test_fingerprint_is_stable_and_keyed_by_image_bytes():
+    key = request_fingerprint("gpt-4o", _messages(b"image-a"), 2500, {"feature": "drmotion"})
+    assert key == request_fingerprint("gpt-4o", _messages(b"image-a"), 2500, {"feature": "drmotion"})
+    assert key != request_fingerprint("gpt-4o", _messages(b"image-b"), 2500, {"feature": "drmotion"})
+
+
+def test_fingerprint_covers_model_options_and_prompt():
+    key = request_fingerprint("gpt-4o", _messages(b"image"), 2500)
+    assert key != request_fingerprint("gpt-4o-mini", _messages(b"image"), 2500)
+    assert key != request_fingerprint("gpt-4o", _messages(b"image"), 3000)
+    assert key != request_fingerprint("gpt-4o", _messages(b"image", dna="other"), 2500)
+    assert key != request_fingerprint("gpt-4o", _messages(b"image"), 2500, {"temperature": 0.2})
+
+
+def test_put_then_get(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.put("k", {"final_video_prompt": "walk"}, feature="drmotion", model="gpt-4o",
+              usage={"prompt_tokens": 100, "completion_tokens": 50})
+    assert cache.get("k", "drmotion") == {"final_video_prompt": "walk"}
+    assert cache.stats()["hits"] == 1
+
+
+def test_expired_entries_are_misses_and_dropped(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path), ttl_seconds=60)
+    now = 1_000_000.0
+    monkeypatch.setattr("response_cache.time.time", lambda: now)
+    cache.put("k", {"final_video_prompt": "walk"})
+
+    now += 59
+    assert cache.get("k") == {"final_video_prompt": "walk"}
+    now += 2
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+    assert not (tmp_path / "k.json").exists()
+
+
+def test_no_ttl_never_expires(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path), ttl_seconds=None)
+    monkeypatch.setattr("response_cache.time.time", lambda: 0.0)
+    cache.put("k", {"a": 1})
+    monkeypatch.setattr("response_cache.time.time", lambda: 10 ** 9)
+    assert cache.get("k") == {"a": 1}
+
+
+def test_disabled_feature_and_empty_results_are_not_cached(tmp_path):
+    cache = ResponseCache(str(tmp_path), disabled_features=["video_review"])
+    cache.put("k", {"a": 1}, feature="video_review")
+    cache.put("empty", {}, feature="drmotion")
+    assert cache.get("k", "video_review") is None
+    assert cache.get("empty", "drmotion") is None
+    assert cache.stats()["entries"] == 0
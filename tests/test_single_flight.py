@@ -0,0 +1,157 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from deadline import CancellationToken, Cancelled, DeadlineExceeded, FailedCall, deadline_scope
+from single_flight import SingleFlight
+
+
+def _wait_for(condition, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "timed out waiting"
+        time.sleep(0.01)
+
+
+def _lead(flight, key, fn):
+    """Run fn as the leader in a thread; returns (thread, outcome dict)"""
+    outcome = {}
+
+    def run():
+        try:
+            outcome["value"] = flight.do(key, fn)
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    _wait_for(lambda: flight.get_stats()["in_flight"] == 1)
+    return thread, outcome
+
+
+def test_waiter_gets_a_private_copy_of_the_leaders_result():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def leader_fn():
+        release.wait()
+        return {"shots": [1]}
+
+    thread, leader = _lead(flight, "k", leader_fn)
+    threading.Timer(0.2, release.set).start()
+    result, shared = flight.do("k", lambda: pytest.fail("waiter must not run the call"))
+    thread.join()
+
+    assert shared is True
+    assert result == {"shots": [1]}
+    result["shots"].append(2)
+    assert leader["value"] == ({"shots": [1]}, False)
+
+
+def test_waiter_sees_the_leaders_error():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def leader_fn():
+        release.wait()
+        raise ValueError("bad request")
+
+    thread, _ = _lead(flight, "k", leader_fn)
+    threading.Timer(0.2, release.set).start()
+    with pytest.raises(ValueError):
+        flight.do("k", lambda: pytest.fail("waiter must not run the call"))
+    thread.join()
+
+
+@pytest.mark.parametrize("personal", [FailedCall("cancelled"), FailedCall("timeout")])
+def test_waiter_reruns_after_a_leaders_cancel_or_timeout(personal):
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def leader_fn():
+        release.wait()
+        return personal
+
+    thread, _ = _lead(flight, "k", leader_fn)
+    threading.Timer(0.2, release.set).start()
+    result, shared = flight.do("k", lambda: {"final_video_prompt": "ours"})
+    thread.join()
+
+    assert (result, shared) == ({"final_video_prompt": "ours"}, False)
+
+
+def test_waiter_reruns_after_the_leader_raises_cancelled():
+    flight = SingleFlight()
+    token = CancellationToken()
+
+    def leader_fn():
+        token.wait(5)
+        token.raise_if_cancelled()
+
+    thread, leader = _lead(flight, "k", leader_fn)
+    threading.Timer(0.2, token.cancel).start()
+    result, shared = flight.do("k", lambda: {"a": 1})
+    thread.join()
+
+    assert isinstance(leader["error"], Cancelled)
+    assert (result, shared) == ({"a": 1}, False)
+
+
+def test_waiter_stops_at_its_own_deadline():
+    flight = SingleFlight()
+    release = threading.Event()
+    thread, _ = _lead(flight, "k", lambda: release.wait(5))
+    try:
+        with deadline_scope(0.2):
+            with pytest.raises(DeadlineExceeded):
+                flight.do("k", lambda: {})
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_async_waiter_reruns_after_a_cancelled_leader():
+    async def main():
+        flight = SingleFlight()
+        started = asyncio.Event()
+        calls = []
+
+        async def leader_fn():
+            started.set()
+            await asyncio.sleep(5)
+
+        async def waiter_fn():
+            calls.append("waiter")
+            return {"a": 1}
+
+        leader = asyncio.create_task(flight.ado("k", leader_fn))
+        await started.wait()
+        waiter = asyncio.create_task(flight.ado("k", waiter_fn))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        result = await waiter
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return result, calls
+
+    assert asyncio.run(main()) == (({"a": 1}, False), ["waiter"])
+
+
+def test_async_waiter_shares_a_successful_result():
+    async def main():
+        flight = SingleFlight()
+
+        async def leader_fn():
+            await asyncio.sleep(0.1)
+            return {"a": [1]}
+
+        first, second = await asyncio.gather(flight.ado("k", leader_fn), flight.ado("k", leader_fn))
+        return first, second, flight.stats
+
+    first, second, stats = asyncio.run(main())
+    assert first == ({"a": [1]}, False)
+    assert second == ({"a": [1]}, True)
+    assert first[0] is not second[0]
+    assert stats == {"leaders": 1, "coalesced": 1}
@@ -0,0 +1,39 @@
+from video_analyzer import DEFAULT_GOP_FRAMES, _align_to_keyframes, _plan_frame_reads
+
+
+def test_align_moves_inner_targets_onto_nearby_keyframes():
+    # Spacing 100, so a keyframe within 25 frames is close enough
+    assert _align_to_keyframes([0, 100, 200, 300], [0, 90, 230, 300]) == [0, 90, 200, 300]
+
+
+def test_align_keeps_the_first_and_last_frames_exact():
+    assert _align_to_keyframes([5, 100, 195], [0, 100, 200]) == [5, 100, 195]
+
+
+def test_align_reads_a_shared_keyframe_once():
+    assert _align_to_keyframes([0, 10, 12, 30], [0, 11, 30]) == [0, 11, 30]
+
+
+def test_align_without_keyframes_or_with_few_targets_is_a_no_op():
+    assert _align_to_keyframes([0, 50, 100], None) == [0, 50, 100]
+    assert _align_to_keyframes([0, 100], [50]) == [0, 100]
+
+
+def test_plan_prefers_seeking_to_sparse_keyframe_aligned_frames():
+    keyframes = list(range(0, 10000, 250))
+    strategy, sequential, seek = _plan_frame_reads([0, 2500, 5000, 7500, 9999], keyframes, seek_overhead=24)
+    assert strategy == "seek"
+    assert sequential == 10000
+    # 24 per seek plus one decoded frame, and 249 frames back from 9750 to 9999
+    assert seek == 5 * 25 + 249
+
+
+def test_plan_prefers_a_sequential_pass_for_dense_frames():
+    strategy, sequential, seek = _plan_frame_reads(list(range(0, 100, 5)), None, seek_overhead=24)
+    assert strategy == "sequential"
+    assert seek == 20 * (24 + DEFAULT_GOP_FRAMES // 2 + 1)
+    assert sequential == 96
+
+
+def test_plan_with_all_frames_keyframes_only_pays_the_seek_overhead():
+    assert _plan_frame_reads([10, 500], [], seek_overhead=24) == ("seek", 501, 50)
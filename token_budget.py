@@ -0,0 +1,107 @@
+"""
+Token Budget
+============
+Per-feature output-length model: learns how many completion tokens each
+feature really produces and sizes max_tokens to a high percentile plus a
+margin, instead of a fixed guess that either truncates or over-reserves TPM.
+"""
+
+import math
+import threading
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Iterable, Optional
+
+from call_metrics import percentile
+
+# Outcomes whose completion_tokens reflect a full-length answer
+LEARNABLE_OUTCOMES = {"ok", "recovered", "parse_error"}
+
+
+class TokenBudget:
+    """Sliding window of observed completion lengths per feature"""
+
+    def __init__(self, pct: float = 95, margin: float = 1.25, min_samples: int = 20,
+                 window: int = 200, floor: int = 256, ceiling: int = 16384):
+        """
+        Args:
+            pct: Percentile of observed lengths to cover
+            margin: Multiplier applied on top of the percentile
+            min_samples: Observations needed before the method default is overridden
+            window: Most recent observations kept per feature
+            floor: Smallest max_tokens ever returned
+            ceiling: Largest max_tokens ever returned (model output limit)
+        """
+        self.pct = pct
+        self.margin = margin
+        self.min_samples = min_samples
+        self.floor = floor
+        self.ceiling = ceiling
+        self._samples: Dict[str, Deque[int]] = defaultdict(lambda: deque(maxlen=window))
+        self._truncations: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self._seeded = False
+
+    def observe(self, feature: str, completion_tokens: int, truncated: bool = False):
+        """
+        Record the completion length of one finished answer.
+
+        Args:
+            feature: Feature name
+            completion_tokens: Total output tokens, including any continuations
+            truncated: The first response hit max_tokens
+        """
+        if completion_tokens <= 0:
+            return
+        with self._lock:
+            self._samples[feature].append(completion_tokens)
+            if truncated:
+                self._truncations[feature] += 1
+
+    def max_tokens_for(self, feature: str, default: int) -> int:
+        """max_tokens to request: the learned size, or `default` until enough samples exist"""
+        with self._lock:
+            samples = list(self._samples.get(feature, ()))
+        if len(samples) < self.min_samples:
+            return default
+        sized = math.ceil(percentile(samples, self.pct) * self.margin)
+        return max(self.floor, min(self.ceiling, sized))
+
+    def seed(self, records: Iterable[Dict[str, Any]]):
+        """Learn from previously recorded call metrics (once per process)"""
+        with self._lock:
+            if self._seeded:
+                return
+            self._seeded = True
+        for record in records:
+            if record.get("outcome") in LEARNABLE_OUTCOMES and not record.get("repair_fields"):
+                self.observe(record.get("feature", "general"), record.get("completion_tokens", 0) or 0,
+                             truncated=bool(record.get("continuations")))
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-feature sample count, p50/p95 and the max_tokens currently chosen"""
+        with self._lock:
+            snapshot = {feature: list(samples) for feature, samples in self._samples.items()}
+            truncations = dict(self._truncations)
+        return {
+            feature: {
+                "samples": len(samples),
+                "p50": percentile(samples, 50),
+                "p95": percentile(samples, 95),
+                "max_tokens": self.max_tokens_for(feature, 0) or None,
+                "truncations": truncations.get(feature, 0),
+            }
+            for feature, samples in snapshot.items() if samples
+        }
+
+
+_shared_budget: Optional[TokenBudget] = None
+_shared_lock = threading.Lock()
+
+
+def get_token_budget() -> TokenBudget:
+    """Process-wide token budget shared by every OpenAIService"""
+    global _shared_budget
+    with _shared_lock:
+        if _shared_budget is None:
+            _shared_budget = TokenBudget()
+        return _shared_budget
@@ -0,0 +1,319 @@
+"""
+Transport
+=========
+Pluggable layer between OpenAIService and the chat completions endpoint.
+
+- OpenAITransport: the real API (default)
+- RecordingTransport: wraps another transport and saves every request /
+  response pair to a cassette directory
+- ReplayTransport: answers from a cassette directory with no network,
+  adding synthetic latency and injected errors for benchmarks
+
+A transport has create(**kwargs) and async acreate(**kwargs) taking the
+same arguments as chat.completions.create.
+"""
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import httpx
+from openai import APITimeoutError
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from call_metrics import note_first_byte
+from rate_limiter import estimate_request_tokens
+from response_cache import normalize_messages, request_fingerprint
+
+Latency = Union[float, Tuple[float, float]]
+
+
+def cassette_key(kwargs: Dict[str, Any]) -> str:
+    """Cassette file name for a chat.completions.create call"""
+    return request_fingerprint(
+        kwargs.get("model", ""), kwargs.get("messages", []), kwargs.get("max_tokens", 0),
+        extra={"stream": bool(kwargs.get("stream")), "response_format": kwargs.get("response_format")},
+    )
+
+
+class OpenAITransport:
+    """Sends requests through the OpenAI SDK clients"""
+
+    def __init__(self, client=None, async_client=None,
+                 on_headers: Optional[Callable[[str, Any], None]] = None):
+        """
+        Args:
+            client: Sync OpenAI client
+            async_client: AsyncOpenAI client
+            on_headers: Called with (model, response headers) for every response,
+                        e.g. to learn the account's rate limits
+        """
+        self.client = client
+        self.async_client = async_client
+        self.on_headers = on_headers
+
+    def create(self, **kwargs):
+        if self.on_headers is None:
+            return self.client.chat.completions.create(**kwargs)
+        raw = self.client.chat.completions.with_raw_response.create(**kwargs)
+        self.on_headers(kwargs.get("model", ""), raw.headers)
+        return raw.parse()
+
+    async def acreate(self, **kwargs):
+        if self.on_headers is None:
+            return await self.async_client.chat.completions.create(**kwargs)
+        raw = await self.async_client.chat.completions.with_raw_response.create(**kwargs)
+        self.on_headers(kwargs.get("model", ""), raw.headers)
+        return raw.parse()
+
+
+class RecordingTransport:
+    """Passes calls to an inner transport and writes each interaction to <cassette_dir>/<key>.json"""
+
+    def __init__(self, inner, cassette_dir: str = "cassettes"):
+        self.inner = inner
+        self.cassette_dir = cassette_dir
+        os.makedirs(cassette_dir, exist_ok=True)
+
+    def create(self, **kwargs):
+        resp = self.inner.create(**kwargs)
+        if kwargs.get("stream"):
+            return self._record_stream(kwargs, resp)
+        self._save(kwargs, response=resp.model_dump())
+        return resp
+
+    async def acreate(self, **kwargs):
+        resp = await self.inner.acreate(**kwargs)
+        if kwargs.get("stream"):
+            return self._arecord_stream(kwargs, resp)
+        self._save(kwargs, response=resp.model_dump())
+        return resp
+
+    def _record_stream(self, kwargs: Dict[str, Any], stream):
+        chunks = []
+        for chunk in stream:
+            chunks.append(chunk.model_dump())
+            yield chunk
+        self._save(kwargs, chunks=chunks)
+
+    async def _arecord_stream(self, kwargs: Dict[str, Any], stream):
+        chunks = []
+        async for chunk in stream:
+            chunks.append(chunk.model_dump())
+            yield chunk
+        self._save(kwargs, chunks=chunks)
+
+    def _save(self, kwargs: Dict[str, Any], response: Optional[Dict[str, Any]] = None,
+              chunks: Optional[List[Dict[str, Any]]] = None):
+        entry = {
+            "request": {
+                "model": kwargs.get("model"),
+                "max_tokens": kwargs.get("max_tokens"),
+                "stream": bool(kwargs.get("stream")),
+                # Images are stored as hashes to keep cassettes small
+                "messages": normalize_messages(kwargs.get("messages", [])),
+            },
+            "response": response,
+            "chunks": chunks,
+            "recorded_at": time.time(),
+        }
+        path = os.path.join(self.cassette_dir, f"{cassette_key(kwargs)}.json")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Error saving cassette: {e}")
+
+
+class CassetteMiss(KeyError):
+    """No recording exists for a request and the replay transport has no fallback"""
+
+
+class InjectedAPIError(Exception):
+    """
+    Synthetic API failure raised by ReplayTransport.
+
+    Carries status_code and response.headers like openai.APIStatusError, so
+    RetryPolicy treats it exactly like the real error.
+    """
+
+    class _Response:
+        def __init__(self, status_code: int, headers: Dict[str, str]):
+            self.status_code = status_code
+            self.headers = headers
+
+    def __init__(self, status_code: int, retry_after: Optional[float] = None):
+        headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+        super().__init__(f"Injected API error (HTTP {status_code})")
+        self.status_code = status_code
+        self.response = self._Response(status_code, headers)
+
+
+def _example(schema: Dict[str, Any], name: str = "value") -> Any:
+    kind = schema.get("type")
+    if kind == "object":
+        return {key: _example(sub, key) for key, sub in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [_example(schema.get("items", {}), name)]
+    if kind == "integer":
+        return 1
+    return f"synthetic {name}"
+
+
+def synthetic_content(kwargs: Dict[str, Any]) -> str:
+    """
+    Default fallback completion text for requests with no recording.
+
+    Requests with a json_schema response_format get a minimal valid instance
+    of that schema; others get a small placeholder object.
+    """
+    response_format = kwargs.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        return json.dumps(_example(response_format["json_schema"]["schema"]))
+    return json.dumps({"synthetic": True, "note": "No cassette recorded for this request"})
+
+
+class ReplayTransport:
+    """Serves recorded responses offline with synthetic latency and error injection"""
+
+    def __init__(self, cassette_dir: str = "cassettes", latency: Latency = 0.0,
+                 ttfb_fraction: float = 0.3, error_rate: float = 0.0,
+                 error_status: int = 429, retry_after: Optional[float] = None,
+                 fallback: Optional[Callable[[Dict[str, Any]], str]] = synthetic_content,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            cassette_dir: Directory written by RecordingTransport
+            latency: Seconds per response, fixed or a (min, max) range
+            ttfb_fraction: Share of the latency before the first streamed chunk
+            error_rate: Probability (0-1) that a call raises InjectedAPIError
+            error_status: HTTP status of injected errors (429, 500, 503...)
+            retry_after: Retry-After seconds attached to injected errors
+            fallback: Builds completion text for unrecorded requests; None raises CassetteMiss
+            seed: Seed for reproducible latency and error sequences
+        """
+        self.cassette_dir = cassette_dir
+        self.latency = latency
+        self.ttfb_fraction = ttfb_fraction
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.fallback = fallback
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "replayed": 0, "synthetic": 0, "errors": 0, "timeouts": 0}
+
+    def create(self, **kwargs):
+        delay, fail = self._draw()
+        if fail:
+            time.sleep(delay * self.ttfb_fraction)
+            raise InjectedAPIError(self.error_status, self.retry_after)
+        if self._times_out(kwargs, delay):
+            time.sleep(kwargs["timeout"])
+            raise self._timeout_error()
+        entry = self._load(kwargs)
+        if kwargs.get("stream"):
+            return self._replay_stream(entry, delay)
+        time.sleep(delay)
+        note_first_byte()
+        return ChatCompletion.model_validate(entry["response"])
+
+    async def acreate(self, **kwargs):
+        delay, fail = self._draw()
+        if fail:
+            await asyncio.sleep(delay * self.ttfb_fraction)
+            raise InjectedAPIError(self.error_status, self.retry_after)
+        if self._times_out(kwargs, delay):
+            await asyncio.sleep(kwargs["timeout"])
+            raise self._timeout_error()
+        entry = self._load(kwargs)
+        if kwargs.get("stream"):
+            return self._areplay_stream(entry, delay)
+        await asyncio.sleep(delay)
+        note_first_byte()
+        return ChatCompletion.model_validate(entry["response"])
+
+    def _draw(self) -> Tuple[float, bool]:
+        with self._lock:
+            self.stats["calls"] += 1
+            if isinstance(self.latency, (tuple, list)):
+                delay = self._random.uniform(*self.latency)
+            else:
+                delay = float(self.latency)
+            fail = self.error_rate > 0 and self._random.random() < self.error_rate
+            if fail:
+                self.stats["errors"] += 1
+            return delay, fail
+
+    def _times_out(self, kwargs: Dict[str, Any], delay: float) -> bool:
+        """True when the synthetic latency exceeds the request's timeout (as the SDK would see it)"""
+        timeout = kwargs.get("timeout")
+        if timeout is None or delay <= timeout:
+            return False
+        with self._lock:
+            self.stats["timeouts"] += 1
+        return True
+
+    @staticmethod
+    def _timeout_error() -> APITimeoutError:
+        return APITimeoutError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+
+    def _load(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        path = os.path.join(self.cassette_dir, f"{cassette_key(kwargs)}.json")
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            with self._lock:
+                self.stats["replayed"] += 1
+            return entry
+        if self.fallback is None:
+            raise CassetteMiss(path)
+        with self._lock:
+            self.stats["synthetic"] += 1
+        return self._synthetic_entry(kwargs, self.fallback(kwargs))
+
+    @staticmethod
+    def _synthetic_entry(kwargs: Dict[str, Any], content: str) -> Dict[str, Any]:
+        prompt_tokens = estimate_request_tokens(kwargs.get("messages", []))
+        completion_tokens = max(1, len(content) // 4)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        base = {"id": "chatcmpl-replay", "created": int(time.time()), "model": kwargs.get("model", "")}
+        if not kwargs.get("stream"):
+            return {"response": {**base, "object": "chat.completion", "usage": usage, "choices": [
+                {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}
+            ]}, "chunks": None}
+        # Split into ~40-character deltas, like a real stream
+        chunks = [{**base, "object": "chat.completion.chunk", "choices": [
+            {"index": 0, "finish_reason": None, "delta": {"content": content[i:i + 40]}}
+        ]} for i in range(0, len(content), 40)]
+        chunks.append({**base, "object": "chat.completion.chunk", "choices": [], "usage": usage})
+        return {"response": None, "chunks": chunks}
+
+    def _replay_stream(self, entry: Dict[str, Any], delay: float):
+        chunks = entry.get("chunks") or []
+        first = delay * self.ttfb_fraction
+        step = (delay - first) / max(1, len(chunks) - 1)
+        time.sleep(first)
+        note_first_byte()
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(step)
+            yield ChatCompletionChunk.model_validate(chunk)
+
+    async def _areplay_stream(self, entry: Dict[str, Any], delay: float):
+        chunks = entry.get("chunks") or []
+        first = delay * self.ttfb_fraction
+        step = (delay - first) / max(1, len(chunks) - 1)
+        await asyncio.sleep(first)
+        note_first_byte()
+        for i, chunk in enumerate(chunks):
+            if i:
+                await asyncio.sleep(step)
+            yield ChatCompletionChunk.model_validate(chunk)
@@ -5,22 +5,561 @@ Analyze videos to extract emotions, motions, and generate prompts
 Requires GPT-4V or similar video analysis capability
 """
 
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
+from bisect import bisect_right
+from contextlib import contextmanager
+import atexit
 import base64
+import io
+import mmap
+import shutil
+import struct
 import tempfile
+import threading
 import os
 
+# Frame-read cost model, in units of one decoded frame. A seek flushes the
+# decoder and decodes forward from the preceding keyframe; when the keyframe
+# table is unknown, assume the x264 default GOP.
+SEEK_OVERHEAD_FRAMES = 24
+DEFAULT_GOP_FRAMES = 250
 
-def extract_keyframes_from_video(video_file, num_frames: int = 5) -> List[str]:
+# Scene selection: frames sampled for signatures, and the block-mean grid size
+MAX_SCENE_SAMPLES = 240
+SIGNATURE_GRID = 8
+# Mean block change (0-255 scale) below which a stretch counts as static
+STATIC_CHANGE = 1.0
+# ... and above which the change is a hard cut rather than motion
+CUT_CHANGE = 30.0
+
+# Motion energy: thumbnail size for frame differencing, the energy (grey
+# levels per second) below which nothing is moving, and the share of the
+# clip's peak energy that counts as part of a motion event
+MOTION_GRID = 32
+STATIC_MOTION = 5.0
+MOTION_PEAK_SHARE = 0.3
+
+# Duplicate frames: dHash grid (64 bits), the Hamming distance at or below
+# which two frames count as the same image, and how many candidates per
+# requested frame are hashed to find replacements
+DHASH_SIZE = 8
+DEDUP_HAMMING = 6
+DEDUP_CANDIDATES = 3
+# Which motion-chosen frames survive deduplication first
+MOTION_PRIORITY = ("motion peak", "cut", "motion starts", "motion settles", "start", "end", "middle")
+
+# Uploads are copied to the spool in chunks of this size
+INGEST_CHUNK_BYTES = 4 * 1024 * 1024
+
+
+_spool_lock = threading.Lock()
+_spool_dir: Optional[str] = None
+_free_spools: List[Tuple[Any, str]] = []
+
+
+def _acquire_spool(suffix: str) -> Tuple[Any, str]:
+    """
+    A spool file for one upload: reused from the pool, or created with
+    mkstemp (O_EXCL, mode 0600) in a private directory removed at exit.
+    """
+    global _spool_dir
+    with _spool_lock:
+        if _free_spools:
+            return _free_spools.pop()
+        if _spool_dir is None:
+            _spool_dir = tempfile.mkdtemp(prefix="video_spool_")
+            atexit.register(shutil.rmtree, _spool_dir, True)
+        spool_dir = _spool_dir
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=spool_dir)
+    return os.fdopen(fd, "w+b"), path
+
+
+def _release_spool(spool: Tuple[Any, str]):
+    """Empty a spool file and return it to the pool"""
+    handle = spool[0]
+    try:
+        handle.seek(0)
+        handle.truncate(0)
+    except OSError:
+        handle.close()
+        return
+    with _spool_lock:
+        _free_spools.append(spool)
+
+
+@contextmanager
+def _spooled_video(video_file, suffix: str = ".mp4"):
+    """
+    Stream an upload into a file OpenCV can open, without a second full copy in memory.
+
+    Uses an anonymous in-memory file (memfd) where the OS supports it, otherwise
+    a pooled spool file that is emptied after use and reused by the next
+    upload (at most one file per concurrent extraction).
+
+    Yields:
+        (path, spool) where spool is the open binary file holding the video
+    """
+    pooled = None
+    spool = None
+    if hasattr(os, "memfd_create"):
+        try:
+            fd = os.memfd_create("video_upload", os.MFD_CLOEXEC)
+            spool, path = os.fdopen(fd, "w+b"), f"/proc/self/fd/{fd}"
+        except OSError:
+            spool = None
+    if spool is None:
+        pooled = _acquire_spool(suffix)
+        spool, path = pooled
+
+    try:
+        video_file.seek(0)
+        shutil.copyfileobj(video_file, spool, INGEST_CHUNK_BYTES)
+        spool.flush()
+        video_file.seek(0)
+        yield path, spool
+    finally:
+        if pooled is not None:
+            _release_spool(pooled)
+        else:
+            spool.close()
+
+
+def _open_capture(source):
+    """VideoCapture for a file path, or for a seekable binary stream (OpenCV 4.11+)"""
+    import cv2
+
+    if isinstance(source, str):
+        return cv2.VideoCapture(source)
+    source.seek(0)
+    return cv2.VideoCapture(source, cv2.CAP_FFMPEG, [])
+
+
+def _stream_capture(video_file):
+    """An opened VideoCapture decoding the upload in place, or None if OpenCV cannot"""
+    import cv2
+
+    if not hasattr(cv2, "IStreamReader") or not isinstance(video_file, io.BufferedIOBase):
+        return None
+    try:
+        cap = _open_capture(video_file)
+    except (cv2.error, SystemError):
+        return None
+    if cap.isOpened():
+        return cap
+    cap.release()
+    return None
+
+
+@contextmanager
+def _video_source(video_file, suffix: str = ".mp4"):
+    """
+    Where OpenCV should read an upload from.
+
+    The upload itself when OpenCV can read streams, otherwise a spool
+    (see _spooled_video).
+
+    Yields:
+        (source, view, cap): source goes to _open_capture, view is a
+        zero-copy buffer over the video bytes (None if empty) and cap is a
+        capture already opened on the source (the caller releases it)
+    """
+    cap = _stream_capture(video_file)
+    if cap is not None:
+        view = video_file.getbuffer() if hasattr(video_file, "getbuffer") else None
+        try:
+            yield video_file, view, cap
+        finally:
+            if view is not None:
+                view.release()
+            video_file.seek(0)
+        return
+
+    with _spooled_video(video_file, suffix) as (path, spool):
+        cap = _open_capture(path)
+        if os.fstat(spool.fileno()).st_size == 0:
+            yield path, None, cap
+            return
+        with mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            yield path, view, cap
+
+
+def _mp4_boxes(data: bytes, start: int, end: int):
+    """Yield (type, payload_start, box_end) for the boxes in data[start:end]"""
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", data[pos + 8:pos + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            return
+        yield kind, pos + header, pos + size
+        pos += size
+
+
+def _mp4_child(data: bytes, start: int, end: int, kind: bytes) -> Optional[Tuple[int, int]]:
+    for child, payload, box_end in _mp4_boxes(data, start, end):
+        if child == kind:
+            return payload, box_end
+    return None
+
+
+def _mp4_keyframes(data: bytes) -> Optional[List[int]]:
+    """
+    Keyframe positions of the first video track, from the MP4/MOV sync-sample table.
+
+    Returns:
+        Sorted 0-based frame indices, [] when every frame is a keyframe, or
+        None when the file is not a (non-fragmented) MP4/MOV
+    """
+    try:
+        moov = _mp4_child(data, 0, len(data), b"moov")
+        if not moov or _mp4_child(data, *moov, b"mvex"):
+            return None
+        for kind, start, end in _mp4_boxes(data, *moov):
+            if kind != b"trak":
+                continue
+            mdia = _mp4_child(data, start, end, b"mdia")
+            hdlr = mdia and _mp4_child(data, *mdia, b"hdlr")
+            if not hdlr or data[hdlr[0] + 8:hdlr[0] + 12] != b"vide":
+                continue
+            minf = _mp4_child(data, *mdia, b"minf")
+            stbl = minf and _mp4_child(data, *minf, b"stbl")
+            if not stbl:
+                return None
+            stss = _mp4_child(data, *stbl, b"stss")
+            if not stss:
+                return []
+            count = struct.unpack(">I", data[stss[0] + 4:stss[0] + 8])[0]
+            entries = struct.unpack(f">{count}I", data[stss[0] + 8:stss[0] + 8 + 4 * count])
+            return sorted(n - 1 for n in entries)
+    except struct.error:
+        return None
+    return None
+
+
+def _align_to_keyframes(indices: List[int], keyframes: Optional[List[int]]) -> List[int]:
+    """
+    Move each inner target onto its nearest keyframe when that stays within a
+    quarter of the spacing between targets, so a seek decodes one frame instead
+    of a GOP. The first and last frames are kept exact.
+    """
+    if not keyframes or len(indices) < 3:
+        return indices
+    tolerance = (indices[-1] - indices[0]) / (len(indices) - 1) / 4
+    aligned = [indices[0], indices[-1]]
+    for idx in indices[1:-1]:
+        pos = bisect_right(keyframes, idx)
+        nearest = min(keyframes[max(0, pos - 1):pos + 1], key=lambda k: abs(k - idx))
+        target = nearest if abs(nearest - idx) <= tolerance else idx
+        if target not in aligned:
+            aligned.append(target)
+    return sorted(aligned)
+
+
+def _plan_frame_reads(indices: List[int], keyframes: Optional[List[int]],
+                      seek_overhead: int = SEEK_OVERHEAD_FRAMES) -> Tuple[str, int, int]:
     """
-    Extract evenly-spaced keyframes from a video file and return as base64 data URLs.
+    Choose between one forward pass and a seek per frame.
 
     Args:
-        video_file: Streamlit UploadedFile (video)
-        num_frames: Number of frames to extract (default 5)
+        indices: Sorted frame indices to read
+        keyframes: Keyframe positions ([] = all frames, None = unknown)
+        seek_overhead: Cost of one seek, in decoded frames
 
     Returns:
-        List of base64 data URL strings for each keyframe
+        (strategy, sequential_cost, seek_cost) with costs in decoded frames
+    """
+    sequential = indices[-1] + 1
+    seek = 0
+    for idx in indices:
+        if keyframes is None:
+            back = DEFAULT_GOP_FRAMES // 2
+        elif not keyframes:
+            back = 0
+        else:
+            back = idx - keyframes[max(0, bisect_right(keyframes, idx) - 1)]
+        seek += seek_overhead + max(0, back) + 1
+    return ("seek" if seek < sequential else "sequential"), sequential, seek
+
+
+def _read_sequential(cap, indices: List[int], transform=None) -> Dict[int, Any]:
+    """Single forward pass: grab() every frame, retrieve() only the wanted ones"""
+    frames = {}
+    wanted = set(indices)
+    for position in range(indices[-1] + 1):
+        if not cap.grab():
+            break
+        if position in wanted:
+            ok, frame = cap.retrieve()
+            if ok:
+                frames[position] = transform(frame) if transform else frame
+    return frames
+
+
+def _read_seeking(cap, indices: List[int], transform=None) -> Dict[int, Any]:
+    """Seek to each frame and decode it"""
+    import cv2
+
+    frames = {}
+    for idx in indices:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+        ok, frame = cap.read()
+        if ok:
+            frames[idx] = transform(frame) if transform else frame
+    return frames
+
+
+def _read_frames(source, indices: List[int], strategy: str, transform=None) -> Dict[int, Any]:
+    """
+    Decode the frames at `indices` with the given strategy ("sequential" or "seek").
+
+    Frames a seek could not reach (some containers seek unreliably) are read
+    with a forward pass instead.
+
+    Args:
+        source: File path or seekable stream (see _open_capture)
+        transform: Applied to each frame as it is decoded, so only its result
+            is kept (e.g. a signature instead of the full frame)
+    """
+    cap = _open_capture(source)
+    try:
+        if strategy == "sequential":
+            return _read_sequential(cap, indices, transform)
+        frames = _read_seeking(cap, indices, transform)
+    finally:
+        cap.release()
+    missing = [idx for idx in indices if idx not in frames]
+    if missing:
+        cap = _open_capture(source)
+        try:
+            frames.update(_read_sequential(cap, missing, transform))
+        finally:
+            cap.release()
+    return frames
+
+
+def _frame_signature(frame):
+    """Cheap content signature: the frame shrunk to a MOTION_GRID x MOTION_GRID thumbnail"""
+    import cv2
+    import numpy as np
+
+    small = cv2.resize(frame, (MOTION_GRID, MOTION_GRID), interpolation=cv2.INTER_AREA)
+    return small.astype(np.float32)
+
+
+def _scan_signatures(source, total_frames: int, keyframes: Optional[List[int]]):
+    """
+    Signatures of up to MAX_SCENE_SAMPLES evenly spaced frames.
+
+    Returns:
+        (positions, signatures, changes): sampled frame indices, an
+        (N, MOTION_GRID, MOTION_GRID, 3) array of thumbnails, and the mean
+        absolute change of SIGNATURE_GRID block means from the previous
+        sample (0 for the first)
+    """
+    import numpy as np
+
+    stride = max(1, -(-total_frames // MAX_SCENE_SAMPLES))
+    samples = list(range(0, total_frames, stride))
+    strategy = _plan_frame_reads(samples, keyframes)[0]
+    read = _read_frames(source, samples, strategy, transform=_frame_signature)
+    positions = sorted(read)
+    if not positions:
+        return [], np.zeros((0, MOTION_GRID, MOTION_GRID, 3), np.float32), np.zeros(0)
+    signatures = np.stack([read[p] for p in positions])
+    block = MOTION_GRID // SIGNATURE_GRID
+    blocks = signatures.reshape(len(positions), SIGNATURE_GRID, block, SIGNATURE_GRID, block, 3).mean(axis=(2, 4))
+    changes = np.zeros(len(positions))
+    changes[1:] = np.abs(np.diff(blocks, axis=0)).mean(axis=(1, 2, 3))
+    return positions, signatures, changes
+
+
+def _select_scene_frames(positions: List[int], changes, count: int) -> List[int]:
+    """
+    Frames at the largest content changes, with temporal coverage.
+
+    The first and last samples are kept (only the first when count is 1).
+    The samples between them are split into count - 2 equal windows and each
+    window contributes the frame right after its largest change (its middle
+    frame if nothing changes), so every part of the clip is represented.
+    """
+    import numpy as np
+
+    if len(positions) <= count or count < 2:
+        return list(positions[:max(0, count)])
+    last = len(positions) - 1
+    chosen = {0, last}
+    if count > 2:
+        bounds = np.linspace(1, last, count - 1).astype(int)
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            if hi <= lo:
+                continue
+            peak = lo + int(np.argmax(changes[lo:hi]))
+            chosen.add(peak if changes[peak] >= STATIC_CHANGE else (lo + hi - 1) // 2)
+    return [positions[i] for i in sorted(chosen)]
+
+
+def _motion_profile(positions: List[int], signatures, changes, fps: float) -> Dict[str, Any]:
+    """
+    Motion energy curve from frame differencing of the sampled thumbnails.
+
+    Energy is the mean absolute grey-level change per second between
+    consecutive samples. Hard cuts (large colour changes) are reported as
+    transitions and left out of the energy, speed and acceleration figures.
+
+    Returns:
+        {"fps", "duration_s", "times", "energy", "cut_samples", "transitions",
+         "events", "speed", "acceleration", "active_ratio"}
+    """
+    import numpy as np
+
+    times = np.asarray(positions, dtype=np.float64) / fps
+    energy = np.zeros(len(positions))
+    cut_samples: List[int] = []
+    if len(positions) > 1:
+        grey = signatures @ np.asarray([0.114, 0.587, 0.299], dtype=np.float32)
+        dt = np.maximum(np.diff(times), 1e-6)
+        energy[1:] = np.abs(np.diff(grey, axis=0)).mean(axis=(1, 2)) / dt
+        cut_samples = [int(i) for i in np.nonzero(changes >= CUT_CHANGE)[0]]
+        energy[cut_samples] = 0.0
+
+    # Contiguous stretches of motion, strongest first
+    moving = energy >= max(STATIC_MOTION, MOTION_PEAK_SHARE * energy.max(initial=0.0))
+    events = []
+    i = 0
+    while i < len(energy):
+        if not moving[i]:
+            i += 1
+            continue
+        end = i
+        while end + 1 < len(energy) and moving[end + 1]:
+            end += 1
+        peak = i + int(np.argmax(energy[i:end + 1]))
+        events.append({"onset": max(0, i - 1), "peak": peak, "settle": min(len(energy) - 1, end + 1),
+                       "energy": float(energy[peak])})
+        i = end + 1
+    events.sort(key=lambda e: e["energy"], reverse=True)
+
+    acceleration = np.diff(energy) / np.maximum(np.diff(times), 1e-6) if len(energy) > 1 else np.zeros(0)
+    if cut_samples and len(acceleration):
+        # The steps into and out of a cut are not acceleration
+        for c in cut_samples:
+            acceleration[max(0, c - 1):c + 1] = 0.0
+    steady = energy[energy >= STATIC_MOTION]
+    return {
+        "fps": fps,
+        "duration_s": round(float(times[-1]) if len(times) else 0.0, 2),
+        "times": [round(float(t), 2) for t in times],
+        "energy": [round(float(e), 2) for e in energy],
+        "cut_samples": cut_samples,
+        "transitions": [round(float(times[c]), 2) for c in cut_samples],
+        "events": events,
+        "speed": {
+            "mean": round(float(steady.mean()), 2) if len(steady) else 0.0,
+            "peak": round(float(energy.max(initial=0.0)), 2),
+            "peak_at_s": round(float(times[int(np.argmax(energy))]), 2) if len(energy) else 0.0,
+        },
+        "acceleration": {
+            "peak": round(float(acceleration.max(initial=0.0)), 2),
+            "peak_at_s": round(float(times[int(np.argmax(acceleration)) + 1]), 2) if len(acceleration) else 0.0,
+            "peak_decel": round(float(acceleration.min(initial=0.0)), 2),
+            "peak_decel_at_s": round(float(times[int(np.argmin(acceleration)) + 1]), 2) if len(acceleration) else 0.0,
+        },
+        "active_ratio": round(float((energy >= STATIC_MOTION).mean()), 2) if len(energy) else 0.0,
+    }
+
+
+def _select_motion_frames(positions: List[int], profile: Dict[str, Any], count: int) -> List[Tuple[int, str]]:
+    """
+    Up to `count` frames placed around motion: start and end, hard cuts,
+    the peak of each motion event, then the poses where events begin and
+    settle. A static clip gets start, middle and end only, and a single
+    frame is the strongest motion peak (or the start).
+
+    Returns:
+        [(frame_index, reason), ...] in time order
+    """
+    if count < 2 or len(positions) < 2:
+        if count < 1 or not positions:
+            return []
+        if profile["events"]:
+            return [(positions[profile["events"][0]["peak"]], "motion peak")]
+        return [(positions[0], "start")]
+    last = len(positions) - 1
+    chosen: Dict[int, str] = {0: "start", last: "end"}
+    # Peaks and cuts are spread over the clip; an event's own start and
+    # settle poses may sit close to its peak
+    spread = max(1, len(positions) // (2 * max(1, count)))
+    candidates = [(c, "cut", spread) for c in profile["cut_samples"]]
+    candidates += [(e["peak"], "motion peak", spread) for e in profile["events"]]
+    for event in profile["events"]:
+        candidates += [(event["onset"], "motion starts", max(1, spread // 4)),
+                       (event["settle"], "motion settles", max(1, spread // 4))]
+    for sample, reason, gap in candidates:
+        if len(chosen) >= count:
+            break
+        if all(abs(sample - other) >= gap for other in chosen):
+            chosen[sample] = reason
+    if len(chosen) < min(3, count) and last > 1:
+        chosen.setdefault(last // 2, "middle")
+    return [(positions[i], chosen[i]) for i in sorted(chosen)]
+
+
+def _dhash(signature) -> int:
+    """64-bit difference hash of a _frame_signature thumbnail"""
+    import cv2
+    import numpy as np
+
+    grey = cv2.cvtColor(signature, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(grey, (DHASH_SIZE + 1, DHASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def _hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _dedupe_frames(indices: List[int], hashes: Dict[int, int], threshold: int) -> Tuple[List[int], List[int]]:
+    """
+    Split frames into (kept, dropped): a frame is dropped when its hash is
+    within `threshold` bits of a frame already kept (earlier frames win).
+    """
+    kept: List[int] = []
+    dropped: List[int] = []
+    for idx in indices:
+        if any(_hamming(hashes[idx], hashes[other]) <= threshold for other in kept):
+            dropped.append(idx)
+        else:
+            kept.append(idx)
+    return kept, dropped
+
+
+def _most_distinct(candidates: Dict[int, int], kept_hashes: List[int], exclude, threshold: int) -> Optional[int]:
+    """Candidate farthest (by its nearest kept hash) from every kept frame, if beyond the threshold"""
+    best, best_distance = None, threshold
+    for idx, value in candidates.items():
+        if idx in exclude:
+            continue
+        distance = min((_hamming(value, other) for other in kept_hashes), default=64)
+        if distance > best_distance:
+            best, best_distance = idx, distance
+    return best
+
+
+def _extract_keyframes(video_file, num_frames: int, strategy: str, selection: str,
+                       dedup_threshold: Optional[int]):
+    """
+    Shared body of the extract_* functions.
+
+    Returns:
+        (frames_data_urls, motion, report): motion is the motion profile with
+        a "keyframes" list for selection="motion" (else None); report counts
+        the frames selected, dropped as near-duplicates, replaced and sent
     """
     try:
         import cv2
@@ -30,47 +569,204 @@ def extract_keyframes_from_video(video_file, num_frames: int = 5) -> List[str]:
             "Install it with: pip install opencv-python-headless"
         )
 
-    # Write uploaded video to a temp file so OpenCV can read it
-    suffix = os.path.splitext(video_file.name)[1] if hasattr(video_file, 'name') else '.mp4'
-    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
-        tmp.write(video_file.getvalue())
-        tmp_path = tmp.name
+    if num_frames <= 0:
+        return [], None, {"requested": num_frames, "selected": 0, "duplicates": 0, "replaced": 0, "sent": 0}
 
+    suffix = os.path.splitext(video_file.name)[1] if hasattr(video_file, 'name') else '.mp4'
     frames_data_urls = []
-    try:
-        cap = cv2.VideoCapture(tmp_path)
+    motion = None
+    reasons: Dict[int, str] = {}
+    # Frame range a dropped frame's replacement must come from (a motion event's span)
+    spans: Dict[int, Tuple[int, int]] = {}
+    candidates: Optional[Dict[int, int]] = None
+    with _video_source(video_file, suffix) as (source, view, cap):
         if not cap.isOpened():
+            cap.release()
             raise ValueError("Could not open video file. Ensure it is a valid video format.")
-
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        cap.release()
         if total_frames <= 0:
             raise ValueError("Video has no readable frames.")
 
-        # Calculate evenly-spaced frame indices
-        if total_frames <= num_frames:
+        keyframes = _mp4_keyframes(view) if view is not None else None
+        if selection in ("scene", "motion") and total_frames > 2:
+            positions, signatures, changes = _scan_signatures(source, total_frames, keyframes)
+            if dedup_threshold is not None:
+                candidates = {p: _dhash(s) for p, s in zip(positions, signatures)}
+            if selection == "scene":
+                indices = _select_scene_frames(positions, changes, num_frames)
+            elif positions:
+                motion = _motion_profile(positions, signatures, changes, fps)
+                reasons = dict(_select_motion_frames(positions, motion, num_frames))
+                indices = sorted(reasons)
+                for event in motion["events"]:
+                    for sample in (event["onset"], event["peak"], event["settle"]):
+                        spans.setdefault(positions[sample], (positions[event["onset"]], positions[event["settle"]]))
+            else:
+                indices = []
+        elif total_frames <= num_frames:
             indices = list(range(total_frames))
         else:
-            indices = [int(i * (total_frames - 1) / (num_frames - 1)) for i in range(num_frames)]
+            # Calculate evenly-spaced frame indices
+            indices = [int(i * (total_frames - 1) / max(1, num_frames - 1)) for i in range(num_frames)]
+            indices = _align_to_keyframes(indices, keyframes)
+        if not indices:
+            raise ValueError("Video has no readable frames.")
+        if strategy == "auto":
+            strategy = _plan_frame_reads(indices, keyframes)[0]
+        frames = _read_frames(source, indices, strategy)
+        indices = [idx for idx in indices if idx in frames]
+        report = {"requested": num_frames, "selected": len(indices), "duplicates": 0, "replaced": 0}
 
-        for idx in indices:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-            ret, frame = cap.read()
-            if not ret:
-                continue
+        # Drop near-identical frames, then fill each freed slot with the most distinct
+        # candidate near it, so the replacement still shows the same moment or event
+        if dedup_threshold is not None and len(indices) > 1:
+            hashes = {idx: _dhash(_frame_signature(frames[idx])) for idx in indices}
+            order = indices
+            if reasons:
+                # Motion picks are deduplicated by importance, so a peak outlives a plain end frame
+                order = sorted(indices, key=lambda idx: MOTION_PRIORITY.index(reasons[idx])
+                               if reasons.get(idx) in MOTION_PRIORITY else len(MOTION_PRIORITY))
+            kept, dropped = _dedupe_frames(order, hashes, dedup_threshold)
+            report["duplicates"] = len(dropped)
+            if dropped and candidates is None:
+                pool = [int(i * (total_frames - 1) / max(1, DEDUP_CANDIDATES * num_frames - 1))
+                        for i in range(DEDUP_CANDIDATES * num_frames)]
+                pool = sorted(set(pool) - set(indices))
+                read = _read_frames(source, pool, _plan_frame_reads(pool, keyframes)[0], transform=_frame_signature)
+                candidates = {idx: _dhash(signature) for idx, signature in read.items()}
+            exclude = set(indices)
+            added = []
+            half = max(1, total_frames // (2 * max(1, num_frames)))
+            for idx in dropped:
+                lo, hi = spans.get(idx, (idx - half, idx + half))
+                nearby = {c: value for c, value in (candidates or {}).items() if lo <= c <= hi}
+                pick = _most_distinct(nearby, [hashes[k] for k in kept], exclude, dedup_threshold)
+                if pick is None:
+                    continue
+                kept.append(pick)
+                added.append(pick)
+                exclude.add(pick)
+                hashes[pick] = candidates[pick]
+                reasons[pick] = f"near {reasons[idx]}" if idx in reasons else "most distinct"
+            if added:
+                added.sort()
+                frames.update(_read_frames(source, added, _plan_frame_reads(added, keyframes)[0]))
+            indices = sorted(idx for idx in kept if idx in frames)
+            report["replaced"] = len([idx for idx in added if idx in frames])
 
+        for idx in indices:
             # Encode frame to JPEG bytes
-            _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+            _, buffer = cv2.imencode('.jpg', frames[idx], [cv2.IMWRITE_JPEG_QUALITY, 85])
             b64 = base64.b64encode(buffer).decode('utf-8')
             frames_data_urls.append(f"data:image/jpeg;base64,{b64}")
-
-        cap.release()
-    finally:
-        os.unlink(tmp_path)
+        if motion is not None:
+            motion["keyframes"] = [{"t": round(idx / fps, 2), "reason": reasons.get(idx, "")} for idx in indices]
 
     if not frames_data_urls:
         raise ValueError("Could not extract any frames from the video.")
 
-    return frames_data_urls
+    report["sent"] = len(frames_data_urls)
+    return frames_data_urls, motion, report
+
+
+def extract_keyframes(video_file, num_frames: int = 5, selection: str = "even", strategy: str = "auto",
+                      dedup_threshold: Optional[int] = DEDUP_HAMMING) -> Dict[str, Any]:
+    """
+    Extract keyframes and report how many images will actually be sent.
+
+    Args:
+        video_file: Streamlit UploadedFile (video)
+        num_frames: Most frames to return
+        selection: "even", "scene" or "motion" (see extract_keyframes_from_video)
+        strategy: Frame-read strategy (see extract_keyframes_from_video)
+        dedup_threshold: Frames whose 64-bit dHashes differ by at most this
+            many bits count as duplicates; each dropped frame is replaced by
+            the most distinct remaining candidate if one exists. None disables it.
+
+    Returns:
+        {"frames": [data URLs], "motion": profile or None,
+         "report": {"requested", "selected", "duplicates", "replaced", "sent"}}
+    """
+    frames, motion, report = _extract_keyframes(video_file, num_frames, strategy, selection, dedup_threshold)
+    return {"frames": frames, "motion": motion, "report": report}
+
+
+def extract_keyframes_from_video(video_file, num_frames: int = 5, strategy: str = "auto",
+                                 selection: str = "even",
+                                 dedup_threshold: Optional[int] = DEDUP_HAMMING) -> List[str]:
+    """
+    Extract keyframes from a video file and return as base64 data URLs.
+
+    Args:
+        video_file: Streamlit UploadedFile (video)
+        num_frames: Number of frames to extract (default 5)
+        strategy: "auto" (cheapest by the frame-read cost model), "sequential"
+            (one forward decode pass) or "seek" (seek to each frame)
+        selection: "even" (evenly spaced), "scene" (at the largest content
+            changes, one per stretch of the clip) or "motion" (around motion
+            peaks and cuts; may return fewer than num_frames)
+        dedup_threshold: Hamming threshold for dropping near-duplicate frames
+            (see extract_keyframes); None keeps them
+
+    Returns:
+        List of base64 data URL strings for each keyframe
+    """
+    return _extract_keyframes(video_file, num_frames, strategy, selection, dedup_threshold)[0]
+
+
+def extract_motion_keyframes(video_file, max_frames: int = 5, strategy: str = "auto",
+                             dedup_threshold: Optional[int] = DEDUP_HAMMING) -> Dict[str, Any]:
+    """
+    Pick keyframes around motion peaks and cuts, and measure the motion between them.
+
+    Args:
+        video_file: Streamlit UploadedFile (video)
+        max_frames: Most frames to return; clips with little motion get fewer
+        strategy: Frame-read strategy (see extract_keyframes_from_video)
+        dedup_threshold: Hamming threshold for dropping near-duplicate frames
+
+    Returns:
+        {"frames": [data URLs], "motion": profile, "report": counts} where
+        profile holds the energy curve, speed and acceleration summaries,
+        transitions and a {"t", "reason"} entry per frame (see describe_motion)
+    """
+    return extract_keyframes(video_file, max_frames, "motion", strategy, dedup_threshold)
+
+
+def describe_motion(motion: Dict[str, Any], buckets: int = 24) -> str:
+    """
+    Compact text form of a motion profile for a model prompt.
+
+    The energy curve is resampled to at most `buckets` points and scaled to
+    0-9 relative to the clip's own peak.
+    """
+    energy = motion.get("energy") or []
+    times = motion.get("times") or []
+    duration = motion.get("duration_s", 0.0)
+    lines = [f"Duration {duration:.1f}s; moving {motion.get('active_ratio', 0) * 100:.0f}% of the time."]
+
+    peak = max(energy, default=0.0)
+    if energy and peak >= STATIC_MOTION:
+        width = max(1, -(-len(energy) // buckets))
+        curve = "".join(str(min(9, round(max(energy[i:i + width]) / peak * 9)))
+                        for i in range(0, len(energy), width))
+        step = duration / max(1, len(curve) - 1) if len(curve) > 1 else duration
+        lines.append(f"Motion curve (0-9, one digit per {step:.1f}s): {curve}")
+        speed, accel = motion["speed"], motion["acceleration"]
+        lines.append(f"Speed: mean {speed['mean'] / peak * 9:.1f}, peak 9 at {speed['peak_at_s']:.1f}s "
+                     f"(same 0-9 scale).")
+        lines.append(f"Strongest acceleration at {accel['peak_at_s']:.1f}s, "
+                     f"strongest deceleration at {accel['peak_decel_at_s']:.1f}s.")
+    else:
+        lines.append("Almost no motion: the subject holds still or the camera is static.")
+    if motion.get("transitions"):
+        lines.append("Hard cuts at: " + ", ".join(f"{t:.1f}s" for t in motion["transitions"]))
+    if motion.get("keyframes"):
+        lines.append("Keyframes: " + "; ".join(f"{i + 1} at {k['t']:.1f}s ({k['reason']})"
+                                               for i, k in enumerate(motion["keyframes"])))
+    return "\n".join(lines)
 
 
 class VideoAnalyzer: